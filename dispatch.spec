@@ -3,8 +3,8 @@
 block_cipher = None
 
 
-a = Analysis(['src\\teamsintegration\\server.py'],
-             pathex=['Z:\\src'],
+a = Analysis(['src\\dispatch\\server.py'],
+             pathex=['Z:\\src', 'Z:\\src\\src\\dispatch'],
              binaries=[],
              datas=[('src/frontend', 'src/frontend')],
              hiddenimports=['uvicorn.logging', 'uvicorn.loops', 'uvicorn.loops.auto', 'uvicorn.protocols', 'uvicorn.protocols.http', 'uvicorn.protocols.http.auto', 'uvicorn.lifespan', 'uvicorn.lifespan.on', 'dotenv'],
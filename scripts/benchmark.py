@@ -0,0 +1,316 @@
+"""DISPATCH // BENCHMARK
+
+Runs missions against a local SMTP sink and writes the results as JSON so
+versions can be compared:
+
+    python scripts/benchmark.py --sizes 100,1000,10000,100000 --latency 20 --out bench.json
+
+Each (mode, size) runs in a fresh process with its own scratch DISPATCH_HOME,
+so peak RSS is per run. The sink lives in this process and counts sessions,
+logins and accepted/rejected/deferred messages.
+"""
+import argparse
+import asyncio
+from array import array
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+DISPATCH_DIR = os.path.join(ROOT, "src", "dispatch")
+
+SUBJECT = "Benchmark {{ name }}"
+BODY = "Olá {{ name }}, unidade {{ unit }}.\n\nMensagem de teste do benchmark."
+
+
+# --- SMTP SINK ---
+class Sink:
+    """Minimal asyncio ESMTP server: accepts everything, with optional latency and failures."""
+
+    def __init__(self, latency=0.0, reject_rate=0.0, defer_rate=0.0, seed=1):
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.defer_rate = defer_rate
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.port = None
+
+    async def _handle(self, reader, writer):
+        self.stats["connections"] += 1
+        reply = lambda text: writer.write(text.encode() + b"\r\n")
+        reply("220 dispatch-bench ESMTP")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line[:4].upper()
+                if verb == b"EHLO":
+                    writer.write(b"250-dispatch-bench\r\n250-AUTH PLAIN LOGIN\r\n250-PIPELINING\r\n250 8BITMIME\r\n")
+                elif verb == b"AUTH":
+                    self.stats["handshakes"] += 1
+                    reply("235 2.7.0 Authentication successful")
+                elif verb == b"RCPT" and self.random.random() < self.reject_rate:
+                    self.stats["rejected"] += 1
+                    reply("550 5.1.1 Mailbox unavailable")
+                elif verb == b"DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while await reader.readline() not in (b".\r\n", b""):
+                        pass
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    if self.random.random() < self.defer_rate:
+                        self.stats["deferred"] += 1
+                        reply("451 4.3.0 Temporary failure, try again")
+                    else:
+                        self.stats["accepted"] += 1
+                        reply("250 2.0.0 Queued")
+                elif verb == b"QUIT":
+                    reply("221 2.0.0 Bye")
+                    break
+                elif verb in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                    reply("250 OK")
+                else:
+                    reply("502 5.5.2 Command not recognized")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def start(self):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            server = loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=512))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, name="smtp-sink", daemon=True).start()
+        ready.wait()
+        return self
+
+    def snapshot(self):
+        return dict(self.stats)
+
+
+# --- RUN (child process) ---
+def synthetic_roster(size):
+    for i in range(size):
+        yield {"name": f"Operative {i:06d}", "email": f"op{i:06d}@bench.local", "unit": f"U{i % 50:02d}"}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # Largest of this process and any worker processes it waited for
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def mode_execute_mission(server, run_id, args):
+    server.execute_mission(run_id)
+
+
+def mode_headless(server, run_id, args):
+    # Per-message latency is not sampled here: deliver() runs in the worker processes
+    import headless
+    from utils import logger as logs
+    server.queue_mission(run_id)
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    server.METRICS_SHARE = os.path.join(server.METRICS_DIR, "bench")
+    log_queue = ctx.Queue()
+    logs.listen(log_queue)
+    procs = [ctx.Process(target=headless.worker, args=(i, args.processes, stop, server.METRICS_SHARE, log_queue))
+             for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    while server.outbox.get_run(run_id)["finished"] is None:
+        time.sleep(0.05)
+    stop.set()
+    for p in procs:
+        p.join()
+
+
+# Engine entry points the benchmark can drive; new modes register here
+MODES = {
+    "execute_mission": mode_execute_mission,
+    "headless": mode_headless,
+}
+
+
+def run_child(args):
+    os.environ["DISPATCH_HOME"] = args.home
+    # Transient failures come back quickly instead of after production backoff.
+    # Set before the imports and inherited by spawned headless workers
+    os.environ["DISPATCH_RETRY_BASE"] = str(args.retry_base)
+    os.makedirs(os.path.join(args.home, "config"), exist_ok=True)
+    os.chdir(args.home)
+    sys.path.insert(0, DISPATCH_DIR)
+
+    import server
+    from api.channels import CHANNELS
+
+    server.roster.add_many(synthetic_roster(args.size))
+    server.config_store.update(lambda c: c.update(mission_config={
+        "subject": SUBJECT, "body": BODY, "channels": args.channels.split(","), "workers": args.workers,
+    }))
+    server.save_secrets({
+        "EMAIL_USER": "bench@bench.local", "EMAIL_PASS": "bench",
+        "SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(args.port), "SMTP_STARTTLS": "false",
+        "SMTP_POOL_SIZE": str(args.pool_size), "SMTP_RATE_PER_SEC": str(args.rate),
+        "SMTP_MAX_MESSAGES_PER_SESSION": str(args.max_messages),
+    })
+
+    # Per-message latency: time spent inside each channel's deliver(); a flat array so
+    # the samples themselves do not show up as roster-proportional RSS
+    latencies = array("d")
+    for cls in CHANNELS.values():
+        def timed(self, *message, _deliver=cls.deliver):
+            started = time.perf_counter()
+            try:
+                _deliver(self, *message)
+            finally:
+                latencies.append(time.perf_counter() - started)
+        cls.deliver = timed
+
+    run_id = f"bench-{args.mode}-{args.size}"
+    started = time.perf_counter()
+    MODES[args.mode](server, run_id, args)
+    elapsed = time.perf_counter() - started
+
+    counts = server.outbox.counts(run_id)
+    latencies = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    result = {
+        "mode": args.mode,
+        "size": args.size,
+        "messages": sum(counts.values()),
+        "status": counts,
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_sec": round(counts.get("sent", 0) / elapsed, 1) if elapsed else None,
+        "latency_ms": {"p50": ms(percentile(latencies, 50)), "p95": ms(percentile(latencies, 95)),
+                       "p99": ms(percentile(latencies, 99)), "max": ms(latencies[-1] if latencies else None)},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+
+# --- DRIVER ---
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def child_command(args, mode, size, home, port, result):
+    return [
+        sys.executable, os.path.abspath(__file__), "--child",
+        "--mode", mode, "--size", str(size), "--home", home, "--port", str(port), "--result", result,
+        "--channels", args.channels, "--workers", str(args.workers), "--processes", str(args.processes), "--pool-size", str(args.pool_size),
+        "--rate", str(args.rate), "--max-messages", str(args.max_messages), "--retry-base", str(args.retry_base),
+    ]
+
+
+def run_suite(args):
+    sink = Sink(args.latency / 1000.0, args.reject_rate, args.defer_rate, args.seed).start()
+    results = []
+    for mode in args.modes.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            with tempfile.TemporaryDirectory(prefix="dispatch-bench-") as home:
+                result_path = os.path.join(home, "result.json")
+                before = sink.snapshot()
+                proc = subprocess.run(child_command(args, mode, size, home, sink.port, result_path),
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                if proc.returncode != 0 or not os.path.exists(result_path):
+                    print(f"BENCHMARK FAILED [{mode} x {size}]:\n{proc.stderr}", file=sys.stderr)
+                    results.append({"mode": mode, "size": size, "error": proc.stderr.strip().splitlines()[-1:]})
+                    continue
+                with open(result_path) as f:
+                    result = json.load(f)
+            after = sink.snapshot()
+            result["sink"] = {k: after.get(k, 0) - before.get(k, 0)
+                              for k in ("connections", "handshakes", "accepted", "rejected", "deferred")}
+            results.append(result)
+            print(f"[{mode} x {size}] {result['msgs_per_sec']} msg/s | p95 {result['latency_ms']['p95']} ms"
+                  f" | {result['peak_rss_mb']} MB | {result['sink']['handshakes']} handshakes", file=sys.stderr)
+
+    report = {
+        "version": git_version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("child", "out", "home", "port", "result", "size", "mode")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark the dispatch path against a local SMTP sink.")
+    p.add_argument("--sizes", default="100,1000,10000,100000", help="comma-separated roster sizes")
+    p.add_argument("--modes", default="execute_mission", help=f"comma-separated engine modes ({', '.join(MODES)})")
+    p.add_argument("--processes", type=int, default=4, help="worker processes for the headless mode")
+    p.add_argument("--channels", default="EMAIL_ALERT", help="channels the mission sends on")
+    p.add_argument("--latency", type=float, default=0.0, help="sink delay before answering DATA, in ms")
+    p.add_argument("--reject-rate", type=float, default=0.0, help="fraction of RCPTs refused with 550")
+    p.add_argument("--defer-rate", type=float, default=0.0, help="fraction of messages deferred with 451")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--pool-size", type=int, default=4, help="SMTP_POOL_SIZE")
+    p.add_argument("--max-messages", type=int, default=100, help="SMTP_MAX_MESSAGES_PER_SESSION")
+    p.add_argument("--rate", type=float, default=100000.0, help="SMTP_RATE_PER_SEC")
+    p.add_argument("--retry-base", type=float, default=0.1, help="retry backoff base in seconds")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", help="write the JSON report here instead of stdout")
+    # Internal: one measured run
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--mode", help=argparse.SUPPRESS)
+    p.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--home", help=argparse.SUPPRESS)
+    p.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    p.add_argument("--result", help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        run_child(args)
+    else:
+        run_suite(args)
@@ -0,0 +1,92 @@
+"""DISPATCH // TEAMS SIGN-IN
+
+Signs the Teams sender in once with the device-code flow and stores the
+delegated refresh token the TEAMS_MESSAGE channel sends with:
+
+    python scripts/teams_login.py --tenant <tenant-id> --client-id <app-id>
+
+The app registration needs the delegated Graph permissions Chat.ReadWrite,
+User.ReadBasic.All and offline_access (admin-consented), and "Allow public
+client flows" enabled. Sign in as the account messages should come from.
+With --save the tenant, client id, refresh token and the signed-in user's id
+(TEAMS_SENDER_ID) are merged into the encrypted secrets.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(ROOT, "src", "dispatch"))
+
+from api.teams import GRAPH_URL, LOGIN_URL, SCOPES
+
+
+def post(url, form):
+    req = urllib.request.Request(url, data=urllib.parse.urlencode(form).encode())
+    try:
+        with urllib.request.urlopen(req, timeout=30) as r:
+            return json.load(r)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def sign_in(login_url, tenant, client_id):
+    base = f"{login_url.rstrip('/')}/{tenant}/oauth2/v2.0"
+    code = post(f"{base}/devicecode", {"client_id": client_id, "scope": SCOPES})
+    if "device_code" not in code:
+        sys.exit(f"SIGN-IN FAILED: {code.get('error_description') or code}")
+    print(code["message"], flush=True)
+
+    interval = int(code.get("interval", 5))
+    deadline = time.time() + int(code.get("expires_in", 900))
+    while time.time() < deadline:
+        time.sleep(interval)
+        token = post(f"{base}/token", {
+            "client_id": client_id,
+            "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
+            "device_code": code["device_code"],
+        })
+        if "access_token" in token:
+            return token
+        if token.get("error") == "slow_down":
+            interval += 5
+        elif token.get("error") != "authorization_pending":
+            sys.exit(f"SIGN-IN FAILED: {token.get('error_description') or token}")
+    sys.exit("SIGN-IN FAILED: code expired")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Sign the Teams sender in and print its refresh token.")
+    p.add_argument("--tenant", required=True, help="directory (tenant) id")
+    p.add_argument("--client-id", required=True, help="application (client) id")
+    p.add_argument("--graph-url", default=GRAPH_URL)
+    p.add_argument("--login-url", default=LOGIN_URL)
+    p.add_argument("--save", action="store_true", help="merge the result into config/secrets.json")
+    args = p.parse_args(argv)
+
+    token = sign_in(args.login_url, args.tenant, args.client_id)
+    req = urllib.request.Request(f"{args.graph_url.rstrip('/')}/me?$select=id,userPrincipalName",
+                                 headers={"Authorization": f"Bearer {token['access_token']}"})
+    with urllib.request.urlopen(req, timeout=30) as r:
+        me = json.load(r)
+    print(f"SIGNED IN: {me.get('userPrincipalName')} ({me['id']})")
+
+    settings = {
+        "TEAMS_TENANT_ID": args.tenant, "TEAMS_CLIENT_ID": args.client_id,
+        "TEAMS_SENDER_ID": me["id"], "TEAMS_REFRESH_TOKEN": token["refresh_token"],
+    }
+    if not args.save:
+        print(json.dumps(settings, indent=2))
+        return
+    import server
+    server.secrets_vault.update(lambda secrets: secrets.update(settings))
+    print("TEAMS CREDENTIALS SAVED.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from api.pool import SMTPPool
+from api.ratelimit import limiter_for
+
+# How long an account sits out after hitting a quota, or after its login was refused
+QUOTA_COOLDOWN = 900.0
+AUTH_COOLDOWN = 3600.0
+
+
+def parse_accounts(source):
+    """Settings for each sender account: SENDER_ACCOUNTS entries over the top-level secrets.
+
+    The top-level EMAIL_USER/EMAIL_PASS pair is the first account when set, so
+    a single-account setup keeps working unchanged.
+    """
+    base = {k: v for k, v in source.items() if k != "SENDER_ACCOUNTS"}
+    accounts = []
+    if base.get("EMAIL_USER"):
+        accounts.append(base)
+    seen = {base.get("EMAIL_USER", "").lower()}
+    for entry in source.get("SENDER_ACCOUNTS") or []:
+        address = (entry.get("EMAIL_USER") or "").strip()
+        if address and address.lower() not in seen:
+            seen.add(address.lower())
+            # Relay, rate and limit settings are inherited; the weight is each account's own
+            accounts.append({**{k: v for k, v in base.items() if k != "WEIGHT"}, **entry})
+    return accounts
+
+
+class SenderAccount:
+    """One mailbox: its own session pool, rate budget and health."""
+
+    def __init__(self, logger, settings, quota=None):
+        self.address = settings.get("EMAIL_USER")
+        self.password = settings.get("EMAIL_PASS")
+        self.server = settings.get("SMTP_SERVER", "smtp.gmail.com")
+        self.port = int(settings.get("SMTP_PORT", "587"))
+        self.weight = max(1, int(settings.get("WEIGHT", 1)))
+        self.current = 0
+        self.down_until = 0.0
+
+        # Session pool tuning
+        self.pool = SMTPPool(
+            logger, self.server, self.port, self.address, self.password,
+            max_sessions=int(settings.get("SMTP_POOL_SIZE", "4")),
+            max_messages=int(settings.get("SMTP_MAX_MESSAGES_PER_SESSION", "100")),
+            idle_timeout=float(settings.get("SMTP_IDLE_TIMEOUT", "60")),
+            starttls=str(settings.get("SMTP_STARTTLS", "true")).lower() not in ("0", "false", "no"),
+        )
+        # Provider budget, shared by every run sending through this account; the daily
+        # count lives in quota so restarts and other processes see the same total
+        daily = int(settings.get("SMTP_DAILY_LIMIT", "0"))
+        self.limiter = limiter_for(
+            logger, self.server, self.address,
+            rate=float(settings.get("SMTP_RATE_PER_SEC", "10")),
+            daily=daily or None, quota=quota,
+        )
+
+
+class AccountPool:
+    """Spreads messages over sender accounts by smooth weighted round-robin.
+
+    An account that hits a quota or fails to log in sits out for a cooldown;
+    the others keep sending and it rejoins on its own once the time is up.
+    """
+
+    def __init__(self, logger, accounts):
+        self.logger = logger
+        self.accounts = accounts
+        self._lock = threading.Lock()
+
+    def pick(self, exclude=()):
+        """Next healthy account not in exclude, or None when none is left."""
+        with self._lock:
+            now = time.monotonic()
+            live = [a for a in self.accounts if a.down_until <= now and a not in exclude]
+            if not live:
+                return None
+            # nginx's smooth WRR: heavy accounts get their share without sending in bursts
+            total = 0
+            for account in live:
+                account.current += account.weight
+                total += account.weight
+            best = max(live, key=lambda a: a.current)
+            best.current -= total
+            return best
+
+    def bench(self, account, seconds, reason):
+        with self._lock:
+            account.down_until = time.monotonic() + seconds
+        self.logger.warning(f"SENDER {account.address} OFFLINE for {seconds / 60:.0f} min: {reason}")
+
+    def available_at(self):
+        """Epoch seconds the first sidelined account can send again (benched or out of budget)."""
+        now, wall = time.monotonic(), time.time()
+        return min(
+            (max(wall + max(0.0, a.down_until - now), a.limiter.available_at()) for a in self.accounts),
+            default=None,
+        )
+
+    def status(self):
+        now = time.monotonic()
+        return " | ".join(
+            f"{a.address}: {'OFFLINE' if a.down_until > now else a.limiter.status()}" for a in self.accounts
+        )
+
+    def close(self):
+        for account in self.accounts:
+            account.pool.close()
@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import mimetypes
+import mmap
+import os
+import tempfile
+from functools import lru_cache
+
+CRLF = b"\r\n"
+# 57 raw bytes encode to one 76-character base64 line (RFC 2045)
+LINE = 57
+BLOCK = LINE * 16384
+
+
+class Attachment:
+    """A file encoded once per content hash and shared by every message of a run.
+
+    data is a read-only mmap of the base64 lines, so each DATA phase writes the
+    same pages to the socket instead of building its own copy.
+    """
+    __slots__ = ("name", "digest", "mime_type", "size", "data")
+
+    def __init__(self, name, digest, mime_type, size, data):
+        self.name = name
+        self.digest = digest
+        self.mime_type = mime_type
+        self.size = size
+        self.data = data
+
+    def __eq__(self, other):
+        return isinstance(other, Attachment) and (self.name, self.digest) == (other.name, other.digest)
+
+    def __hash__(self):
+        return hash((self.name, self.digest))
+
+
+def _mapped(path):
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _digest(source):
+    h = hashlib.sha256()
+    if len(source):
+        with memoryview(source) as view:
+            h.update(view)
+    return h.hexdigest()
+
+
+def _encode(source, target):
+    """Writes source as CRLF-separated base64 lines (no trailing CRLF) via temp file + rename."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for start in range(0, len(source), BLOCK):
+                encoded = base64.b64encode(source[start:start + BLOCK])
+                if start:
+                    out.write(CRLF)
+                out.write(CRLF.join(encoded[i:i + 76] for i in range(0, len(encoded), 76)))
+        os.replace(tmp, target)
+    except Exception:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
+
+@lru_cache(maxsize=32)
+def _encoded(cache_dir, digest):
+    # Keeps the mapping open for later runs of the same content in this process
+    return _mapped(os.path.join(cache_dir, f"{digest}.b64"))
+
+
+def load_attachment(path, cache_dir):
+    """Hashes the file through an mmap and returns its cached encoding, encoding it on a miss."""
+    source = _mapped(path)
+    try:
+        digest = _digest(source)
+        target = os.path.join(cache_dir, f"{digest}.b64")
+        if not os.path.exists(target):
+            os.makedirs(cache_dir, exist_ok=True)
+            _encode(source, target)
+        size = len(source)
+    finally:
+        if isinstance(source, mmap.mmap):
+            source.close()
+    name = os.path.basename(path)
+    mime_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return Attachment(name, digest, mime_type, size, _encoded(cache_dir, digest))
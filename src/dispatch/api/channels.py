@@ -0,0 +1,86 @@
+import threading
+from contextlib import nullcontext
+
+CHANNELS = {}
+
+
+def register_channel(cls):
+    """Class decorator: makes a channel available to every connector and mission."""
+    CHANNELS[cls.name] = cls
+    return cls
+
+
+class Channel:
+    """Delivery channel plugin.
+
+    concurrency: sends this channel may have in flight (its own worker pool).
+    batch_size:  messages coalesced per upstream request (1 = no batching).
+    shared_budget: whether sends count against the global connection budget.
+    """
+    name = None
+    concurrency = 8
+    batch_size = 1
+    shared_budget = True
+
+    def __init__(self, comms):
+        self.comms = comms
+        self.logger = comms.logger
+        self.gate = nullcontext()
+
+    def deliver(self, target, subject, body, attachments=()):
+        """attachments: api.attachments.Attachment objects shared by the whole run."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# In-flight caps are shared per SMTP server across every connector in the process
+_server_gates = {}
+_gates_lock = threading.Lock()
+
+
+def server_gate(server, port, limit):
+    key = (server, port)
+    with _gates_lock:
+        if key not in _server_gates:
+            _server_gates[key] = threading.BoundedSemaphore(max(1, int(limit)))
+        return _server_gates[key]
+
+
+@register_channel
+class EmailChannel(Channel):
+    name = "EMAIL_ALERT"
+
+    def __init__(self, comms):
+        super().__init__(comms)
+        self.concurrency = comms.max_inflight
+        # Direct delivery spreads over many MX hosts and several accounts can sit on
+        # different relays; only a single relay login is capped as a whole
+        if not comms.router and len(comms.accounts.accounts) == 1:
+            account = comms.accounts.accounts[0]
+            self.gate = server_gate(account.server, account.port, comms.max_inflight)
+
+    def deliver(self, target, subject, body, attachments=()):
+        self.comms._send_real_email(target, subject, body, attachments)
+
+
+@register_channel
+class TeamsChannelPlugin(Channel):
+    name = "TEAMS_MESSAGE"
+    batch_size = 20
+    # Batched over one HTTP call at a time; enough workers to fill a batch
+    concurrency = 20
+    shared_budget = False
+
+    def deliver(self, target, subject, body, attachments=()):
+        # Chat messages carry the text only; attachments go out by email
+        if self.comms.teams:
+            self.comms.teams.deliver(target, subject, body)
+        else:
+            # Just logging the body to prove we received it
+            self.logger.debug(f"[TEAMS SIM] To: {target} | Msg: {body[:20]}...")
+
+    def close(self):
+        if self.comms.teams:
+            self.comms.teams.close()
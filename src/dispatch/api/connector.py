@@ -1,42 +1,101 @@
-import smtplib
+import json
 import os
-import email.utils
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+from contextlib import contextmanager
+
+from api.channels import CHANNELS
+from api.dns import Resolver
+from api.accounts import AccountPool, SenderAccount, parse_accounts, AUTH_COOLDOWN, QUOTA_COOLDOWN
+from api.errors import BudgetExhausted, is_auth, is_quota, is_throttle
+from api.mime import compile_message
+from api.routing import DirectRouter
+from api.teams import GraphClient, TeamsChannel, GRAPH_URL, LOGIN_URL, USER_TTL
+from utils.metrics import MIME_BUILD
+from utils.quota import DailyQuota
+from utils.ttlcache import PersistentTTLCache
 
 class MicrosoftConnector:
-    def __init__(self, logger, secrets=None):
+    def __init__(self, logger, secrets=None, state_dir="config"):
         self.logger = logger
         self.connected = False
+        self._auth_lock = threading.Lock()
 
         # Load Creds (Secret or Env)
-        if secrets:
-            self.email_address = secrets.get("EMAIL_USER")
-            self.email_password = secrets.get("EMAIL_PASS")
-            self.smtp_server = secrets.get("SMTP_SERVER", "smtp.gmail.com")
-            self.smtp_port = int(secrets.get("SMTP_PORT", "587"))
-        else:
-            self.email_address = os.getenv("EMAIL_USER")
-            self.email_password = os.getenv("EMAIL_PASS")
-            self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-            self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
+        source = secrets if secrets else os.environ
+        self.email_address = source.get("EMAIL_USER")
+        self.email_password = source.get("EMAIL_PASS")
+        self.smtp_server = source.get("SMTP_SERVER", "smtp.gmail.com")
+        self.smtp_port = int(source.get("SMTP_PORT", "587"))
+
+        # Sender accounts: the primary above plus any SENDER_ACCOUNTS, each with its own
+        # session pool and provider budget
+        quota = DailyQuota(os.path.join(state_dir, "outbox.db"))
+        self.accounts = AccountPool(logger, [SenderAccount(logger, a, quota) for a in parse_accounts(source)])
+        self.max_inflight = int(source.get(
+            "SMTP_MAX_INFLIGHT", sum(a.pool.max_sessions for a in self.accounts.accounts) or 1))
+
+        # Direct delivery to each recipient's MX instead of the SMTP_SERVER relay
+        self.router = None
+        if str(source.get("SMTP_DELIVERY", "relay")).lower() == "direct":
+            self.router = DirectRouter(
+                logger, Resolver(source.get("DNS_SERVER")),
+                port=int(source.get("DIRECT_PORT", "25")),
+                sessions=int(source.get("DIRECT_SESSIONS_PER_MX", "2")),
+                domain_concurrency=int(source.get("DIRECT_DOMAIN_CONCURRENCY", "2")),
+                max_messages=int(source.get("SMTP_MAX_MESSAGES_PER_SESSION", "100")),
+                rate=float(source.get("SMTP_RATE_PER_SEC", "10")),
+                helo=source.get("DIRECT_HELO") or (self.email_address or "").rpartition("@")[2] or None,
+            )
+            self.max_inflight = int(source.get("DIRECT_MAX_INFLIGHT", "32"))
+
+        # Teams over Graph, signed in as the sender, when delegated credentials are present;
+        # simulation otherwise
+        self.teams = None
+        if source.get("TEAMS_TENANT_ID") and source.get("TEAMS_CLIENT_ID") and source.get("TEAMS_SENDER_ID"):
+            if not source.get("TEAMS_REFRESH_TOKEN"):
+                logger.warning("TEAMS: No TEAMS_REFRESH_TOKEN. App-only tokens cannot post chat messages; simulating.")
+            else:
+                cache_path = os.path.join(state_dir, "teams_cache.db")
+                client = GraphClient(
+                    source["TEAMS_TENANT_ID"], source["TEAMS_CLIENT_ID"], source.get("TEAMS_CLIENT_SECRET", ""),
+                    source["TEAMS_REFRESH_TOKEN"],
+                    graph_url=source.get("GRAPH_BASE_URL", GRAPH_URL),
+                    login_url=source.get("GRAPH_LOGIN_URL", LOGIN_URL),
+                    token_store=PersistentTTLCache(cache_path, "teams_auth"),
+                )
+                self.teams = TeamsChannel(
+                    logger, client, source["TEAMS_SENDER_ID"], cache_path,
+                    ttl=float(source.get("TEAMS_CACHE_TTL", USER_TTL)),
+                )
+
+        # One instance of every registered channel plugin
+        self.channels = {name: cls(self) for name, cls in CHANNELS.items()}
 
     def authenticate(self):
+        if self.router:
+            # No relay to log in to; each MX is dialed on first use
+            self.connected = bool(self.email_address)
+            if self.connected:
+                self.logger.info(f"DIRECT DELIVERY: MX routing via {self.router.resolver.nameserver[0]}.")
+            else:
+                self.logger.error("RADIO SILENCE: No sender address.")
+            return
+
         self.logger.info("RADIO CHECK: Connecting to SMTP...")
-        if not self.email_address or not self.email_password:
+        if not any(a.address and a.password for a in self.accounts.accounts):
             self.logger.error("RADIO SILENCE: No credentials found.")
             return
 
-        try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_address, self.email_password)
-            server.quit()
-            self.connected = True
-            self.logger.info("LINK ESTABLISHED: Channel Open.")
-        except Exception as e:
-            self.logger.error(f"CONNECTION FAILED: {e}")
-            self.connected = False
+        # Warm every account: the first session stays open for the run
+        for account in self.accounts.accounts:
+            try:
+                with account.pool.session():
+                    pass
+                self.connected = True
+                self.logger.info(f"LINK ESTABLISHED: Channel Open ({account.address}).")
+            except Exception as e:
+                self.logger.error(f"CONNECTION FAILED ({account.address}): {e}")
+                self.accounts.bench(account, AUTH_COOLDOWN if is_auth(e) else QUOTA_COOLDOWN, e)
 
     # UPDATED: No defaults. You must supply the intel.
     def send_dispatch(self, target_id, message_type, subject, body):
@@ -44,55 +103,98 @@ class MicrosoftConnector:
             self.logger.error("ERRO: Sistema offline.")
             return False
 
-        if message_type == "EMAIL_ALERT":
-            return self._send_real_email(target_id, subject, body)
-        elif message_type == "TEAMS_MESSAGE":
-            # Just logging the body to prove we received it
-            self.logger.info(f"[TEAMS SIM] To: {target_id} | Msg: {body[:20]}...")
-            return True
-
-    def _send_real_email(self, to_email, subject, body):
         try:
-            # PURE TRANSPORT LAYER - No logic, just delivery
-            msg = MIMEMultipart('alternative')
-            msg['From'] = f"Dispatch Central <{self.email_address}>"
-            msg['To'] = to_email
-            msg['Subject'] = subject  # <--- No 'if else'. Pure passthrough.
-            msg['Date'] = email.utils.formatdate(localtime=True)
-            msg['Message-ID'] = email.utils.make_msgid()
-            msg['User-Agent'] = "Microsoft Outlook 16.0"
-
-            # 1. Plain Text Version (The raw order)
-            part1 = MIMEText(body, 'plain')
-
-            # 2. HTML Version (The pretty order)
-            # We wrap YOUR body text in a professional container
-            html_text = f"""
-            <html>
-              <body style="font-family: 'Segoe UI', Arial, sans-serif; color: #222; background-color: #f9f9f9; padding: 20px;">
-                <div style="max-width: 600px; margin: 0 auto; background: #fff; padding: 30px; border-left: 5px solid #0078d4; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
-                    <h2 style="color: #2c3e50; margin-top: 0;">{subject}</h2>
-                    <p style="font-size: 16px; line-height: 1.5; color: #444;">{body}</p>
-                    <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #888;">
-                        <p>DISPATCH CENTRAL - AUTOMATED SYSTEM<br>Do not reply to this frequency.</p>
-                    </div>
-                </div>
-              </body>
-            </html>
-            """
-            part2 = MIMEText(html_text, 'html')
-
-            msg.attach(part1)
-            msg.attach(part2)
-
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_address, self.email_password)
-            server.sendmail(self.email_address, to_email, msg.as_string())
-            server.quit()
-
-            self.logger.info(f"PAYLOAD DELIVERED: {to_email}")
-            return True
+            self.deliver(target_id, message_type, subject, body)
         except Exception as e:
             self.logger.error(f"DELIVERY FAILURE: {e}")
             return False
+        if message_type == "EMAIL_ALERT":
+            self.logger.info(f"PAYLOAD DELIVERED: {target_id}")
+        return True
+
+    def deliver(self, target_id, message_type, subject, body, attachments=()):
+        """Raises on failure instead of logging; the dispatch engine reports results."""
+        self.channel(message_type).deliver(target_id, subject, body, attachments)
+
+    def channel(self, name):
+        if name not in self.channels:
+            raise ValueError(f"Unknown channel: {name}")
+        return self.channels[name]
+
+    def _send_real_email(self, to_email, subject, body, attachments=()):
+        # PURE TRANSPORT LAYER - No logic, just delivery
+        if self.router:
+            with MIME_BUILD.time():
+                chunks = compile_message(self.email_address, subject, body, attachments).render(to_email)
+            # Per-MX limiters live in the router
+            self.router.send(self.email_address, to_email, chunks)
+            return
+
+        # Fail over to the next account when one is out of quota or locked out
+        tried, last = set(), None
+        while (account := self.accounts.pick(tried)) is not None:
+            tried.add(account)
+            with MIME_BUILD.time():
+                chunks = compile_message(account.address, subject, body, attachments).render(to_email)
+            try:
+                account.limiter.acquire()
+                account.pool.send(account.address, to_email, chunks)
+            except Exception as e:
+                if is_throttle(e):
+                    account.limiter.on_throttle()
+                if is_auth(e):
+                    self.accounts.bench(account, AUTH_COOLDOWN, e)
+                elif is_quota(e):
+                    # A spent daily budget clears itself; the limiter already holds it back
+                    if not isinstance(e, BudgetExhausted):
+                        self.accounts.bench(account, QUOTA_COOLDOWN, e)
+                else:
+                    raise
+                last = e
+                continue
+            account.limiter.on_success()
+            return
+        # Every account is spent or locked out: defer the message rather than fail it
+        raise BudgetExhausted(f"No sender account available{f' (last: {last})' if last else ''}",
+                              retry_at=self.accounts.available_at()) from last
+
+    def status(self):
+        if self.router:
+            return "direct delivery"
+        return self.accounts.status()
+
+    def close(self):
+        self.accounts.close()
+        if self.router:
+            self.router.close()
+        for channel in self.channels.values():
+            channel.close()
+        self.connected = False
+
+
+# Connectors shared by overlapping runs so they reuse one pool of sessions
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+@contextmanager
+def shared_connector(logger, secrets, state_dir="config"):
+    """One authenticated connector per credential set while any run is using it."""
+    key = json.dumps(secrets or {}, sort_keys=True)
+    with _shared_lock:
+        entry = _shared.get(key)
+        if entry is None:
+            entry = _shared[key] = [MicrosoftConnector(logger, secrets, state_dir), 0]
+        entry[1] += 1
+    comms = entry[0]
+    try:
+        with comms._auth_lock:
+            if not comms.connected:
+                comms.authenticate()
+        yield comms
+    finally:
+        with _shared_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _shared.pop(key, None)
+                comms.close()
@@ -0,0 +1,200 @@
+import random
+import socket
+import struct
+import threading
+import time
+
+from api.errors import ChannelError
+
+TYPE_MX = 15
+CLASS_IN = 1
+RCODE_NXDOMAIN = 3
+# Remembered "no such domain" answers when the response carries no SOA to take a TTL from
+NEGATIVE_TTL = 300
+# Upper bound so a misconfigured zone cannot pin an answer for days
+MAX_TTL = 86400
+
+_HEADER = struct.Struct("!HHHHHH")
+_RR = struct.Struct("!HHIH")
+
+
+def system_nameserver(path="/etc/resolv.conf"):
+    """First nameserver from resolv.conf, or None when there is none (e.g. Windows)."""
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    return parts[1]
+    except OSError:
+        pass
+    return None
+
+
+def parse_nameserver(value):
+    """"host", "host:port" or "[v6]:port" -> (host, port)."""
+    value = value.strip()
+    if value.startswith("["):
+        host, _, port = value[1:].partition("]")
+        return host, int(port.lstrip(":") or 53)
+    if value.count(":") == 1:
+        host, port = value.split(":")
+        return host, int(port)
+    return value, 53
+
+
+def build_query(qid, name, qtype):
+    qname = b"".join(bytes([len(label)]) + label for label in name.rstrip(".").encode("idna").split(b".")) + b"\0"
+    # RD set: the nameserver is a recursive resolver (or a stub standing in for one)
+    return _HEADER.pack(qid, 0x0100, 1, 0, 0, 0) + qname + struct.pack("!HH", qtype, CLASS_IN)
+
+
+def _read_name(packet, offset):
+    """Decodes a possibly compressed name; returns (name, offset after it)."""
+    labels, end, jumps = [], None, 0
+    while True:
+        length = packet[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | packet[offset + 1]
+            jumps += 1
+            if jumps > 32:
+                raise ValueError("DNS name compression loop")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(packet[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    return ".".join(labels).lower(), end if end is not None else offset
+
+
+def parse_response(packet, qid):
+    """(rcode, records, negative_ttl): records are (type, ttl, rdata_offset, rdlength) of the answer section."""
+    ident, flags, qdcount, ancount, nscount, _ = _HEADER.unpack_from(packet)
+    if ident != qid or not flags & 0x8000:
+        raise ValueError("Unexpected DNS response")
+    offset = _HEADER.size
+    for _ in range(qdcount):
+        _, offset = _read_name(packet, offset)
+        offset += 4
+    sections = []
+    for _ in range(ancount + nscount):
+        _, offset = _read_name(packet, offset)
+        rtype, _, ttl, rdlength = _RR.unpack_from(packet, offset)
+        offset += _RR.size
+        sections.append((rtype, ttl, offset, rdlength))
+        offset += rdlength
+    answers, authority = sections[:ancount], sections[ancount:]
+    # RFC 2308: negative answers are cached for the SOA's minimum, capped by its TTL
+    negative = NEGATIVE_TTL
+    for rtype, ttl, start, _ in authority:
+        if rtype == 6:
+            _, pos = _read_name(packet, start)
+            _, pos = _read_name(packet, pos)
+            minimum = struct.unpack_from("!5I", packet, pos)[4]
+            negative = min(ttl, minimum)
+    return flags & 0x000F, answers, negative
+
+
+class Resolver:
+    """MX lookups over raw UDP (TCP when truncated) with an in-process TTL cache.
+
+    Answers are kept for their record TTL and concurrent lookups of one domain
+    share a single query. nameserver is "host[:port]", so a local stub can
+    stand in for real DNS; the default is the system's first nameserver.
+    """
+
+    def __init__(self, nameserver=None, timeout=2.0, retries=2):
+        self.nameserver = parse_nameserver(nameserver or system_nameserver() or "8.8.8.8")
+        self.timeout = float(timeout)
+        self.retries = max(1, int(retries))
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _exchange(self, query):
+        family = socket.AF_INET6 if ":" in self.nameserver[0] else socket.AF_INET
+        last = None
+        for _ in range(self.retries):
+            with socket.socket(family, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(self.timeout)
+                try:
+                    sock.sendto(query, self.nameserver)
+                    while True:
+                        packet, _ = sock.recvfrom(4096)
+                        # Ignore stray datagrams; only the nameserver's answer to this id counts
+                        if packet[:2] == query[:2]:
+                            break
+                except OSError as e:
+                    last = e
+                    continue
+            if packet[2] & 0x02:  # TC: answer too large for UDP
+                return self._exchange_tcp(query)
+            return packet
+        raise ChannelError(f"DNS timeout ({self.nameserver[0]}): {last}", transient=True)
+
+    def _exchange_tcp(self, query):
+        with socket.create_connection(self.nameserver, timeout=self.timeout) as sock:
+            sock.sendall(struct.pack("!H", len(query)) + query)
+            data = b""
+            while len(data) < 2 or len(data) < 2 + struct.unpack("!H", data[:2])[0]:
+                chunk = sock.recv(65535)
+                if not chunk:
+                    raise ChannelError("DNS TCP connection closed early", transient=True)
+                data += chunk
+        return data[2:]
+
+    def _lookup_mx(self, domain):
+        """(hosts by preference, ttl). RFC 5321 5.1: no MX means the domain itself."""
+        qid = random.getrandbits(16)
+        packet = self._exchange(build_query(qid, domain, TYPE_MX))
+        try:
+            rcode, answers, negative = parse_response(packet, qid)
+            records, ttl = [], MAX_TTL
+            for rtype, rttl, start, _ in answers:
+                if rtype != TYPE_MX:
+                    continue
+                preference = struct.unpack_from("!H", packet, start)[0]
+                host, _ = _read_name(packet, start + 2)
+                records.append((preference, host))
+                ttl = min(ttl, rttl)
+        except (ValueError, IndexError, struct.error) as e:
+            raise ChannelError(f"DNS malformed answer for {domain}: {e}", transient=True)
+        if rcode == RCODE_NXDOMAIN:
+            return [], negative
+        if rcode != 0:
+            raise ChannelError(f"DNS error {rcode} for {domain}", transient=True)
+
+        if not records:
+            return [domain], negative
+        # RFC 7505 null MX: the domain accepts no mail
+        if len(records) == 1 and records[0][1] == "":
+            return [], ttl
+        # Equal preferences are shuffled to spread load (RFC 5321 5.1)
+        records.sort(key=lambda r: (r[0], random.random()))
+        return [host for _, host in records], ttl
+
+    def mx(self, domain):
+        """Mail hosts for domain, most preferred first; [] when it cannot receive mail."""
+        domain = domain.strip().lower().rstrip(".")
+        while True:
+            with self._lock:
+                entry = self._cache.get(domain)
+                if entry and entry[0] > time.monotonic():
+                    return entry[1]
+                waiter = self._pending.get(domain)
+                if waiter is None:
+                    waiter = self._pending[domain] = threading.Event()
+                    break
+            waiter.wait(self.timeout * self.retries + 1)
+        try:
+            hosts, ttl = self._lookup_mx(domain)
+            with self._lock:
+                self._cache[domain] = (time.monotonic() + min(max(ttl, 1), MAX_TTL), hosts)
+            return hosts
+        finally:
+            with self._lock:
+                self._pending.pop(domain, None)
+            waiter.set()
@@ -0,0 +1,218 @@
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+
+from api.errors import BudgetExhausted, is_transient, smtp_code
+from api.templating import TemplateSyntaxError
+from utils.metrics import MESSAGES, RUN_DURATION
+from utils.outbox import LEASE_SECONDS
+
+DEFAULT_CHANNELS = ("EMAIL_ALERT", "TEAMS_MESSAGE")
+
+# Longest single sleep while waiting on retry backoff; keeps shutdown responsive.
+MAX_IDLE_WAIT = 5.0
+
+# Global budget: overlapping missions share this many concurrent sends
+_budget = threading.BoundedSemaphore(16)
+
+
+def configure_budget(limit):
+    """Sets the process-wide send concurrency shared by all missions."""
+    global _budget
+    _budget = threading.BoundedSemaphore(max(1, int(limit)))
+
+
+def _settled(error):
+    """A future already holding a failed result, for rows that never reach a channel."""
+    future = Future()
+    future.set_result((error, None))
+    return future
+
+
+class RunSummary:
+    __slots__ = ("sent", "failed", "retried", "elapsed", "first_send")
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.elapsed = 0.0
+        self.first_send = None  # epoch seconds the first message was handed to a channel
+
+    def as_dict(self):
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried,
+                "elapsed": round(self.elapsed, 3)}
+
+
+class DispatchEngine:
+    """Drains a run from the outbox, one bounded worker pool per channel.
+
+    Channels run side by side, so a recipient's email and Teams rows go out
+    in parallel. workers caps each channel's concurrent upstream requests;
+    batching channels get workers * batch_size threads to fill their batches.
+    """
+
+    def __init__(self, logger, comms, workers=8, ledger=None):
+        self.logger = logger
+        self.comms = comms
+        self.workers = max(1, int(workers))
+        self.ledger = ledger
+
+    def _pool_size(self, channel):
+        return max(1, min(int(channel.concurrency), self.workers * channel.batch_size))
+
+    def _send(self, target, channel, subject, body, attachments=()):
+        """(error or None, seconds spent in deliver)."""
+        started = None
+        try:
+            with ExitStack() as stack:
+                if channel.shared_budget:
+                    stack.enter_context(_budget)
+                stack.enter_context(channel.gate)
+                started = time.perf_counter()
+                channel.deliver(target, subject, body, attachments)
+            return None, time.perf_counter() - started
+        except Exception as e:
+            return e, None if started is None else time.perf_counter() - started
+
+    def _submit(self, pools, row, subject, body, attachments=()):
+        pool = pools.get(row['channel'])
+        if pool is None:
+            return _settled(ValueError(f"Unknown channel: {row['channel']}"))
+        channel = self.comms.channel(row['channel'])
+        return pool.submit(self._send, row['recipient'], channel, subject, body, attachments)
+
+    def _record(self, outbox, row, error, summary):
+        """Updates the outbox row; returns the attempt's status (sent, deferred or failed)."""
+        target = f"TARGET {row['recipient']} | {row['channel']}"
+        if error is None:
+            outbox.mark_sent(row['id'])
+            summary.sent += 1
+            MESSAGES.inc(channel=row['channel'], outcome="sent")
+            self.logger.info(f"{target}: DELIVERED")
+            return "sent"
+        elif isinstance(error, BudgetExhausted) and error.retry_at:
+            # Not the message's fault: it waits for a sender without using up its attempts
+            outbox.mark_deferred(row['id'], error.retry_at, error)
+            summary.retried += 1
+            MESSAGES.inc(channel=row['channel'], outcome="retried")
+            self.logger.warning(f"{target}: DEFERRED ({error}). Retry at {time.strftime('%H:%M', time.localtime(error.retry_at))}.")
+            return "deferred"
+        elif is_transient(error) and outbox.mark_retry(row['id'], row['attempts'], error):
+            summary.retried += 1
+            MESSAGES.inc(channel=row['channel'], outcome="retried")
+            self.logger.warning(f"{target}: DEFERRED ({error}). Retry scheduled.")
+            return "deferred"
+        else:
+            outbox.mark_failed(row['id'], error)
+            summary.failed += 1
+            MESSAGES.inc(channel=row['channel'], outcome="failed")
+            self.logger.error(f"{target}: FAILURE ({error})")
+            return "failed"
+
+    def run(self, outbox, run_id, template, window_end=None, shards=1, attachments=()):
+        """Sends every due row of a run.
+
+        With window_end (epoch seconds) the remaining rows are spaced evenly
+        until that moment instead of going out in one burst. shards is the
+        number of engines draining the run together; each paces its share.
+        attachments are loaded once by the caller and shared by every message.
+        """
+        summary = RunSummary()
+        started = time.monotonic()
+        sizes = {name: self._pool_size(channel) for name, channel in self.comms.channels.items()}
+        pools = {
+            name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"dispatch-{name.lower()}")
+            for name, size in sizes.items()
+        }
+        max_inflight = sum(sizes.values()) * 4
+
+        interval = 0.0
+        if window_end:
+            remaining = outbox.counts(run_id)
+            pending = remaining.get('pending', 0) + remaining.get('sending', 0)
+            if pending:
+                interval = max(0.0, window_end - time.time()) * max(1, shards) / pending
+        if interval:
+            self.logger.info(f"RUN {run_id} PACED: one send every {interval:.2f}s.")
+        next_slot = time.monotonic()
+
+        inflight = deque()
+
+        def settle(block):
+            # Report in queue order regardless of completion order. Finished rows are
+            # recorded in one transaction: other processes share the outbox write lock.
+            while inflight:
+                if block:
+                    inflight[0][1].result()
+                elif not inflight[0][1].done():
+                    return
+                attempts = []
+                with outbox.batch():
+                    while inflight and inflight[0][1].done():
+                        row, future = inflight.popleft()
+                        error, latency = future.result()
+                        status = self._record(outbox, row, error, summary)
+                        attempts.append((run_id, row['recipient'], row['channel'], status,
+                                         smtp_code(error), latency, None if error is None else str(error)))
+                if self.ledger is not None:
+                    try:
+                        self.ledger.record_many(attempts)
+                    except Exception as e:
+                        # The outbox is the source of truth; a ledger hiccup must not stop the run
+                        self.logger.warning(f"LEDGER WRITE FAILED [{run_id}]: {e}")
+
+        try:
+            while True:
+                settle(block=False)
+                room = max_inflight - len(inflight)
+                if room <= 0:
+                    inflight[0][1].result()
+                    continue
+                if interval:
+                    # Never lease more than can go out before the lease expires
+                    room = max(1, min(room, int(LEASE_SECONDS / (2 * interval))))
+
+                batch = outbox.claim(run_id, limit=room)
+                if not batch:
+                    if inflight:
+                        settle(block=True)
+                        continue
+                    wait = outbox.next_due_in(run_id)
+                    if wait is None:
+                        break
+                    time.sleep(min(wait, MAX_IDLE_WAIT))
+                    continue
+
+                for row in batch:
+                    # Per row: an operative the template cannot render fails alone
+                    try:
+                        subject, body = template.render(json.loads(row['context'] or '{}'))
+                    except TemplateSyntaxError as e:
+                        inflight.append((row, _settled(e)))
+                        continue
+                    if interval:
+                        delay = next_slot - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        next_slot = max(next_slot, time.monotonic()) + interval
+                    if summary.first_send is None:
+                        summary.first_send = time.time()
+                    inflight.append((row, self._submit(pools, row, subject, body, attachments)))
+
+            settle(block=True)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        outbox.finish_run(run_id)
+        summary.elapsed = time.monotonic() - started
+        RUN_DURATION.observe(summary.elapsed)
+        self.logger.info(
+            f"RUN SUMMARY [{run_id}]: sent={summary.sent} failed={summary.failed} "
+            f"retried={summary.retried} elapsed={summary.elapsed:.2f}s | {self.comms.status()}"
+        )
+        return summary
@@ -0,0 +1,74 @@
+import smtplib
+
+# Provider throttling: "try again later" replies and RFC 3463 4.7.x policy codes
+THROTTLE_CODES = {421, 450, 451, 452}
+
+
+class BudgetExhausted(Exception):
+    """Per-day send budget for an account is used up, or every sender account is sidelined.
+
+    retry_at (epoch seconds) is when sending can resume; the message waits
+    until then without spending one of its attempts.
+    """
+
+    def __init__(self, message, retry_at=None):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+class ChannelError(Exception):
+    """Delivery failure raised by a non-SMTP channel; `transient` drives the retry decision."""
+
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
+
+
+def smtp_code(exc):
+    """Best-effort SMTP reply code carried by an exception, or None."""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        return max(code for code, _ in exc.recipients.values())
+    return None
+
+
+def is_transient(exc):
+    """True for failures worth retrying: 4xx replies, dropped links, timeouts and spent budgets."""
+    if isinstance(exc, BudgetExhausted):
+        return True
+    if isinstance(exc, ChannelError):
+        return exc.transient
+    code = smtp_code(exc)
+    if code is not None:
+        return 400 <= code < 500
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+def is_throttle(exc):
+    code = smtp_code(exc)
+    if code not in THROTTLE_CODES:
+        return False
+    return code in (421, 451) or "4.7." in str(exc)
+
+
+# Replies that mean the account itself is spent, not the message or the server
+QUOTA_MARKERS = ("quota", "4.4.5", "5.4.5", "rate limit", "sending limit", "too many messages")
+
+
+def is_quota(exc):
+    """True when the sending account hit a provider quota; another account may still send."""
+    if isinstance(exc, BudgetExhausted):
+        return True
+    code = smtp_code(exc)
+    if code is None or code < 400:
+        return False
+    text = str(exc).lower()
+    return any(marker in text for marker in QUOTA_MARKERS)
+
+
+def is_auth(exc):
+    """True when the relay refused the account's login."""
+    return isinstance(exc, smtplib.SMTPAuthenticationError) or smtp_code(exc) == 530
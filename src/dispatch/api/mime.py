@@ -0,0 +1,101 @@
+import email.utils
+from email import policy
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import lru_cache
+from smtplib import quotedata
+
+# Bump whenever HTML_TEMPLATE or the header layout changes so cached skeletons are rebuilt
+TEMPLATE_VERSION = 1
+
+CRLF = b"\r\n"
+
+# We wrap YOUR body text in a professional container
+HTML_TEMPLATE = """
+<html>
+  <body style="font-family: 'Segoe UI', Arial, sans-serif; color: #222; background-color: #f9f9f9; padding: 20px;">
+    <div style="max-width: 600px; margin: 0 auto; background: #fff; padding: 30px; border-left: 5px solid #0078d4; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
+        <h2 style="color: #2c3e50; margin-top: 0;">{subject}</h2>
+        <p style="font-size: 16px; line-height: 1.5; color: #444;">{body}</p>
+        <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; font-size: 12px; color: #888;">
+            <p>DISPATCH CENTRAL - AUTOMATED SYSTEM<br>Do not reply to this frequency.</p>
+        </div>
+    </div>
+  </body>
+</html>
+"""
+
+
+def _stuffed(data):
+    """CRLF-normalised, dot-stuffed bytes ready to go straight onto the DATA stream."""
+    return quotedata(data.decode("ascii")).encode("ascii")
+
+
+def _placeholder(index):
+    return f"DISPATCH-ATTACHMENT-{index}"
+
+
+class CompiledMessage:
+    """A message serialized once; only To, Date and Message-ID are rendered per recipient.
+
+    Attachments are left as placeholders in the serialized payload, which is
+    then split around them: their cached base64 buffers go out as chunks of
+    their own and are never copied into the message.
+    """
+    __slots__ = ("head", "payload", "domain")
+
+    def __init__(self, sender, subject, body, attachments=()):
+        alternative = MIMEMultipart('alternative', policy=policy.SMTP)
+        # 1. Plain Text Version (The raw order)
+        alternative.attach(MIMEText(body, 'plain', 'utf-8', policy=policy.SMTP))
+        # 2. HTML Version (The pretty order)
+        alternative.attach(MIMEText(HTML_TEMPLATE.format(subject=subject, body=body), 'html', 'utf-8', policy=policy.SMTP))
+
+        msg = alternative
+        if attachments:
+            msg = MIMEMultipart('mixed', policy=policy.SMTP)
+            msg.attach(alternative)
+            for i, attachment in enumerate(attachments):
+                part = MIMEBase(*attachment.mime_type.split('/', 1), policy=policy.SMTP)
+                part.set_payload(_placeholder(i))
+                part['Content-Transfer-Encoding'] = 'base64'
+                part.add_header('Content-Disposition', 'attachment', filename=attachment.name)
+                msg.attach(part)
+
+        msg['From'] = f"Dispatch Central <{sender}>"
+        msg['Subject'] = subject  # <--- No 'if else'. Pure passthrough.
+        msg['User-Agent'] = "Microsoft Outlook 16.0"
+
+        raw = msg.as_bytes()
+        head, _, payload = raw.partition(CRLF + CRLF)
+        self.head = _stuffed(head + CRLF)
+        chunks = []
+        for i, attachment in enumerate(attachments):
+            before, found, payload = payload.partition(_placeholder(i).encode("ascii"))
+            if not found:
+                raise ValueError(f"Attachment {attachment.name} lost while serializing the message")
+            # base64 lines never start with a dot, so the buffer needs no stuffing
+            chunks += [_stuffed(before), attachment.data]
+        chunks.append(_stuffed(payload))
+        self.payload = tuple(chunks)
+        # make_msgid() would otherwise resolve the local FQDN on every call
+        self.domain = (sender or "").rpartition("@")[2] or "dispatch.local"
+
+    def render(self, to_addr):
+        """Per-recipient chunks for the DATA phase; the shared parts are never copied."""
+        headers = (
+            f"To: {to_addr}\r\n"
+            f"Date: {email.utils.formatdate(localtime=True)}\r\n"
+            f"Message-ID: {email.utils.make_msgid(domain=self.domain)}\r\n"
+        ).encode("utf-8")
+        return (headers, self.head, CRLF) + self.payload
+
+
+@lru_cache(maxsize=64)
+def _compile(sender, subject, body, attachments, version):
+    return CompiledMessage(sender, subject, body, attachments)
+
+
+def compile_message(sender, subject, body, attachments=()):
+    return _compile(sender, subject, body, tuple(attachments), TEMPLATE_VERSION)
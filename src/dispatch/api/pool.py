@@ -0,0 +1,212 @@
+import smtplib
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.metrics import SMTP_CONNECT, SMTP_DATA, SMTP_LOGIN, SMTP_STARTTLS
+
+# Sessions idle for less than this are trusted without a NOOP round-trip.
+HEALTHCHECK_AFTER = 2.0
+
+
+def closing_channel(exc):
+    """421 without a 4.7.x policy code: the server is only closing this session.
+
+    421 4.7.x is throttling; resending on a fresh login would hit it again.
+    """
+    return exc.smtp_code == 421 and "4.7." not in str(exc)
+
+
+def transmit(smtp, from_addr, to_addrs, chunks):
+    """MAIL/RCPT/DATA with pre-stuffed chunks written straight to the socket."""
+    smtp.ehlo_or_helo_if_needed()
+    code, resp = smtp.mail(from_addr)
+    if code != 250:
+        if code == 421: smtp.close()
+        else: smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+    refused = {}
+    for rcpt in to_addrs:
+        code, resp = smtp.rcpt(rcpt)
+        if code not in (250, 251):
+            refused[rcpt] = (code, resp)
+        if code == 421:
+            smtp.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(to_addrs):
+        smtp.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = smtp.docmd("data")
+    if code != 354:
+        if code == 421: smtp.close()
+        else: smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    tail = b""
+    for chunk in chunks:
+        if chunk:
+            smtp.send(chunk)
+            tail = chunk
+    smtp.send(b".\r\n" if tail.endswith(b"\r\n") else b"\r\n.\r\n")
+    code, resp = smtp.getreply()
+    if code != 250:
+        if code == 421: smtp.close()
+        else: smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+class PooledSession:
+    __slots__ = ("smtp", "created", "last_used", "sent")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.sent = 0
+
+
+class SMTPPool:
+    """Keeps authenticated SMTP sessions open and reuses them across recipients."""
+
+    def __init__(self, logger, server, port, user, password,
+                 max_sessions=4, max_messages=100, idle_timeout=60.0, timeout=30.0, starttls=True, helo=None):
+        """starttls: True (required), False, or "auto" (when offered). No user: no AUTH."""
+        self.logger = logger
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_messages = max(1, int(max_messages))
+        self.idle_timeout = float(idle_timeout)
+        self.timeout = float(timeout)
+        self.starttls = starttls
+        self.helo = helo
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self.handshakes = 0
+
+    # --- SESSION LIFECYCLE ---
+    def _open(self):
+        with SMTP_CONNECT.time():
+            smtp = smtplib.SMTP(self.server, self.port, local_hostname=self.helo, timeout=self.timeout)
+        try:
+            # DATA goes out as several small writes; without this Nagle stalls each on a delayed ACK
+            smtp.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.starttls == "auto":
+                smtp.ehlo()
+            if self.starttls is True or (self.starttls == "auto" and smtp.has_extn("starttls")):
+                with SMTP_STARTTLS.time():
+                    smtp.starttls()
+            if self.user:
+                with SMTP_LOGIN.time():
+                    smtp.login(self.user, self.password)
+        except Exception:
+            self._discard(smtp)
+            raise
+        with self._lock:
+            self.handshakes += 1
+        return PooledSession(smtp)
+
+    def _discard(self, smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try: smtp.close()
+            except Exception: pass
+
+    def _healthy(self, session):
+        idle_for = time.monotonic() - session.last_used
+        if idle_for > self.idle_timeout:
+            return False
+        if idle_for < HEALTHCHECK_AFTER:
+            return True
+        try:
+            return session.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    return self._open()
+                if self._healthy(session):
+                    return session
+                self._discard(session.smtp)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, session, broken=False):
+        try:
+            if broken or session.sent >= self.max_messages:
+                self._discard(session.smtp)
+            else:
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self):
+        session = self.acquire()
+        try:
+            yield session
+        except Exception:
+            self.release(session, broken=True)
+            raise
+        else:
+            self.release(session)
+
+    # --- TRANSPORT ---
+    def send(self, from_addr, to_addrs, chunks):
+        """Delivers one message, reconnecting once when the server closes the channel (421)
+        or the socket drops. Throttling replies are raised for the caller's backoff."""
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        for attempt in (0, 1):
+            session = self.acquire()
+            try:
+                with SMTP_DATA.time():
+                    refused = transmit(session.smtp, from_addr, to_addrs, chunks)
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+                self.release(session, broken=True)
+                if attempt: raise
+                self.logger.warning(f"LINK DROPPED: {e}. Reconnecting...")
+                continue
+            except smtplib.SMTPResponseException as e:
+                if closing_channel(e):
+                    self.release(session, broken=True)
+                    if attempt: raise
+                    self.logger.warning("SERVER CLOSING CHANNEL (421). Reconnecting...")
+                    continue
+                # transmit() already closed the link on a 421
+                self.release(session, broken=e.smtp_code == 421)
+                raise
+            except smtplib.SMTPRecipientsRefused as e:
+                self.release(session, broken=any(code == 421 for code, _ in e.recipients.values()))
+                raise
+            except Exception:
+                self.release(session, broken=True)
+                raise
+
+            session.sent += 1
+            self.release(session)
+            return refused
+
+    def close(self):
+        with self._lock:
+            sessions, self._idle = list(self._idle), deque()
+        for session in sessions:
+            self._discard(session.smtp)
@@ -0,0 +1,165 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from api.errors import BudgetExhausted
+
+# Seconds between RATE status lines in the log while a limiter is busy
+REPORT_EVERY = 10.0
+# Most of the daily budget a process reserves from the shared count at once
+QUOTA_BLOCK = 50
+
+
+def next_midnight():
+    """Epoch seconds of the next local midnight, when daily budgets reset."""
+    return datetime.combine(date.today() + timedelta(days=1), datetime.min.time()).timestamp()
+
+
+class AdaptiveLimiter:
+    """Token bucket whose rate adapts AIMD-style to provider throttling.
+
+    Throttling halves the rate (down to min_rate); each success adds back a
+    fraction so the rate climbs by `increase` msg/s per second of clean sending.
+    """
+
+    def __init__(self, logger, key, rate=10.0, daily=None, burst=None,
+                 min_rate=0.2, increase=0.5, decrease=0.5, quota=None):
+        self.logger = logger
+        self.key = key
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self._min_rate = float(min_rate)
+        self._burst = burst
+        # Daily counts shared across processes and restarts (utils.quota.DailyQuota), or None
+        self.quota = quota
+        self.max_rate = self.rate = 0.0
+
+        self.waiting = 0
+        self.sent_today = 0
+        self.reserved = 0
+        self._day = date.today()
+        self._stamp = time.monotonic()
+        self._reported = 0.0
+        self._cond = threading.Condition()
+        self.tokens = 0.0
+        self.configure(rate, daily)
+        self.tokens = self.burst
+
+    def configure(self, rate, daily):
+        """Applies changed settings to a live limiter; a throttled rate stays throttled.
+
+        daily=None means no daily limit.
+        """
+        with self._cond:
+            if float(rate) != self.max_rate:
+                rate = float(rate)
+                self.rate = rate if self.rate in (0.0, self.max_rate) else min(self.rate, rate)
+                self.max_rate = rate
+                self.min_rate = min(self._min_rate, rate)
+                self.burst = float(self._burst or max(1.0, rate))
+                self.tokens = min(self.tokens, self.burst)
+            self.daily = daily
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if date.today() != self._day:
+            self._day = date.today()
+            self.sent_today = self.reserved = 0
+
+    def _take_budget(self):
+        """Counts one send against the daily budget; False once it is spent."""
+        if not self.daily:
+            return True
+        if self.quota is None:
+            return self.sent_today < self.daily
+        if not self.reserved:
+            block = max(1, min(QUOTA_BLOCK, int(self.rate)))
+            self.reserved = self.quota.reserve(self.key, self._day.isoformat(), block, self.daily)
+        if not self.reserved:
+            return False
+        self.reserved -= 1
+        return True
+
+    def acquire(self):
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        if not self._take_budget():
+                            raise BudgetExhausted(f"{self.key}: daily budget of {self.daily} reached",
+                                                  retry_at=next_midnight())
+                        self.tokens -= 1
+                        self.sent_today += 1
+                        self._report(now)
+                        return
+                    self._cond.wait((1 - self.tokens) / self.rate)
+            finally:
+                self.waiting -= 1
+
+    def available_at(self):
+        """Epoch seconds the daily budget allows sending again: now, or midnight once it is spent."""
+        with self._cond:
+            self._refill(time.monotonic())
+            if not self.daily or self.reserved:
+                return time.time()
+            if self.quota is None:
+                spent = self.sent_today >= self.daily
+            else:
+                spent = self.quota.sent(self.key, self._day.isoformat()) >= self.daily
+        return next_midnight() if spent else time.time()
+
+    def _report(self, now):
+        if now - self._reported >= REPORT_EVERY and self.waiting > 1:
+            self._reported = now
+            self.logger.info(f"RATE [{self.key}]: {self.status()}")
+
+    def status(self):
+        sent = self.sent_today
+        if self.daily and self.quota is not None:
+            # Every process's sends today; other processes' unused reservations count as sent
+            sent = self.quota.sent(self.key, self._day.isoformat()) - self.reserved
+        budget = f"/{self.daily}" if self.daily else ""
+        return f"{self.rate:.2f} msg/s, {self.waiting} queued, {sent}{budget} sent today"
+
+    def on_success(self):
+        with self._cond:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        with self._cond:
+            before = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = 0.0
+            self.sent_today = max(0, self.sent_today - 1)
+            if self.daily and self.quota is not None:
+                # The refused message is retried later; its reservation goes back to the local pool
+                self.reserved += 1
+        self.logger.warning(f"THROTTLED [{self.key}]: rate {before:.2f} -> {self.rate:.2f} msg/s, {self.waiting} queued")
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(logger, server, account, rate=10.0, daily=None, quota=None):
+    """One limiter per (server, account) for the whole process, shared by every run.
+
+    Later calls apply their rate and daily limit, so edited settings take
+    effect on the next run without a restart.
+    """
+    key = f"{account}@{server}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveLimiter(logger, key, rate=rate, daily=daily, quota=quota)
+            return limiter
+    limiter.configure(rate, daily)
+    if quota is not None:
+        limiter.quota = quota
+    return limiter
@@ -0,0 +1,93 @@
+import smtplib
+import threading
+import time
+
+from api.errors import ChannelError, is_throttle
+from api.pool import SMTPPool
+from api.ratelimit import limiter_for
+
+# An MX that refused or dropped a connection is tried last for this long
+MX_HOLDDOWN = 60.0
+
+
+class DirectRouter:
+    """Direct delivery: each recipient goes to its domain's MX hosts.
+
+    Every MX host has its own session pool and AIMD limiter, so domains
+    hosted together share connections while a slow or throttling provider
+    only holds back its own group. Sends to one domain are capped at
+    domain_concurrency at a time.
+    """
+
+    def __init__(self, logger, resolver, port=25, sessions=2, domain_concurrency=2,
+                 max_messages=100, rate=10.0, helo=None):
+        self.logger = logger
+        self.resolver = resolver
+        self.port = int(port)
+        self.sessions = max(1, int(sessions))
+        self.domain_concurrency = max(1, int(domain_concurrency))
+        self.max_messages = int(max_messages)
+        self.rate = float(rate)
+        self.helo = helo
+        self._pools = {}
+        self._slots = {}
+        self._down = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, host):
+        with self._lock:
+            pool = self._pools.get(host)
+            if pool is None:
+                # MX hosts take unauthenticated mail for their own domains; TLS when offered
+                pool = self._pools[host] = SMTPPool(
+                    self.logger, host, self.port, None, None, max_sessions=self.sessions,
+                    max_messages=self.max_messages, starttls="auto", helo=self.helo,
+                )
+            return pool
+
+    def _slot(self, domain):
+        with self._lock:
+            if domain not in self._slots:
+                self._slots[domain] = threading.BoundedSemaphore(self.domain_concurrency)
+            return self._slots[domain]
+
+    def send(self, from_addr, to_addr, chunks):
+        """Tries the domain's MX hosts in preference order until one answers."""
+        domain = to_addr.rpartition("@")[2].lower()
+        hosts = self.resolver.mx(domain)
+        if not hosts:
+            raise ChannelError(f"{domain} does not accept mail (no MX)")
+
+        # Hosts that just failed go to the back instead of costing every message a connect
+        now = time.monotonic()
+        hosts = sorted(hosts, key=lambda h: self._down.get(h, 0) > now)
+
+        last = None
+        with self._slot(domain):
+            for host in hosts:
+                limiter = limiter_for(self.logger, host, "direct", rate=self.rate)
+                limiter.acquire()
+                try:
+                    refused = self._pool(host).send(from_addr, to_addr, chunks)
+                except (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected) as e:
+                    last = e
+                except smtplib.SMTPException as e:
+                    # A reply from the MX is its verdict on this message; no point asking a backup
+                    if is_throttle(e):
+                        limiter.on_throttle()
+                    raise
+                except OSError as e:
+                    last = e
+                else:
+                    limiter.on_success()
+                    self._down.pop(host, None)
+                    return refused
+                self._down[host] = time.monotonic() + MX_HOLDDOWN
+                self.logger.warning(f"MX {host} UNREACHABLE for {domain}: {last}. Trying next.")
+        raise last
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
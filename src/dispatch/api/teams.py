@@ -0,0 +1,245 @@
+import hashlib
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future
+
+from api.errors import ChannelError
+from utils.ttlcache import PersistentTTLCache
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+LOGIN_URL = "https://login.microsoftonline.com"
+
+# Graph accepts at most 20 requests per $batch
+BATCH_LIMIT = 20
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+USER_TTL = 7 * 24 * 3600
+MISS_TTL = 3600
+# Delegated permissions the sender signs in with. Posting to a chat needs a user token:
+# app-only tokens may only call POST /chats/{id}/messages for migration.
+SCOPES = "https://graph.microsoft.com/Chat.ReadWrite https://graph.microsoft.com/User.ReadBasic.All offline_access"
+# Entra refresh tokens stop working after 90 days without use
+REFRESH_TTL = 90 * 24 * 3600
+
+
+class GraphClient:
+    """Minimal Microsoft Graph client over urllib, acting as the sender (delegated tokens).
+
+    Access tokens come from the sender's refresh token. Each refresh returns a
+    new refresh token; it is kept in token_store (a PersistentTTLCache) so
+    restarts keep using the latest one instead of the configured original.
+    """
+
+    def __init__(self, tenant, client_id, client_secret, refresh_token, graph_url=GRAPH_URL,
+                 login_url=LOGIN_URL, timeout=15, token_store=None):
+        self.tenant = tenant
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.graph_url = graph_url.rstrip("/")
+        self.login_url = login_url.rstrip("/")
+        self.timeout = timeout
+        self.token_store = token_store
+        # Stored rotations belong to the configured token; a newly pasted one starts over
+        self._store_key = hashlib.sha256(refresh_token.encode()).hexdigest()[:16]
+        stored = token_store.get_many([self._store_key]) if token_store else {}
+        self.refresh_token = stored.get(self._store_key) or refresh_token
+        self._token = None
+        self._token_expires = 0.0
+        self._lock = threading.Lock()
+
+    def token(self):
+        with self._lock:
+            if self._token and time.time() < self._token_expires:
+                return self._token
+            form = {
+                "client_id": self.client_id,
+                "grant_type": "refresh_token",
+                "refresh_token": self.refresh_token,
+                "scope": SCOPES,
+            }
+            # Public clients (device-code sign-in) have no secret
+            if self.client_secret:
+                form["client_secret"] = self.client_secret
+            url = f"{self.login_url}/{self.tenant}/oauth2/v2.0/token"
+            req = urllib.request.Request(url, data=urllib.parse.urlencode(form).encode())
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                    data = json.load(r)
+            except urllib.error.HTTPError as e:
+                # 400 invalid_grant: the sign-in was revoked or expired; only a new token helps
+                raise ChannelError(f"Teams sign-in refused (HTTP {e.code}); renew TEAMS_REFRESH_TOKEN",
+                                   transient=e.code in TRANSIENT_STATUS)
+            except (urllib.error.URLError, OSError) as e:
+                raise ChannelError(f"Teams sign-in unreachable: {e}", transient=True)
+            self._token = data["access_token"]
+            self._token_expires = time.time() + int(data.get("expires_in", 3600)) - 60
+            if data.get("refresh_token") and data["refresh_token"] != self.refresh_token:
+                self.refresh_token = data["refresh_token"]
+                if self.token_store:
+                    self.token_store.put_many({self._store_key: self.refresh_token}, REFRESH_TTL)
+            return self._token
+
+    def request(self, method, path, body=None):
+        req = urllib.request.Request(
+            f"{self.graph_url}{path}", method=method,
+            data=json.dumps(body).encode() if body is not None else None,
+            headers={"Authorization": f"Bearer {self.token()}", "Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                return json.load(r)
+        except urllib.error.HTTPError as e:
+            raise ChannelError(f"Graph {method} {path}: HTTP {e.code}", transient=e.code in TRANSIENT_STATUS)
+        except (urllib.error.URLError, OSError) as e:
+            raise ChannelError(f"Graph unreachable: {e}", transient=True)
+
+    def batch(self, requests):
+        """Runs requests through $batch in groups of 20; returns {id: (status, body)}."""
+        results = {}
+        for i in range(0, len(requests), BATCH_LIMIT):
+            chunk = requests[i:i + BATCH_LIMIT]
+            for req in chunk:
+                if "body" in req:
+                    req.setdefault("headers", {"Content-Type": "application/json"})
+            data = self.request("POST", "/$batch", {"requests": chunk})
+            for resp in data.get("responses", []):
+                results[resp["id"]] = (resp.get("status", 500), resp.get("body") or {})
+        return results
+
+
+class TeamsChannel:
+    """Teams chat delivery: cached email -> user/chat resolution and $batch sends.
+
+    Concurrent deliver() calls from the engine's workers are coalesced by a
+    background flusher into $batch requests of up to 20 messages.
+    """
+
+    def __init__(self, logger, client, sender_id, cache_path, ttl=USER_TTL, linger=0.05):
+        self.logger = logger
+        self.client = client
+        self.sender_id = sender_id
+        self.ttl = ttl
+        self.linger = linger
+        self.users = PersistentTTLCache(cache_path, "teams_user")
+        self.chats = PersistentTTLCache(cache_path, "teams_chat")
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._flusher, name="teams-batch", daemon=True)
+        self._thread.start()
+
+    # --- RESOLUTION ---
+    def resolve_users(self, emails):
+        """email -> user id (None when unknown), hitting Graph only for cache misses."""
+        emails = sorted({e.lower() for e in emails})
+        found = self.users.get_many(emails)
+        misses = [e for e in emails if e not in found]
+        if misses:
+            results = self.client.batch([
+                {"id": str(i), "method": "GET", "url": f"/users/{urllib.parse.quote(e, safe='@')}?$select=id"}
+                for i, e in enumerate(misses)
+            ])
+            hits, unknown = {}, {}
+            for i, email in enumerate(misses):
+                status, body = results.get(str(i), (500, {}))
+                if status == 200:
+                    hits[email] = body.get("id")
+                elif status == 404:
+                    unknown[email] = None
+                elif status in TRANSIENT_STATUS:
+                    raise ChannelError(f"Graph user lookup throttled (HTTP {status})", transient=True)
+            if hits: self.users.put_many(hits, self.ttl)
+            if unknown: self.users.put_many(unknown, MISS_TTL)
+            found.update(hits)
+            found.update(unknown)
+        return found
+
+    def resolve_chats(self, user_ids):
+        """user id -> one-on-one chat id with the sender, creating chats as needed."""
+        found = self.chats.get_many(user_ids)
+        misses = [u for u in user_ids if u not in found]
+        if misses:
+            member = lambda uid: {
+                "@odata.type": "#microsoft.graph.aadUserConversationMember",
+                "roles": ["owner"],
+                "user@odata.bind": f"{self.client.graph_url}/users('{uid}')",
+            }
+            results = self.client.batch([
+                {"id": str(i), "method": "POST", "url": "/chats",
+                 "body": {"chatType": "oneOnOne", "members": [member(self.sender_id), member(uid)]}}
+                for i, uid in enumerate(misses)
+            ])
+            created = {}
+            for i, uid in enumerate(misses):
+                status, body = results.get(str(i), (500, {}))
+                if status in (200, 201) and body.get("id"):
+                    created[uid] = body["id"]
+                elif status in TRANSIENT_STATUS:
+                    raise ChannelError(f"Graph chat creation throttled (HTTP {status})", transient=True)
+            if created: self.chats.put_many(created, self.ttl)
+            found.update(created)
+        return found
+
+    # --- DELIVERY ---
+    def deliver(self, email, subject, body):
+        """Blocks until the message's batch is sent; raises ChannelError on failure."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise ChannelError("Teams channel closed")
+            self._pending.append((email, f"<b>{subject}</b><br>{body}", future))
+            self._cond.notify()
+        future.result()
+
+    def _flusher(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                if len(self._pending) < BATCH_LIMIT and not self._closed:
+                    # Give concurrent workers a moment to fill the batch
+                    self._cond.wait(self.linger)
+                items, self._pending = self._pending[:BATCH_LIMIT], self._pending[BATCH_LIMIT:]
+            self._send(items)
+
+    def _send(self, items):
+        try:
+            users = self.resolve_users(email for email, _, _ in items)
+            chats = self.resolve_chats(sorted({uid for uid in users.values() if uid}))
+            requests, waiting = [], {}
+            for i, (email, html, future) in enumerate(items):
+                uid = users.get(email.lower())
+                if uid is None:
+                    future.set_exception(ChannelError(f"Teams user {email} not found"))
+                    continue
+                chat = chats.get(uid)
+                if chat is None:
+                    future.set_exception(ChannelError(f"Teams chat with {email} could not be created"))
+                    continue
+                requests.append({"id": str(i), "method": "POST", "url": f"/chats/{chat}/messages",
+                                 "body": {"body": {"contentType": "html", "content": html}}})
+                waiting[str(i)] = future
+            results = self.client.batch(requests) if requests else {}
+            for rid, future in waiting.items():
+                status, _ = results.get(rid, (500, {}))
+                if status in (200, 201):
+                    future.set_result(True)
+                else:
+                    future.set_exception(ChannelError(f"Teams send HTTP {status}", transient=status in TRANSIENT_STATUS))
+        except Exception as e:
+            error = e if isinstance(e, ChannelError) else ChannelError(str(e), transient=True)
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(error)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
@@ -0,0 +1,75 @@
+__all__ = ["MissionTemplate", "TemplateSyntaxError"]
+
+
+class TemplateSyntaxError(ValueError):
+    """A mission subject/body that does not compile, fails to render or reaches outside the sandbox.
+
+    Wraps jinja2's error.
+    """
+
+
+_env = None
+
+
+def _sandbox():
+    from jinja2.exceptions import SecurityError
+    from jinja2.sandbox import ImmutableSandboxedEnvironment
+
+    class Sandbox(ImmutableSandboxedEnvironment):
+        def unsafe_undefined(self, obj, attribute):
+            # Fail the template instead of rendering the blocked attribute as empty
+            raise SecurityError(f"access to attribute {attribute!r} of {type(obj).__name__!r} object is unsafe")
+
+    return Sandbox
+
+
+def _environment():
+    # jinja2 is imported on first use so startup does not pay for it
+    global _env
+    if _env is None:
+        # Subject and body come from the API: sandboxed so they cannot reach
+        # dunder attributes, globals or mutate the operative's context.
+        # Body is wrapped into the HTML container verbatim, so no autoescape here.
+        # Unknown placeholders render empty rather than aborting a run.
+        _env = _sandbox()(autoescape=False, keep_trailing_newline=True)
+    return _env
+
+
+def _is_static(source):
+    return "{{" not in source and "{%" not in source and "{#" not in source
+
+
+def _compile(source):
+    if _is_static(source):
+        return None
+    import jinja2
+    try:
+        return _environment().from_string(source)
+    except jinja2.TemplateSyntaxError as e:
+        raise TemplateSyntaxError(str(e)) from e
+
+
+class MissionTemplate:
+    """Subject and body compiled once per run and rendered per operative."""
+
+    def __init__(self, subject, body):
+        self.subject_source = subject
+        self.body_source = body
+        self.static = _is_static(subject) and _is_static(body)
+        # Compiling raises TemplateSyntaxError up front instead of per recipient
+        self._subject = _compile(subject)
+        self._body = _compile(body)
+
+    def render(self, context):
+        if self.static:
+            return self.subject_source, self.body_source
+        from jinja2.exceptions import SecurityError, TemplateError
+        try:
+            subject = self.subject_source if self._subject is None else self._subject.render(context)
+            body = self.body_source if self._body is None else self._body.render(context)
+        except SecurityError as e:
+            raise TemplateSyntaxError(f"Unsafe template: {e}") from e
+        except (TemplateError, TypeError, ValueError, ArithmeticError) as e:
+            # Extra fields are optional: {{ manager.name }} fails for operatives without one
+            raise TemplateSyntaxError(f"Template failed to render: {e}") from e
+        return subject, body
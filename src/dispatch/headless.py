@@ -0,0 +1,93 @@
+"""Headless mode: API and scheduler in this process, dispatch in worker processes.
+
+    python src/dispatch/headless.py --workers 4 --host 0.0.0.0 --port 8000
+
+Workers pull runs from the shared outbox and lease messages row by row, so
+several of them can drain the same run. Only the instance holding the
+scheduler lease fires the cron; any number of instances can share a config.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+
+# Workers re-check the outbox this often when there is nothing to send
+POLL_INTERVAL = 2.0
+SHUTDOWN_GRACE = 10.0
+
+
+def worker(index, share, stop, metrics_dir, log_queue):
+    from utils import logger as logs
+    # Before server sets up logging: the API process writes (and rotates) mission_log.log
+    logs.forward_to(log_queue)
+    import server
+    from utils import metrics
+    # The API process adds these up in /api/metrics
+    metrics.share(metrics_dir)
+    server.logger.info(f"WORKER {index} ONLINE (pid {os.getpid()}).")
+    try:
+        while not stop.is_set():
+            # Runs on hold after an abort are skipped until their backoff is over
+            sent = False
+            for run_id in server.outbox.unfinished_runs(due=True):
+                if stop.is_set():
+                    break
+                try:
+                    sent = server.drain_run(run_id, share=share) or sent
+                except Exception as e:
+                    server.logger.error(f"WORKER {index}: RUN {run_id} ABORTED: {e}")
+                    server.outbox.defer_run(run_id)
+            if sent:
+                metrics.flush()
+            else:
+                stop.wait(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    metrics.flush()
+    server.logger.info(f"WORKER {index} OFFLINE.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Dispatch without the desktop window.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="dispatch worker processes (0 sends from the API process)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    import server
+    from utils import logger as logs
+
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    procs = []
+    if args.workers > 0:
+        server.INLINE_DISPATCH = False
+        # One directory per instance: several instances may share a config
+        server.METRICS_SHARE = os.path.join(server.METRICS_DIR, str(os.getpid()))
+        shutil.rmtree(server.METRICS_SHARE, ignore_errors=True)
+        log_queue = ctx.Queue()
+        logs.listen(log_queue)
+        procs = [ctx.Process(target=worker, args=(i, args.workers, stop, server.METRICS_SHARE, log_queue),
+                             name=f"dispatch-worker-{i}")
+                 for i in range(args.workers)]
+        for p in procs:
+            p.start()
+    server.logger.info(f"HEADLESS COMMAND ONLINE: {args.host}:{args.port} | {args.workers} worker(s).")
+
+    try:
+        uvicorn.run(server.app, host=args.host, port=args.port, log_level="error")
+    finally:
+        stop.set()
+        for p in procs:
+            p.join(SHUTDOWN_GRACE)
+            if p.is_alive():
+                # Rows it had leased go back to the queue when the lease expires
+                p.terminate()
+        if server.METRICS_SHARE:
+            shutil.rmtree(server.METRICS_SHARE, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
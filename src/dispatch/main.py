@@ -1,73 +1,83 @@
-import time
-import json
+"""Standalone daemon: fires missions at their trigger_time without the dashboard.
+
+Sleeps until the next computed H-Hour and wakes early only when targets.json
+changes. Runs go through the same outbox, engine and scheduler lease as the
+server, so it can sit next to a desktop or headless instance safely.
+"""
+import threading
 from datetime import datetime
-from utils.logger import setup_logger
-from api.connector import MicrosoftConnector
 
-# -- PARAMETRIZAÇÃO --
-CONFIG_PATH = "config/targets.json"
+import server
+from utils.missions import all_missions, next_fire_time
+from utils.watcher import FileWatcher
 
-def load_intel():
-    try:
-        with open(CONFIG_PATH, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
+# Longest single sleep; re-checks the wall clock after suspend or clock changes
+MAX_SLEEP = 3600.0
 
-def main():
-    logger = setup_logger()
-    logger.info("SYSTEM BOOT. Inicializando integração...")
 
-    # Carrega informações
-    config = load_intel()
-    if not config:
-        logger.critical("INTEL MISSING. config/targets. não encontrado. Abortando.")
-        return
+def arm(missions, armed, now):
+    """{name: (trigger_time, fire_at)}; unchanged triggers keep their pending fire time."""
+    schedule = {}
+    for name, mission in missions.items():
+        trigger = mission.get('trigger_time')
+        if name in armed and armed[name][0] == trigger:
+            schedule[name] = armed[name]
+            continue
+        fire_at = next_fire_time(mission, now)
+        if fire_at is not None:
+            schedule[name] = (trigger, fire_at)
+    return schedule
+
 
-    trigger_time = config['mission_config']['trigger_time']
-    logger.info(f"ENVIO SETADO. Tempo: {trigger_time} diario.")
+def main():
+    logger = server.logger
+    logger.info("SYSTEM BOOT. Inicializando integração...")
+    server.migrate_roster()
 
-    comms = MicrosoftConnector(logger)
-    comms.authenticate()
+    watcher = FileWatcher(server.CONFIG_PATH)
+    logger.info(f"WATCHING {server.CONFIG_PATH} ({watcher.mode}).")
 
-    mission_accomplished_today = False
+    # Interrupted runs first, like the server does on boot
+    if server.outbox.unfinished_runs():
+        threading.Thread(target=server.resume_missions, name="resume").start()
 
+    armed, announced = {}, None
     try:
         while True:
-            now = datetime.now()
-            current_time = now.strftime("%H:%M")
-
-            if current_time == trigger_time:
-                if not mission_accomplished_today:
-                    logger.info("H-HOUR CHEGOU. Executando ordens.")
+            config = server.config_store.read()
+            if not config:
+                logger.critical("INTEL MISSING. config/targets.json não encontrado. Aguardando...")
+                watcher.wait()
+                continue
 
-                    for operative in config['operatives']:
-                        email = operative['email']
-
-                        # Phase 1: Identify
-                        target_id = comms.find_user_id(email)
-
-                        # Phase 2: Engage
-                        if target_id:
-                            comms.send_dispatch(target_id, "TEAMS_MESSAGE")
-                            comms.send_dispatch(target_id, "EMAIL_ALERT")
-                        else:
-                            logger.warning(f"Alvo {email} desconhecido. Não pode ser localizado.")
+            missions = all_missions(config)
+            now = datetime.now()
+            armed = arm(missions, armed, now)
 
-                    mission_accomplished_today = True
-                    logger.info("COMPLETO. Se preparando para o proximo ciclo.")
+            for name, (trigger, fire_at) in list(armed.items()):
+                if fire_at <= now:
+                    logger.info(f"H-HOUR CHEGOU [{name}]. Executando ordens.")
+                    threading.Thread(target=server.scheduled_mission, args=(name,), name=f"mission-{name}").start()
+                    armed[name] = (trigger, next_fire_time(missions[name], fire_at))
 
-            else:
-                if current_time != trigger_time:
-                    mission_accomplished_today = False
+            timeout = None
+            if armed:
+                name, (_, fire_at) = min(armed.items(), key=lambda item: item[1][1])
+                if (name, fire_at) != announced:
+                    announced = (name, fire_at)
+                    logger.info(f"ENVIO SETADO [{name}]: {fire_at:%Y-%m-%d %H:%M}.")
+                timeout = min(MAX_SLEEP, max(0.0, (fire_at - datetime.now()).total_seconds()))
 
-            time.sleep(30)
+            if watcher.wait(timeout):
+                logger.info("INTEL UPDATED. Recalculando H-Hour.")
 
     except KeyboardInterrupt:
         logger.info("MANUAL OVERRIDE. Sistema desligando.")
     except Exception as e:
         logger.error(f"SYSTEM FAILURE: {str(e)}")
         raise e
+    finally:
+        watcher.close()
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,50 @@
 import os
 import sys
 import json
-import uvicorn
+import asyncio
 import logging
+import tempfile
 import threading
-import webview
+import time
 from datetime import datetime
 from contextlib import asynccontextmanager
 
+from utils import startup
 from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from starlette.middleware.gzip import GZipMiddleware
 from apscheduler.schedulers.background import BackgroundScheduler
 from pydantic import BaseModel
+from typing import List, Optional
 
 from utils.logger import setup_logger
-from utils.security import IntelSecurity
-from api.connector import MicrosoftConnector
+from utils.security import IntelSecurity, SecretVault
+from api.connector import shared_connector
+from api.attachments import load_attachment
+from api.channels import CHANNELS
+from api.engine import DispatchEngine, DEFAULT_CHANNELS, configure_budget
+from api.templating import MissionTemplate, TemplateSyntaxError
+from utils.outbox import Outbox, RUN_MAX_ABORTS, RUN_MAX_AGE
+from utils.leader import Lease
+from utils.ledger import Ledger, STATUSES
+from utils.store import JsonStore
+from utils.roster import Roster
+from utils.importer import iter_records, normalize
+from utils.logtail import read_since
+from utils.httpcache import MIN_COMPRESS, conditional, etag, file_version
+from utils.missions import (DEFAULT_MISSION, DEFAULT_SUBJECT, DEFAULT_BODY, JOB_ID,
+                            all_missions, fire_time, job_id, roster_filter)
+from utils import metrics
+
+# webview, uvicorn, cryptography and jinja2 are imported on first use
+startup.mark("imports")
 
 # --- 1. PATH RECALIBRATION ---
-if getattr(sys, 'frozen', False):
+if os.environ.get('DISPATCH_HOME'):
+    PROJECT_ROOT = os.path.abspath(os.environ['DISPATCH_HOME'])
+elif getattr(sys, 'frozen', False):
     PROJECT_ROOT = os.path.dirname(sys.executable)
 else:
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -33,23 +57,55 @@ CONFIG_PATH = os.path.join(PROJECT_ROOT, "config", "targets.json")
 SECRETS_PATH = os.path.join(PROJECT_ROOT, "config", "secrets.json")
 KEY_PATH = os.path.join(PROJECT_ROOT, "config", "master.key")
 LOG_PATH = os.path.join(PROJECT_ROOT, "logs", "mission_log.log")
+OUTBOX_PATH = os.path.join(PROJECT_ROOT, "config", "outbox.db")
+ROSTER_PATH = os.path.join(PROJECT_ROOT, "config", "roster.db")
+# Worker processes publish their counters under METRICS_DIR/<api pid>; headless sets METRICS_SHARE
+METRICS_DIR = os.path.join(PROJECT_ROOT, "config", "metrics")
+METRICS_SHARE = None
+LEDGER_PATH = os.path.join(PROJECT_ROOT, "config", "ledger.db")
+ATTACHMENTS_DIR = os.path.join(PROJECT_ROOT, "config", "attachments")
+# base64 encodings keyed by content hash; safe to delete, rebuilt on the next run
+ATTACHMENT_CACHE = os.path.join(PROJECT_ROOT, "config", "cache", "attachments")
 
 os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-logger = setup_logger()
+logger = setup_logger(path=LOG_PATH)
 security_officer = IntelSecurity(KEY_PATH)
+secrets_vault = SecretVault(SECRETS_PATH, security_officer, logger)
+config_store = JsonStore(CONFIG_PATH)
+roster = Roster(ROSTER_PATH)
+outbox = Outbox(OUTBOX_PATH)
+ledger = Ledger(LEDGER_PATH)
+startup.mark("stores")
+
+# One instance per config owns the cron, whatever else is running against it
+LEADER_TTL = 30
+leadership = Lease(OUTBOX_PATH, "scheduler", ttl=LEADER_TTL)
 
 scheduler = BackgroundScheduler()
-JOB_ID = 'mission_trigger'
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    if os.path.exists(CONFIG_PATH):
+    migrate_roster()
+    if config_store.exists():
         load_schedule_logic()
+    scheduler.add_job(hold_leadership, 'interval', seconds=LEADER_TTL / 3, id='leader_heartbeat',
+                      replace_existing=True, next_run_time=datetime.now())
+    scheduler.add_job(compact_ledger, 'cron', hour=3, minute=30, id='ledger_compaction', replace_existing=True)
+    if INLINE_DISPATCH and outbox.unfinished_runs():
+        scheduler.add_job(resume_missions, id='resume_missions', replace_existing=True)
     scheduler.start()
+    startup.mark("lifespan")
+    for phase, seconds in startup.phases():
+        metrics.STARTUP.set(round(seconds, 4), phase=phase)
+    logger.info(f"STARTUP: {startup.report()}")
     yield
     scheduler.shutdown()
+    if leadership.held:
+        leadership.release()
 
 app = FastAPI(lifespan=lifespan)
+# Everything else (dashboard HTML, ledger queries); conditional() responses are already encoded
+app.add_middleware(GZipMiddleware, minimum_size=MIN_COMPRESS, compresslevel=6)
 
 def get_resource_path(relative_path):
     try:
@@ -58,17 +114,18 @@ def get_resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-frontend_path = "src/frontend"
+# Next to this file, so the server works from any working directory
+frontend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend")
 if getattr(sys, 'frozen', False):
     frontend_path = get_resource_path("src/frontend")
 
 app.mount("/static", StaticFiles(directory=frontend_path), name="static")
-templates = Jinja2Templates(directory=frontend_path)
 
 # --- UPDATED DATA MODELS ---
 class NewTarget(BaseModel):
     name: str
     email: str
+    fields: dict = {}
 
 # UPDATED: Now includes Subject and Body
 class ConfigUpdate(BaseModel):
@@ -76,155 +133,583 @@ class ConfigUpdate(BaseModel):
     email_subject: str
     email_body: str
 
+class MissionUpdate(BaseModel):
+    trigger_time: str
+    email_subject: str
+    email_body: str
+    tags: list = []
+    window_minutes: int = 0
+    workers: Optional[int] = None
+    channels: list = []
+    attachments: list = []
+
+class PreviewRequest(BaseModel):
+    email: Optional[str] = None
+    email_subject: Optional[str] = None
+    email_body: Optional[str] = None
+
+class SenderAccountUpdate(BaseModel):
+    email_user: str
+    email_pass: str
+    smtp_server: Optional[str] = None
+    smtp_port: Optional[int] = None
+    weight: int = 1
+    rate_per_sec: Optional[float] = None
+    daily_limit: Optional[int] = None
+
 class SecretsUpdate(BaseModel):
+    """Fields left out (None) keep their stored value; accounts=[] removes the extra senders."""
     email_user: str
     email_pass: str
-    smtp_server: str = "smtp.gmail.com"
-    smtp_port: int = 587
+    smtp_server: Optional[str] = None
+    smtp_port: Optional[int] = None
+    smtp_delivery: Optional[str] = None
+    dns_server: Optional[str] = None
+    accounts: Optional[List[SenderAccountUpdate]] = None
 
 # --- HELPERS ---
-def load_json(path):
-    try:
-        if not os.path.exists(path): return {}
-        with open(path, 'r') as f: return json.load(f)
-    except: return {}
+IMPORT_BATCH = 1000
+# What GET /api/settings shows instead of a password (and the form may post back)
+PASSWORD_MASK = "********"
+
+def migrate_roster():
+    """Moves operatives out of targets.json into the indexed roster (one-time)."""
+    legacy = config_store.read().get('operatives')
+    if not legacy:
+        return
+    roster.add_many(op for op in legacy if op.get('email'))
+    config_store.update(lambda c: c.pop('operatives', None))
+    logger.info(f"ROSTER MIGRATED: {len(legacy)} operatives moved to {ROSTER_PATH}.")
 
-def save_json(path, data):
-    try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w') as f: json.dump(data, f, indent=4)
-        return True
-    except: return False
+
+def attachment_path(name):
+    """Path of an uploaded attachment; rejects names that would leave ATTACHMENTS_DIR."""
+    if not name or os.path.basename(name) != name or name.startswith('.'):
+        raise ValueError(f"Invalid attachment name: {name!r}")
+    return os.path.join(ATTACHMENTS_DIR, name)
 
 def load_secrets():
-    if not os.path.exists(SECRETS_PATH): return {}
-    try:
-        with open(SECRETS_PATH, 'r') as f: content = f.read()
-        if content.strip().startswith('{'):
-            data = json.loads(content)
-            save_secrets(data)
-            return data
-        return security_officer.decrypt_payload(content)
+    try: return secrets_vault.load()
     except: return {}
 
 def save_secrets(data):
     try:
-        encrypted = security_officer.encrypt_payload(data)
-        os.makedirs(os.path.dirname(SECRETS_PATH), exist_ok=True)
-        with open(SECRETS_PATH, 'w') as f: f.write(encrypted)
+        secrets_vault.save(data)
         return True
     except: return False
 
-def execute_mission():
-    logger.info("MANUAL/AUTO OVERRIDE INITIATED...")
-    targets = load_json(CONFIG_PATH)
-    secrets = load_secrets()
-
-    if not targets.get('operatives'):
+def queue_mission(run_id=None, mission=DEFAULT_MISSION, fired_at=None):
+    """Creates the run and its outbox rows (or finds the run to resume); returns the run id."""
+    expire_stale_runs()
+    # Resume an interrupted run before starting a fresh one
+    if run_id is None:
+        pending = outbox.unfinished_runs(mission)
+        run_id = pending[0] if pending else f"manual-{mission}-{datetime.now():%Y%m%d-%H%M%S}"
+
+    run = outbox.get_run(run_id)
+    if run is not None:
+        if run['finished']:
+            logger.info(f"RUN {run_id} ALREADY EXECUTED{' (ABANDONED)' if run['aborted'] else ''}.")
+            return run_id
+        logger.info(f"RESUMING RUN {run_id} [{run['mission']}]: {outbox.counts(run_id)}")
+        return run_id
+
+    if not roster.count():
         logger.error("INTEL FAILURE: No targets.")
+        return None
+    mission_config = all_missions(config_store.read()).get(mission, {})
+    subject = mission_config.get('subject', DEFAULT_SUBJECT)
+    body = mission_config.get('body', DEFAULT_BODY)
+
+    # Rows first: workers only see the run once all of its messages are queued
+    selected = filter(roster_filter(mission_config), roster.iter_all())
+    queued = outbox.enqueue(run_id, selected, mission_config.get('channels') or DEFAULT_CHANNELS)
+    outbox.create_run(run_id, subject, body, mission, fired_at=fired_at,
+                      attachments=mission_config.get('attachments') or ())
+    logger.info(f"RUN {run_id} [{mission}] QUEUED: {queued} messages.")
+    return run_id
+
+def abandon_run(run_id, reason):
+    dropped = outbox.abandon_run(run_id, reason)
+    logger.error(f"RUN {run_id} ABANDONED: {reason}. {dropped} messages not sent.")
+
+def expire_stale_runs():
+    """Abandons unfinished runs older than RUN_MAX_AGE instead of resuming their old content."""
+    for run_id in outbox.stale_runs():
+        abandon_run(run_id, f"expired after {RUN_MAX_AGE / 3600:g}h unfinished")
+
+def abort_run(run_id, reason):
+    """Logs why a run could not start and puts it on hold so workers back off."""
+    logger.error(f"ABORT: {reason}")
+    delay = outbox.defer_run(run_id)
+    run = outbox.get_run(run_id)
+    if run is not None and run['aborts'] >= RUN_MAX_ABORTS:
+        abandon_run(run_id, f"gave up after {run['aborts']} failed starts ({reason})")
         return
+    logger.warning(f"RUN {run_id} ON HOLD: next attempt in {delay:.0f}s.")
+
+def drain_run(run_id, share=1):
+    """Sends a queued run. share > 1 when that many worker processes drain it together:
+    each takes its slice of the provider rate and paced window.
+    Returns True when the run was sent, False when it could not start."""
+    run = outbox.get_run(run_id)
+    if run is None or run['finished']:
+        return False
+    if time.time() - run['created'] > RUN_MAX_AGE:
+        abandon_run(run_id, f"expired after {RUN_MAX_AGE / 3600:g}h unfinished")
+        return False
+    secrets = load_secrets()
+    if share > 1:
+        secrets = split_budget({'SMTP_RATE_PER_SEC': 10, **secrets}, share)
+        secrets['SENDER_ACCOUNTS'] = [split_budget(a, share) for a in secrets.get('SENDER_ACCOUNTS') or []]
+    mission_config = all_missions(config_store.read()).get(run['mission'], {})
 
-    mission_config = targets.get('mission_config', {})
-
-    subject = mission_config.get('subject', 'AVISO DE SISTEMA')
-    body = mission_config.get('body', 'Nenhuma mensagem configurada no despacho.')
-
-    comms = MicrosoftConnector(logger, secrets)
-    comms.authenticate()
+    try:
+        template = MissionTemplate(run['subject'], run['body'])
+    except TemplateSyntaxError as e:
+        abort_run(run_id, f"Protocol template invalid: {e}")
+        return False
 
-    if comms.connected:
-        for op in targets['operatives']:
-            logger.info(f"TARGET ACQUIRED: {op['email']}")
+    try:
+        # Encoded once per content hash; every message streams the same buffers
+        attachments = [load_attachment(attachment_path(n), ATTACHMENT_CACHE)
+                       for n in json.loads(run['attachments'] or '[]')]
+    except (OSError, ValueError) as e:
+        abort_run(run_id, f"Attachment unavailable: {e}")
+        return False
+
+    window = float(mission_config.get('window_minutes') or 0) * 60
+    window_end = run['created'] + window if window else None
+
+    configure_budget_from(secrets)
+    with shared_connector(logger, secrets, os.path.dirname(CONFIG_PATH)) as comms:
+        if not comms.connected:
+            abort_run(run_id, "SMTP Connection Failed.")
+            return False
+        workers = mission_config.get('workers') or secrets.get('DISPATCH_WORKERS', 8)
+        ledger.start_run(run_id, run['mission'])
+        engine = DispatchEngine(logger, comms, workers=workers, ledger=ledger)
+        summary = engine.run(outbox, run_id, template, window_end=window_end, shards=share,
+                             attachments=attachments)
+        if run['fired_at'] and summary.first_send:
+            metrics.SCHEDULER_LAG.observe(max(0.0, summary.first_send - run['fired_at']))
+        logger.info("PROTOCOL EXECUTED SUCCESSFULLY.")
+    return True
 
-            comms.send_dispatch(op['email'], "EMAIL_ALERT", subject, body)
-            comms.send_dispatch(op['email'], "TEAMS_MESSAGE", subject, body)
+# Headless mode turns this off: runs are only queued here and worker processes send them
+INLINE_DISPATCH = True
 
-        logger.info("PROTOCOL EXECUTED SUCCESSFULLY.")
-    else:
-        logger.error("ABORT: SMTP Connection Failed.")
+def execute_mission(run_id=None, mission=DEFAULT_MISSION, fired_at=None):
+    logger.info("MANUAL/AUTO OVERRIDE INITIATED...")
+    run_id = queue_mission(run_id, mission, fired_at)
+    if run_id and INLINE_DISPATCH:
+        try:
+            drain_run(run_id)
+        except Exception as e:
+            # Held like a headless worker's abort, so triggers do not resume it in a loop
+            abort_run(run_id, f"Run {run_id} failed: {e}")
+
+def compact_ledger():
+    """Daily: drops delivery history older than LEDGER_RETENTION_DAYS (default 90)."""
+    if not leadership.held:
+        return
+    days = float(load_secrets().get('LEDGER_RETENTION_DAYS', 90))
+    removed = ledger.compact(days)
+    logger.info(f"LEDGER COMPACTED: {removed} attempts older than {days:g} days removed.")
+
+_budget_setting = None
+
+def split_budget(settings, share):
+    """Copy of settings with this worker's slice of the rate.
+
+    The daily limit is not split: its count is shared through outbox.db.
+    """
+    settings = dict(settings)
+    if 'SMTP_RATE_PER_SEC' in settings:
+        settings['SMTP_RATE_PER_SEC'] = float(settings.get('SMTP_RATE_PER_SEC', 10)) / share
+    return settings
+
+def configure_budget_from(secrets):
+    global _budget_setting
+    limit = int(secrets.get('DISPATCH_MAX_CONCURRENCY', 16))
+    if limit != _budget_setting:
+        _budget_setting = limit
+        configure_budget(limit)
+
+def scheduled_mission(mission=DEFAULT_MISSION):
+    # Every instance arms the cron; only the lease holder fires it
+    if not leadership.acquire():
+        logger.info(f"STANDBY [{mission}]: schedule owned by {leadership.owner()}.")
+        return
+    # One run per mission per trigger: a duplicate fire re-uses the same idempotency keys,
+    # a trigger re-armed for later the same day gets a run of its own
+    now = datetime.now()
+    fired_at = fire_time(all_missions(config_store.read()).get(mission, {}), now)
+    fired = datetime.fromtimestamp(fired_at) if fired_at else now
+    execute_mission(f"{job_id(mission)}-{fired:%Y-%m-%d-%H%M}", mission, fired_at=fired_at)
+
+def resume_missions():
+    expire_stale_runs()
+    for run_id in outbox.unfinished_runs():
+        execute_mission(run_id)
+
+def hold_leadership():
+    was_leader = leadership.held
+    try:
+        is_leader = leadership.acquire()
+    except Exception as e:
+        logger.warning(f"LEADER LEASE UNAVAILABLE: {e}")
+        return
+    if is_leader and not was_leader:
+        logger.info(f"SCHEDULER LEADERSHIP ACQUIRED ({leadership.holder}).")
+    elif was_leader and not is_leader:
+        logger.warning("SCHEDULER LEADERSHIP LOST.")
+
+def arm_mission(name, mission):
+    t = mission.get('trigger_time')
+    if not t:
+        return
+    try:
+        h, m = t.split(':')
+        # max_instances > 1 lets a mission overlap itself if a paced window runs long
+        scheduler.add_job(scheduled_mission, 'cron', hour=h, minute=m, args=[name],
+                          id=job_id(name), replace_existing=True, max_instances=2)
+        logger.info(f"TIMER ARMED [{name}]. Target: {t}")
+    except: pass
 
 def load_schedule_logic():
-    c = load_json(CONFIG_PATH)
-    t = c.get('mission_config', {}).get('trigger_time')
-    if t:
-        try:
-            h, m = t.split(':')
-            scheduler.add_job(execute_mission, 'cron', hour=h, minute=m, id=JOB_ID, replace_existing=True)
-            logger.info(f"TIMER ARMED. Target: {t}")
-        except: pass
+    missions = all_missions(config_store.read())
+    for name, mission in missions.items():
+        arm_mission(name, mission)
+    # Drop jobs for missions that were removed
+    armed = {job_id(name) for name in missions}
+    for job in scheduler.get_jobs():
+        if job.id.startswith(JOB_ID) and job.id not in armed:
+            scheduler.remove_job(job.id)
 
 # --- API ENDPOINTS ---
 @app.get("/", response_class=HTMLResponse)
 async def read_dashboard(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    # Plain HTML (no template tags), so no Jinja environment is needed
+    return FileResponse(os.path.join(frontend_path, "index.html"), media_type="text/html")
 
 @app.post("/api/trigger")
-async def trigger_mission(bt: BackgroundTasks):
-    bt.add_task(execute_mission)
-    return {"status": "Execution Initiated"}
+async def trigger_mission(bt: BackgroundTasks, mission: str = DEFAULT_MISSION):
+    if mission not in all_missions(config_store.read()) and mission != DEFAULT_MISSION:
+        raise HTTPException(status_code=404, detail="Mission not found")
+    bt.add_task(execute_mission, None, mission)
+    return {"status": "Execution Initiated", "mission": mission}
+
+@app.get("/api/missions")
+async def get_missions():
+    return {"missions": all_missions(config_store.read())}
+
+@app.post("/api/missions/{name}")
+async def update_mission(name: str, d: MissionUpdate):
+    mission = {"trigger_time": d.trigger_time, "subject": d.email_subject, "body": d.email_body,
+               "tags": d.tags, "window_minutes": d.window_minutes}
+    if d.workers: mission["workers"] = d.workers
+    if d.channels:
+        unknown = set(d.channels) - set(CHANNELS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown channels: {', '.join(sorted(unknown))}")
+        mission["channels"] = d.channels
+    if d.attachments:
+        missing = [n for n in d.attachments if not os.path.isfile(attachment_or_400(n))]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown attachments: {', '.join(missing)}")
+        mission["attachments"] = d.attachments
+
+    def apply(c):
+        if name == DEFAULT_MISSION:
+            c.setdefault('mission_config', {}).update(mission)
+        else:
+            c.setdefault('missions', {})[name] = mission
+    config_store.update(apply)
+    load_schedule_logic()
+    return {"status": "success"}
+
+@app.delete("/api/missions/{name}")
+async def delete_mission(name: str):
+    if name == DEFAULT_MISSION:
+        raise HTTPException(status_code=400, detail="The default mission cannot be removed")
+    config_store.update(lambda c: c.get('missions', {}).pop(name, None))
+    load_schedule_logic()
+    return {"status": "success"}
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Prometheus text exposition."""
+    depth = await run_in_threadpool(outbox.queue_depth)
+    for status in ("pending", "sending"):
+        metrics.QUEUE_DEPTH.set(depth.get(status, 0), status=status)
+    return Response(metrics.render(METRICS_SHARE), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+LOG_STREAM_INTERVAL = 0.5
 
 @app.get("/api/logs")
-async def get_logs():
+async def get_logs(request: Request, cursor: Optional[str] = None):
     try:
         if not os.path.exists(LOG_PATH): return {"logs": ["System initializing..."]}
-        with open(LOG_PATH, "r") as f: return {"logs": f.readlines()[-20:]}
+        def build():
+            lines, next_cursor = read_since(LOG_PATH, cursor)
+            return {"logs": lines, "cursor": next_cursor}
+        # The cursor is in the URL; nothing new past it means the same tag
+        return conditional(request, etag("logs", file_version(LOG_PATH)), build)
     except: return {"logs": ["Waiting for logs..."]}
 
+@app.get("/api/logs/stream")
+async def stream_logs(request: Request):
+    """Server-Sent Events: pushes new log lines; reconnects resume from Last-Event-ID."""
+    async def events():
+        cursor = request.headers.get("last-event-id")
+        while not await request.is_disconnected():
+            if os.path.exists(LOG_PATH):
+                try:
+                    lines, next_cursor = read_since(LOG_PATH, cursor)
+                except OSError:
+                    lines, next_cursor = [], cursor
+                if lines:
+                    payload = "".join(f"data: {line.rstrip()}\n" for line in lines)
+                    yield f"id: {next_cursor}\n{payload}\n"
+                cursor = next_cursor
+            await asyncio.sleep(LOG_STREAM_INTERVAL)
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- DELIVERY LEDGER ---
+def ledger_status(status):
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    return status
+
+@app.get("/api/ledger/runs")
+async def get_ledger_runs(cursor: Optional[float] = None, limit: int = 50):
+    runs, next_cursor = ledger.runs(cursor, max(1, min(limit, 500)))
+    return {"runs": runs, "next_cursor": next_cursor}
+
+@app.get("/api/ledger/runs/{run_id}")
+async def get_ledger_run(run_id: str, status: Optional[str] = None, cursor: Optional[int] = None, limit: int = 100):
+    run = ledger.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    attempts, next_cursor = ledger.run_attempts(run_id, ledger_status(status), cursor, max(1, min(limit, 1000)))
+    return {"run": run, "attempts": attempts, "next_cursor": next_cursor}
+
+@app.get("/api/ledger/failures")
+async def get_ledger_failures(status: str = "failed", cursor: Optional[int] = None, limit: int = 100):
+    attempts, next_cursor = ledger.failures(ledger_status(status), cursor, max(1, min(limit, 1000)))
+    return {"attempts": attempts, "next_cursor": next_cursor}
+
+@app.get("/api/ledger/recipients/{email}")
+async def get_ledger_recipient(email: str, cursor: Optional[int] = None, limit: int = 100):
+    attempts, next_cursor = ledger.recipient(email, cursor, max(1, min(limit, 1000)))
+    return {"email": email, "attempts": attempts, "next_cursor": next_cursor}
+
 @app.get("/api/targets")
-async def get_targets():
-    return {"operatives": load_json(CONFIG_PATH).get('operatives', [])}
+async def get_targets(request: Request, cursor: int = 0, limit: int = 100, q: Optional[str] = None):
+    limit = max(1, min(limit, 1000))
+    def build():
+        operatives, next_cursor = roster.page(cursor, limit, q)
+        return {"operatives": operatives, "next_cursor": next_cursor, "total": roster.count()}
+    return conditional(request, etag("roster", roster.version()), build)
 
 @app.post("/api/targets")
 async def add_target(t: NewTarget):
-    c = load_json(CONFIG_PATH)
-    if 'operatives' not in c: c['operatives'] = []
-    c['operatives'].append({"name": t.name, "email": t.email})
-    save_json(CONFIG_PATH, c)
+    roster.add({**t.fields, "name": t.name, "email": t.email})
     return {"status": "success"}
 
-@app.get("/api/config")
-async def get_config():
-    # Return defaults if keys missing
-    conf = load_json(CONFIG_PATH).get('mission_config', {})
-    if 'subject' not in conf: conf['subject'] = "ALERTA DE SEGURANÇA"
-    if 'body' not in conf: conf['body'] = "Por favor, feche a planilha."
-    return conf
+@app.post("/api/targets/import")
+async def import_targets(request: Request, format: Optional[str] = None):
+    """Streams a CSV (header row) or NDJSON roster export into the roster in batches."""
+    fmt = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    before = await run_in_threadpool(roster.count)
+    batch, accepted, rejected = [], 0, 0
+
+    async for record in iter_records(request.stream(), fmt):
+        op = normalize(record)
+        if op is None:
+            rejected += 1
+            continue
+        batch.append(op)
+        if len(batch) >= IMPORT_BATCH:
+            await run_in_threadpool(roster.add_many, batch)
+            accepted += len(batch)
+            batch = []
+    if batch:
+        await run_in_threadpool(roster.add_many, batch)
+        accepted += len(batch)
+
+    added = await run_in_threadpool(roster.count) - before
+    logger.info(f"ROSTER IMPORT: {added} added, {accepted - added} updated, {rejected} rejected.")
+    return {"status": "success", "added": added, "updated": accepted - added, "rejected": rejected}
+
+# --- ATTACHMENTS ---
+def attachment_or_400(name):
+    try:
+        return attachment_path(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/attachments")
+async def list_attachments():
+    if not os.path.isdir(ATTACHMENTS_DIR):
+        return {"attachments": []}
+    files = [e for e in os.scandir(ATTACHMENTS_DIR) if e.is_file() and not e.name.startswith('.')]
+    return {"attachments": [{"name": e.name, "size": e.stat().st_size} for e in sorted(files, key=lambda e: e.name)]}
+
+@app.put("/api/attachments/{name}")
+async def upload_attachment(name: str, request: Request):
+    """Streams the request body to disk; replaces the file atomically once complete."""
+    path = attachment_or_400(name)
+    os.makedirs(ATTACHMENTS_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=ATTACHMENTS_DIR, prefix=".tmp-")
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in request.stream():
+                await run_in_threadpool(f.write, chunk)
+                size += len(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+    logger.info(f"ATTACHMENT STORED: {name} ({size} bytes).")
+    return {"status": "success", "name": name, "size": size}
+
+@app.delete("/api/attachments/{name}")
+async def delete_attachment(name: str):
+    path = attachment_or_400(name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    os.unlink(path)
+    return {"status": "success"}
 
-@app.post("/api/config")
-async def update_config(d: ConfigUpdate):
-    c = load_json(CONFIG_PATH)
-    if 'mission_config' not in c: c['mission_config'] = {}
+@app.post("/api/preview")
+async def preview_mission(p: PreviewRequest):
+    """Renders the protocol for one operative without sending anything."""
+    conf = config_store.read().get('mission_config', {})
+    subject = p.email_subject if p.email_subject is not None else conf.get('subject', DEFAULT_SUBJECT)
+    body = p.email_body if p.email_body is not None else conf.get('body', DEFAULT_BODY)
+
+    if p.email:
+        op = roster.get(p.email)
+        if op is None:
+            raise HTTPException(status_code=404, detail="Operative not found")
+    else:
+        first, _ = roster.page(limit=1)
+        op = first[0] if first else {"name": "Operative", "email": "operative@example.com"}
 
-    # Save Time, Subject, and Body
-    c['mission_config']['trigger_time'] = d.trigger_time
-    c['mission_config']['subject'] = d.email_subject
-    c['mission_config']['body'] = d.email_body
+    try:
+        subject, body = MissionTemplate(subject, body).render(op)
+    except TemplateSyntaxError as e:
+        raise HTTPException(status_code=400, detail=f"Template error: {e}")
+    return {"email": op.get('email'), "subject": subject, "body": body}
 
-    save_json(CONFIG_PATH, c)
+@app.get("/api/config")
+async def get_config(request: Request):
+    def build():
+        # Return defaults if keys missing
+        conf = dict(config_store.read().get('mission_config', {}))
+        if 'subject' not in conf: conf['subject'] = "ALERTA DE SEGURANÇA"
+        if 'body' not in conf: conf['body'] = "Por favor, feche a planilha."
+        return conf
+    return conditional(request, etag("config", file_version(CONFIG_PATH)), build)
 
-    try:
-        h, m = d.trigger_time.split(':')
-        scheduler.add_job(execute_mission, 'cron', hour=h, minute=m, id=JOB_ID, replace_existing=True)
-    except: pass
+@app.post("/api/config")
+async def update_config(d: ConfigUpdate):
+    def apply(c):
+        conf = c.setdefault('mission_config', {})
+        # Save Time, Subject, and Body
+        conf['trigger_time'] = d.trigger_time
+        conf['subject'] = d.email_subject
+        conf['body'] = d.email_body
+    config_store.update(apply)
+
+    arm_mission(DEFAULT_MISSION, config_store.read().get('mission_config', {}))
     return {"status": "success"}
 
 @app.get("/api/settings")
-async def get_settings():
-    secrets = load_secrets()
-    if secrets.get("EMAIL_PASS"): secrets["EMAIL_PASS"] = "********"
-    return secrets
+async def get_settings(request: Request):
+    def build():
+        secrets = load_secrets()
+        if secrets.get("EMAIL_PASS"): secrets["EMAIL_PASS"] = PASSWORD_MASK
+        # load() copies only the top level; mask copies, not the cached accounts
+        secrets["SENDER_ACCOUNTS"] = [
+            {**a, "EMAIL_PASS": PASSWORD_MASK} if a.get("EMAIL_PASS") else a
+            for a in secrets.get("SENDER_ACCOUNTS") or []
+        ]
+        if not secrets["SENDER_ACCOUNTS"]: secrets.pop("SENDER_ACCOUNTS")
+        return secrets
+    return conditional(request, etag("settings", file_version(SECRETS_PATH)), build)
 
 @app.post("/api/settings")
 async def update_settings(d: SecretsUpdate):
-    secrets = {"EMAIL_USER": d.email_user, "EMAIL_PASS": d.email_pass, "SMTP_SERVER": d.smtp_server, "SMTP_PORT": str(d.smtp_port)}
-    save_secrets(secrets)
+    if d.smtp_delivery not in (None, "relay", "direct"):
+        raise HTTPException(status_code=400, detail="smtp_delivery must be 'relay' or 'direct'")
+    if d.accounts:
+        for a in d.accounts:
+            if a.weight < 1:
+                raise HTTPException(status_code=400, detail=f"Account {a.email_user}: weight must be at least 1")
+
+    def apply(secrets):
+        # Merged into the stored secrets: keys with no field here (TEAMS_*, rates, workers...) survive
+        secrets["EMAIL_USER"] = d.email_user
+        # The dashboard posts back the masked password when it was not retyped
+        if d.email_pass != PASSWORD_MASK: secrets["EMAIL_PASS"] = d.email_pass
+        if d.smtp_server: secrets["SMTP_SERVER"] = d.smtp_server
+        if d.smtp_port: secrets["SMTP_PORT"] = str(d.smtp_port)
+        # Direct: deliver to each recipient domain's MX (resolved through DNS_SERVER) instead of the relay
+        if d.smtp_delivery == "direct": secrets["SMTP_DELIVERY"] = "direct"
+        elif d.smtp_delivery == "relay": secrets.pop("SMTP_DELIVERY", None)
+        if d.dns_server: secrets["DNS_SERVER"] = d.dns_server
+        elif d.dns_server == "": secrets.pop("DNS_SERVER", None)
+        if d.accounts is None:
+            return
+        # Extra sender accounts: recipients are spread over them by weight, each with its own quota
+        stored = {a.get("EMAIL_USER", "").lower(): a for a in secrets.get("SENDER_ACCOUNTS") or []}
+        accounts = []
+        for a in d.accounts:
+            password = a.email_pass
+            if password == PASSWORD_MASK:
+                password = stored.get(a.email_user.lower(), {}).get("EMAIL_PASS")
+                if not password:
+                    raise HTTPException(status_code=400, detail=f"Account {a.email_user}: password required")
+            account = {"EMAIL_USER": a.email_user, "EMAIL_PASS": password, "WEIGHT": a.weight}
+            if a.smtp_server: account["SMTP_SERVER"] = a.smtp_server
+            if a.smtp_port: account["SMTP_PORT"] = str(a.smtp_port)
+            if a.rate_per_sec: account["SMTP_RATE_PER_SEC"] = a.rate_per_sec
+            if a.daily_limit: account["SMTP_DAILY_LIMIT"] = a.daily_limit
+            accounts.append(account)
+        if accounts: secrets["SENDER_ACCOUNTS"] = accounts
+        else: secrets.pop("SENDER_ACCOUNTS", None)
+
+    try:
+        secrets_vault.update(apply)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"SECURITY CLEARANCE NOT SAVED: {e}")
+        raise HTTPException(status_code=500, detail="Stored secrets could not be read; nothing was saved")
     logger.info("SECURITY CLEARANCE UPDATED.")
     return {"status": "success"}
 
+@app.post("/api/settings/rotate-key")
+async def rotate_key():
+    secrets_vault.rotate_key()
+    logger.info("KEY ROTATION INITIATED.")
+    return {"status": "rotating"}
+
+startup.mark("app")
+
 def start_server():
+    import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000, log_level="error")
 
 if __name__ == "__main__":
+    # The GUI stack is only loaded for the desktop app; headless.py never touches it
+    import webview
     api_thread = threading.Thread(target=start_server, daemon=True)
     api_thread.start()
     webview.create_window("DISPATCH CENTRAL", "http://127.0.0.1:8000", width=1200, height=800, background_color='#0a0a0a', resizable=True)
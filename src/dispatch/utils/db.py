@@ -0,0 +1,44 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteDB:
+    """Thread-local SQLite connections in WAL mode, shared by the local stores."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self.conn().executescript(schema)
+
+    def conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def execute(self, sql, params=()):
+        return self.conn().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT; takes the write lock up front to avoid upgrade deadlocks."""
+        db = self.conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def add_column(self, table, column, decl):
+        columns = {r["name"] for r in self.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used when it is missing
+    brotli = None
+
+# Smaller payloads are not worth the compression overhead
+MIN_COMPRESS = 1024
+
+
+def etag(*parts):
+    return 'W/"' + "-".join(str(p) for p in parts) + '"'
+
+
+def file_version(path):
+    """Changes whenever the file is rewritten (atomic renames give a new inode)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "0"
+    return f"{st.st_ino:x}.{st.st_mtime_ns:x}.{st.st_size:x}"
+
+
+def _matches(request, tag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 13.1.2): ignore the W/ prefix on both sides
+    bare = tag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == bare for t in header.split(","))
+
+
+def _encoding(request):
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").lower().split(","):
+        name, _, params = item.partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def conditional(request, tag, build):
+    """JSON response for build(), or 304 when the client already holds this tag.
+
+    build only runs on a miss, so an idle dashboard revalidating costs one
+    version lookup. Bodies over MIN_COMPRESS go out as brotli or gzip.
+    """
+    headers = {"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _matches(request, tag):
+        return Response(status_code=304, headers=headers)
+
+    body = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encoding = _encoding(request) if len(body) >= MIN_COMPRESS else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,59 @@
+import csv
+import json
+
+
+async def iter_lines(stream):
+    """Splits an async byte stream into decoded lines without buffering the whole body."""
+    buf = b""
+    async for chunk in stream:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buf:
+        yield buf.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_csv(lines):
+    header, pending = None, ""
+    async for line in lines:
+        pending = f"{pending}\n{line}" if pending else line
+        # A quoted field spans lines until its quotes balance
+        if pending.count('"') % 2:
+            continue
+        record, pending = next(csv.reader([pending]), []), ""
+        if not record:
+            continue
+        if header is None:
+            header = [h.strip().lower() for h in record]
+            continue
+        yield dict(zip(header, record))
+
+
+async def iter_ndjson(lines):
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else None
+
+
+def iter_records(stream, fmt):
+    lines = iter_lines(stream)
+    return iter_ndjson(lines) if fmt == "ndjson" else iter_csv(lines)
+
+
+def normalize(record):
+    """Clean operative dict, or None when the row has no usable email."""
+    if not record:
+        return None
+    email = str(record.get("email") or "").strip()
+    if "@" not in email:
+        return None
+    op = {k: v for k, v in record.items() if k and v not in (None, "")}
+    op["email"] = email
+    op["name"] = str(record.get("name") or "").strip()
+    return op
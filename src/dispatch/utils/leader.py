@@ -0,0 +1,50 @@
+import os
+import socket
+import time
+import uuid
+
+from utils.db import SQLiteDB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name    TEXT PRIMARY KEY,
+    holder  TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class Lease:
+    """Named lease in SQLite: at most one holder across processes, lost unless renewed within ttl."""
+
+    def __init__(self, path, name, ttl=30.0):
+        self.db = SQLiteDB(path, SCHEMA)
+        self.name = name
+        self.ttl = float(ttl)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    def acquire(self):
+        """Takes the lease if free or expired, renews it if ours; returns whether we hold it."""
+        now = time.time()
+        with self.db.transaction() as db:
+            row = db.execute("SELECT holder, expires FROM leases WHERE name = ?", (self.name,)).fetchone()
+            if row is not None and row["holder"] != self.holder and row["expires"] > now:
+                self.held = False
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, expires) VALUES (?, ?, ?)",
+                (self.name, self.holder, now + self.ttl),
+            )
+        self.held = True
+        return True
+
+    def release(self):
+        self.db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+        self.held = False
+
+    def owner(self):
+        row = self.db.execute(
+            "SELECT holder FROM leases WHERE name = ? AND expires > ?", (self.name, time.time())
+        ).fetchone()
+        return row["holder"] if row else None
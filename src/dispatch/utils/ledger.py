@@ -0,0 +1,129 @@
+import time
+
+from utils.db import SQLiteDB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id        INTEGER PRIMARY KEY,
+    run_id    TEXT NOT NULL,
+    recipient TEXT NOT NULL COLLATE NOCASE,
+    channel   TEXT NOT NULL,
+    status    TEXT NOT NULL,
+    code      INTEGER,
+    latency   REAL,
+    error     TEXT,
+    ts        REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_attempts_run ON attempts (run_id, status, id);
+CREATE INDEX IF NOT EXISTS ix_attempts_recipient ON attempts (recipient, id);
+CREATE INDEX IF NOT EXISTS ix_attempts_status ON attempts (status, id);
+CREATE INDEX IF NOT EXISTS ix_attempts_ts ON attempts (ts);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id   TEXT PRIMARY KEY,
+    mission  TEXT,
+    started  REAL NOT NULL,
+    updated  REAL NOT NULL,
+    sent     INTEGER NOT NULL DEFAULT 0,
+    deferred INTEGER NOT NULL DEFAULT 0,
+    failed   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_runs_started ON runs (started);
+"""
+
+STATUSES = ("sent", "deferred", "failed")
+COMPACT_CHUNK = 5000
+
+
+class Ledger:
+    """Every send attempt, indexed by run, recipient and status; kept for a retention window.
+
+    Per-run totals are maintained as attempts are recorded, so listing runs
+    never aggregates over the attempts table.
+    """
+
+    def __init__(self, path):
+        self.db = SQLiteDB(path, SCHEMA)
+        # Lets compact() hand freed pages back to the filesystem; converting takes one VACUUM
+        if self.db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.db.execute("VACUUM")
+
+    def start_run(self, run_id, mission=None):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO runs (run_id, mission, started, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(run_id) DO UPDATE SET mission = COALESCE(excluded.mission, runs.mission)",
+            (run_id, mission, now, now),
+        )
+
+    def record_many(self, entries):
+        """entries: (run_id, recipient, channel, status, code, latency, error) tuples."""
+        if not entries:
+            return
+        now = time.time()
+        totals = {}
+        for run_id, _, _, status, _, _, _ in entries:
+            counts = totals.setdefault(run_id, dict.fromkeys(STATUSES, 0))
+            counts[status] += 1
+        with self.db.transaction() as db:
+            db.executemany(
+                "INSERT INTO attempts (run_id, recipient, channel, status, code, latency, error, ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [entry + (now,) for entry in entries],
+            )
+            db.executemany(
+                "INSERT INTO runs (run_id, started, updated, sent, deferred, failed) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET updated = excluded.updated, sent = sent + excluded.sent, "
+                "deferred = deferred + excluded.deferred, failed = failed + excluded.failed",
+                [(run_id, now, now, c["sent"], c["deferred"], c["failed"]) for run_id, c in totals.items()],
+            )
+
+    # --- QUERIES (keyset pagination, newest first; next_cursor is None on the last page) ---
+    def _page(self, where, params, cursor, limit):
+        sql = f"SELECT * FROM attempts WHERE {where}"
+        if cursor:
+            sql, params = sql + " AND id < ?", params + [cursor]
+        rows = self.db.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [dict(r) for r in rows[:limit]], next_cursor
+
+    def runs(self, cursor=None, limit=50):
+        sql, params = "SELECT * FROM runs", []
+        if cursor:
+            sql, params = sql + " WHERE started < ?", [cursor]
+        rows = self.db.execute(sql + " ORDER BY started DESC LIMIT ?", params + [limit + 1]).fetchall()
+        next_cursor = rows[limit - 1]["started"] if len(rows) > limit else None
+        return [dict(r) for r in rows[:limit]], next_cursor
+
+    def get_run(self, run_id):
+        row = self.db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def run_attempts(self, run_id, status=None, cursor=None, limit=100):
+        if status:
+            return self._page("run_id = ? AND status = ?", [run_id, status], cursor, limit)
+        return self._page("run_id = ?", [run_id], cursor, limit)
+
+    def failures(self, status="failed", cursor=None, limit=100):
+        return self._page("status = ?", [status], cursor, limit)
+
+    def recipient(self, email, cursor=None, limit=100):
+        return self._page("recipient = ?", [email.strip()], cursor, limit)
+
+    # --- RETENTION ---
+    def compact(self, retention_days):
+        """Drops attempts and runs older than the window in small chunks, then releases the freed pages."""
+        cutoff = time.time() - float(retention_days) * 86400
+        removed = 0
+        while True:
+            cur = self.db.execute(
+                "DELETE FROM attempts WHERE id IN (SELECT id FROM attempts WHERE ts < ? LIMIT ?)",
+                (cutoff, COMPACT_CHUNK),
+            )
+            removed += cur.rowcount
+            if cur.rowcount < COMPACT_CHUNK:
+                break
+        self.db.execute("DELETE FROM runs WHERE updated < ?", (cutoff,))
+        # sqlite3 steps a plain execute() once, which frees a single page; executescript runs it out
+        self.db.conn().executescript("PRAGMA incremental_vacuum;")
+        return removed
@@ -1,23 +1,95 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import queue
 import sys
 import os
 
-def setup_logger(name="Operações"):
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
+# One listener per logger name: calling setup_logger() again returns the same pipeline
+_listeners = {}
+# Set in worker processes: records go to the parent's queue instead of local handlers
+_forward = None
 
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (NDJSON), for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logger(name="Operações", path=os.path.join("logs", "mission_log.log"), fmt=None):
+    """Logger whose records are written by a background thread.
+
+    Callers only pay for putting the record on a queue; the stdout and
+    rotating-file handlers run on the listener thread. fmt="json" (or
+    DISPATCH_LOG_FORMAT=json) switches stdout to NDJSON and adds a
+    .ndjson file next to the text log, which the dashboard keeps reading.
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    if name in _listeners:
+        return logger
+    if _forward is not None:
+        if not logger.handlers:
+            logger.setLevel(logging.DEBUG)
+            logger.addHandler(QueueHandler(_forward))
+        return logger
 
-    formatter = logging.Formatter('%(asctime)s - [%(levelname)s] - %(message)s')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fmt = (fmt or os.environ.get("DISPATCH_LOG_FORMAT") or "text").lower()
+
+    text = logging.Formatter('%(asctime)s - [%(levelname)s] - %(message)s')
+    structured = JsonFormatter()
 
     stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+    stream_handler.setFormatter(structured if fmt == "json" else text)
+
+    file_handler = RotatingFileHandler(path, maxBytes=5*1024*1024, backupCount=2, encoding="utf-8")
+    file_handler.setFormatter(text)
+    handlers = [stream_handler, file_handler]
 
-    file_handler = RotatingFileHandler('logs/mission_log.log', maxBytes=5*1024*1024, backupCount=2)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    if fmt == "json":
+        json_handler = RotatingFileHandler(os.path.splitext(path)[0] + ".ndjson",
+                                           maxBytes=5*1024*1024, backupCount=2, encoding="utf-8")
+        json_handler.setFormatter(structured)
+        handlers.append(json_handler)
 
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(QueueHandler(records))
     return logger
+
+
+def forward_to(records):
+    """Call before setup_logger() in a worker process: its records go to records
+    (a multiprocessing queue) and it opens no log file of its own."""
+    global _forward
+    _forward = records
+
+
+def listen(records, name="Operações"):
+    """Writes records put on records by worker processes through this process's handlers.
+
+    One process owns the log files, so rotation never races another writer.
+    """
+    listener = QueueListener(records, *_listeners[name].handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,62 @@
+import os
+
+BLOCK = 8192
+# Upper bound on bytes returned per call so a client far behind catches up in steps
+MAX_READ = 256 * 1024
+
+
+def tail(path, n=20):
+    """Last n lines, read backwards from the end in blocks instead of loading the file."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", "replace").splitlines(keepends=True)
+    return lines[-n:]
+
+
+def _read_from(path, offset):
+    """Complete lines after offset and the number of bytes they span."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(MAX_READ)
+    end = data.rfind(b"\n") + 1
+    return data[:end].decode("utf-8", "replace").splitlines(keepends=True), end
+
+
+def make_cursor(st):
+    return f"{st.st_ino}:{st.st_size}"
+
+
+def read_since(path, cursor=None, n=20):
+    """New lines since cursor ("inode:offset") and the next cursor.
+
+    Without a cursor the last n lines are returned. A changed inode means the
+    RotatingFileHandler rolled over: the remainder of the old file (now path.1)
+    is drained before reading the new one from the start.
+    """
+    st = os.stat(path)
+    if not cursor:
+        return tail(path, n), make_cursor(st)
+
+    try:
+        inode, offset = (int(x) for x in cursor.split(":"))
+    except ValueError:
+        return tail(path, n), make_cursor(st)
+
+    lines = []
+    if inode != st.st_ino:
+        rotated = f"{path}.1"
+        if os.path.exists(rotated) and os.stat(rotated).st_ino == inode:
+            lines, _ = _read_from(rotated, offset)
+        offset = 0
+    elif st.st_size < offset:
+        offset = 0  # truncated in place
+
+    fresh, consumed = _read_from(path, offset)
+    return lines + fresh, f"{st.st_ino}:{offset + consumed}"
@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from utils.store import atomic_write
+
+# Seconds; spans a fast local relay up to a slow remote handshake
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RUN_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+REGISTRY = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[l]) for l in self.labels)
+
+    def _fmt(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        escape = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+    # Gauges describe one process; counters and histograms add up across processes
+    shared = False
+
+    def export(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+    def _add(self, a, b):
+        return a + b
+
+    def render(self, others=()):
+        """others: export() results of other processes, added to this process's values."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = {key: self._copy(value) for key, value in self._values.items()}
+        for exported in others:
+            for key, value in exported:
+                key = tuple(key)
+                values[key] = self._add(values[key], value) if key in values else value
+        for key, value in sorted(values.items()):
+            lines.extend(self._lines(key, value))
+        return lines
+
+    def _lines(self, key, value):
+        yield f"{self.name}{self._fmt(key)} {value}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+    shared = True
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+    shared = True
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+    def _add(self, a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _lines(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            yield f"{self.name}_bucket{self._fmt(key, [('le', le)])} {cumulative}"
+        yield f"{self.name}_sum{self._fmt(key)} {total}"
+        yield f"{self.name}_count{self._fmt(key)} {cumulative}"
+
+
+def render(directory=None):
+    """All registered metrics in the Prometheus text exposition format.
+
+    With directory, counters and histograms published there by other
+    processes (share()) are added in, so one endpoint covers every worker.
+    """
+    others = _collect(directory) if directory else {}
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(others.get(metric.name, ()) if metric.shared else ()))
+    return "\n".join(lines) + "\n"
+
+
+# --- MULTIPROCESS ---
+# Each process publishes to <directory>/<pid>.json, like prometheus_client's multiprocess mode
+SHARE_INTERVAL = 5.0
+_shared = {}
+
+
+def flush():
+    """Writes this process's counters and histograms to its file in the shared directory."""
+    directory = _shared.get("directory")
+    if directory is None:
+        return
+    data = {m.name: m.export() for m in REGISTRY if m.shared}
+    atomic_write(os.path.join(directory, f"{os.getpid()}.json"), json.dumps(data))
+
+
+def share(directory, interval=SHARE_INTERVAL):
+    """Publishes this process's metrics every interval seconds until the process exits.
+
+    Call flush() before exiting: multiprocessing children skip atexit handlers.
+    """
+    os.makedirs(directory, exist_ok=True)
+    _shared["directory"] = directory
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                flush()
+            except OSError:
+                pass
+
+    threading.Thread(target=loop, name="metrics-share", daemon=True).start()
+    return stop
+
+
+def _collect(directory):
+    """{metric name: [export() of each other process]}; files of exited workers still count."""
+    others = {}
+    own = f"{os.getpid()}.json"
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return others
+    for name in names:
+        if not name.endswith(".json") or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, exported in data.items():
+            others.setdefault(metric, []).append(exported)
+    return others
+
+
+# --- DISPATCH METRICS ---
+MESSAGES = Counter("dispatch_messages_total", "Messages by channel and outcome (sent, failed, retried).",
+                   ("channel", "outcome"))
+SMTP_CONNECT = Histogram("dispatch_smtp_connect_seconds", "TCP connect and SMTP greeting.")
+SMTP_STARTTLS = Histogram("dispatch_smtp_starttls_seconds", "STARTTLS negotiation.")
+SMTP_LOGIN = Histogram("dispatch_smtp_login_seconds", "SMTP AUTH.")
+SMTP_DATA = Histogram("dispatch_smtp_data_seconds", "MAIL/RCPT/DATA transaction for one message.")
+MIME_BUILD = Histogram("dispatch_mime_build_seconds", "MIME compile and per-recipient render.")
+RUN_DURATION = Histogram("dispatch_run_duration_seconds", "Wall time of a dispatch run.", buckets=RUN_BUCKETS)
+SCHEDULER_LAG = Histogram("dispatch_scheduler_lag_seconds", "Cron fire time to first send of a scheduled run.",
+                          buckets=DEFAULT_BUCKETS + (30.0, 60.0, 300.0))
+STARTUP = Gauge("dispatch_startup_seconds", "Time spent in each startup phase of this process.", ("phase",))
+QUEUE_DEPTH = Gauge("dispatch_queue_depth", "Messages pending or in flight across unfinished runs.",
+                    ("status",))
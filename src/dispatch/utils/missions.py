@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+DEFAULT_MISSION = "default"
+JOB_ID = 'mission_trigger'
+
+DEFAULT_SUBJECT = 'AVISO DE SISTEMA'
+DEFAULT_BODY = 'Nenhuma mensagem configurada no despacho.'
+
+
+def all_missions(config):
+    """Named missions from targets.json; mission_config is the 'default' mission."""
+    missions = {}
+    if config.get('mission_config'):
+        missions[DEFAULT_MISSION] = config['mission_config']
+    missions.update(config.get('missions', {}))
+    return missions
+
+
+def job_id(name):
+    # The default mission keeps the historical job id
+    return JOB_ID if name == DEFAULT_MISSION else f"{JOB_ID}:{name}"
+
+
+def fire_time(mission, now):
+    """Epoch seconds of today's trigger for the mission, or None if not yet due."""
+    try:
+        h, m = mission['trigger_time'].split(':')
+        fired = now.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
+    except (KeyError, ValueError, AttributeError):
+        return None
+    return fired.timestamp() if fired <= now else None
+
+
+def next_fire_time(mission, after):
+    """First trigger strictly after the datetime after, or None without a valid trigger_time."""
+    try:
+        h, m = mission['trigger_time'].split(':')
+        fire = after.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
+    except (KeyError, ValueError, AttributeError):
+        return None
+    return fire if fire > after else fire + timedelta(days=1)
+
+
+def _tags(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return {str(t).strip().lower() for t in value or () if str(t).strip()}
+
+
+def roster_filter(mission):
+    """Predicate selecting the mission's roster subset; no tags means everyone."""
+    wanted = _tags(mission.get('tags'))
+    if not wanted:
+        return lambda op: True
+    return lambda op: bool(wanted & _tags(op.get('tags')))
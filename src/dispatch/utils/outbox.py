@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from itertools import islice
+
+from utils.db import SQLiteDB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id   TEXT PRIMARY KEY,
+    created  REAL NOT NULL,
+    subject  TEXT NOT NULL,
+    body     TEXT NOT NULL,
+    mission  TEXT NOT NULL DEFAULT 'default',
+    finished REAL,
+    aborted  TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id          INTEGER PRIMARY KEY,
+    run_id      TEXT NOT NULL,
+    recipient   TEXT NOT NULL,
+    channel     TEXT NOT NULL,
+    context     TEXT,
+    idem_key    TEXT NOT NULL UNIQUE,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    next_at     REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    last_error  TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_messages_run_status ON messages (run_id, status, next_at);
+"""
+
+# Backoff schedule for transient failures: BASE * 2^attempt, capped.
+# DISPATCH_RETRY_BASE overrides the base in every process (benchmarks, tests)
+RETRY_BASE = float(os.environ.get("DISPATCH_RETRY_BASE", 15.0))
+RETRY_CAP = 900.0
+MAX_ATTEMPTS = 6
+LEASE_SECONDS = 120.0
+# A run that could not start (login refused, template or attachment missing) waits
+# RUN_RETRY_BASE * 2^aborts before a worker tries it again
+RUN_RETRY_BASE = 30.0
+RUN_RETRY_CAP = 1800.0
+# Past either limit an unfinished run is abandoned rather than resumed with stale content
+RUN_MAX_ABORTS = 8
+RUN_MAX_AGE = 86400.0
+# Rows per enqueue transaction; keeps the write lock short while a big roster is queued
+ENQUEUE_CHUNK = 2000
+
+
+def idempotency_key(run_id, recipient, channel):
+    return f"{run_id}:{recipient.strip().lower()}:{channel}"
+
+
+def backoff_delay(attempts):
+    return min(RETRY_CAP, RETRY_BASE * (2 ** max(0, attempts - 1)))
+
+
+class Outbox:
+    """Durable SQLite (WAL) queue of outbound messages, one row per run/recipient/channel."""
+
+    def __init__(self, path):
+        self.db = SQLiteDB(path, SCHEMA)
+        self.db.add_column("messages", "context", "TEXT")
+        self.db.add_column("runs", "mission", "TEXT NOT NULL DEFAULT 'default'")
+        self.db.add_column("runs", "fired_at", "REAL")
+        self.db.add_column("runs", "attachments", "TEXT")
+        self.db.add_column("runs", "aborts", "INTEGER NOT NULL DEFAULT 0")
+        self.db.add_column("runs", "retry_at", "REAL NOT NULL DEFAULT 0")
+
+    # --- RUNS ---
+    def create_run(self, run_id, subject, body, mission="default", fired_at=None, attachments=()):
+        """Registers a run; returns False if it already exists (resume).
+
+        fired_at is the cron fire time of a scheduled run (for scheduler lag);
+        attachments are the file names the run's emails carry.
+        """
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO runs (run_id, created, subject, body, mission, fired_at, attachments) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, time.time(), subject, body, mission, fired_at, json.dumps(list(attachments)) if attachments else None),
+        )
+        return cur.rowcount == 1
+
+    def get_run(self, run_id):
+        return self.db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+
+    def finish_run(self, run_id):
+        self.db.execute("UPDATE runs SET finished = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def unfinished_runs(self, mission=None, due=False):
+        """Run ids not yet finished, oldest first; due skips runs on hold after an abort."""
+        sql, params = "SELECT run_id FROM runs WHERE finished IS NULL", ()
+        if mission is not None:
+            sql, params = sql + " AND mission = ?", params + (mission,)
+        if due:
+            sql, params = sql + " AND retry_at <= ?", params + (time.time(),)
+        rows = self.db.execute(sql + " ORDER BY created", params).fetchall()
+        return [r["run_id"] for r in rows]
+
+    def defer_run(self, run_id):
+        """Puts a run that could not start on hold; returns the seconds until it is due again."""
+        now = time.time()
+        with self.db.transaction() as db:
+            row = db.execute("SELECT aborts, retry_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return 0.0
+            if row["retry_at"] > now:
+                # Another worker aborted it at the same time; one hold per failure
+                return row["retry_at"] - now
+            aborts = row["aborts"] + 1
+            delay = min(RUN_RETRY_CAP, RUN_RETRY_BASE * (2 ** (aborts - 1)))
+            db.execute(
+                "UPDATE runs SET aborts = ?, retry_at = ? WHERE run_id = ?",
+                (aborts, now + delay, run_id),
+            )
+        return delay
+
+    def stale_runs(self, max_age=RUN_MAX_AGE):
+        """Unfinished runs created more than max_age seconds ago."""
+        rows = self.db.execute(
+            "SELECT run_id FROM runs WHERE finished IS NULL AND created < ? ORDER BY created",
+            (time.time() - max_age,),
+        ).fetchall()
+        return [r["run_id"] for r in rows]
+
+    def abandon_run(self, run_id, reason):
+        """Finishes a run without sending the rest: unsent rows fail with reason. Returns their count."""
+        with self.db.transaction() as db:
+            dropped = db.execute(
+                "UPDATE messages SET status = 'failed', last_error = ? "
+                "WHERE run_id = ? AND status IN ('pending', 'sending')",
+                (reason, run_id),
+            ).rowcount
+            db.execute(
+                "UPDATE runs SET finished = ?, aborted = ? WHERE run_id = ?",
+                (time.time(), reason, run_id),
+            )
+        return dropped
+
+    # --- MESSAGES ---
+    def enqueue(self, run_id, operatives, channels, chunk=ENQUEUE_CHUNK):
+        """Adds one row per operative/channel; rows already queued are left untouched.
+
+        The operative record is stored as the template context so a resumed run
+        personalizes exactly like the original one. operatives may be a lazy
+        iterator: it is consumed chunk by chunk, one transaction each, so memory
+        and lock hold time do not grow with the roster.
+        """
+        rows = (
+            (run_id, op['email'], c, json.dumps(op), idempotency_key(run_id, op['email'], c))
+            for op in operatives for c in channels
+        )
+        queued = 0
+        while True:
+            part = list(islice(rows, chunk))
+            if not part:
+                return queued
+            with self.db.transaction() as db:
+                queued += db.executemany(
+                    "INSERT OR IGNORE INTO messages (run_id, recipient, channel, context, idem_key) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    part,
+                ).rowcount
+
+    def claim(self, run_id, limit, lease=LEASE_SECONDS):
+        """Atomically leases due rows. Rows whose lease expired (crashed sender) are reclaimed."""
+        now = time.time()
+        with self.db.transaction() as db:
+            rows = db.execute(
+                "SELECT id, recipient, channel, context, attempts FROM messages "
+                "WHERE run_id = ? AND ((status = 'pending' AND next_at <= ?) "
+                "OR (status = 'sending' AND lease_until <= ?)) ORDER BY id LIMIT ?",
+                (run_id, now, now, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE messages SET status = 'sending', lease_until = ? WHERE id = ?",
+                [(now + lease, r["id"]) for r in rows],
+            )
+        return rows
+
+    def batch(self):
+        """Groups this thread's mark_* calls into one transaction."""
+        return self.db.transaction()
+
+    def mark_sent(self, msg_id):
+        self.db.execute(
+            "UPDATE messages SET status = 'sent', attempts = attempts + 1, last_error = NULL WHERE id = ?",
+            (msg_id,),
+        )
+
+    def mark_failed(self, msg_id, error):
+        self.db.execute(
+            "UPDATE messages SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+            (str(error), msg_id),
+        )
+
+    def mark_retry(self, msg_id, attempts, error):
+        """Schedules a transient failure for retry, or fails it once MAX_ATTEMPTS is reached."""
+        if attempts + 1 >= MAX_ATTEMPTS:
+            self.mark_failed(msg_id, error)
+            return False
+        self.db.execute(
+            "UPDATE messages SET status = 'pending', attempts = attempts + 1, next_at = ?, last_error = ? WHERE id = ?",
+            (time.time() + backoff_delay(attempts + 1), str(error), msg_id),
+        )
+        return True
+
+    def mark_deferred(self, msg_id, until, error):
+        """Puts a row back until epoch seconds until without spending an attempt (no sender could take it)."""
+        self.db.execute(
+            "UPDATE messages SET status = 'pending', next_at = ?, last_error = ? WHERE id = ?",
+            (until, str(error), msg_id),
+        )
+
+    def next_due_in(self, run_id):
+        """Seconds until the next row becomes claimable, or None when the run is drained."""
+        row = self.db.execute(
+            "SELECT MIN(CASE status WHEN 'pending' THEN next_at ELSE lease_until END) AS due "
+            "FROM messages WHERE run_id = ? AND status IN ('pending', 'sending')",
+            (run_id,),
+        ).fetchone()
+        if row["due"] is None:
+            return None
+        return max(0.0, row["due"] - time.time())
+
+    def queue_depth(self):
+        """{status: rows} for pending/sending rows of unfinished runs."""
+        rows = self.db.execute(
+            "SELECT status, COUNT(*) AS n FROM messages WHERE status IN ('pending', 'sending') "
+            "AND run_id IN (SELECT run_id FROM runs WHERE finished IS NULL) GROUP BY status"
+        ).fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def counts(self, run_id):
+        rows = self.db.execute(
+            "SELECT status, COUNT(*) AS n FROM messages WHERE run_id = ? GROUP BY status", (run_id,)
+        ).fetchall()
+        return {r["status"]: r["n"] for r in rows}
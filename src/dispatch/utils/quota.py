@@ -0,0 +1,40 @@
+from utils.db import SQLiteDB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_sends (
+    key  TEXT NOT NULL,
+    day  TEXT NOT NULL,
+    sent INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, day)
+);
+"""
+
+
+class DailyQuota:
+    """Per-account daily send counts in SQLite, shared by every process on the config.
+
+    Senders reserve the budget in small blocks, so a restart mid-day or a
+    second worker process counts against the same total. Reserved but unsent
+    messages stay counted; the error is on the safe side of the provider quota.
+    """
+
+    def __init__(self, path):
+        self.db = SQLiteDB(path, SCHEMA)
+
+    def reserve(self, key, day, n, limit):
+        """Takes up to n sends from today's budget of limit; returns how many were granted."""
+        with self.db.transaction() as db:
+            row = db.execute("SELECT sent FROM daily_sends WHERE key = ? AND day = ?", (key, day)).fetchone()
+            sent = row["sent"] if row else 0
+            granted = max(0, min(n, limit - sent))
+            if granted:
+                db.execute(
+                    "INSERT INTO daily_sends (key, day, sent) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key, day) DO UPDATE SET sent = sent + excluded.sent",
+                    (key, day, granted),
+                )
+        return granted
+
+    def sent(self, key, day):
+        row = self.db.execute("SELECT sent FROM daily_sends WHERE key = ? AND day = ?", (key, day)).fetchone()
+        return row["sent"] if row else 0
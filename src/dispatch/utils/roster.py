@@ -0,0 +1,89 @@
+import json
+
+from utils.db import SQLiteDB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operatives (
+    id     INTEGER PRIMARY KEY,
+    email  TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    name   TEXT NOT NULL DEFAULT '',
+    fields TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_operatives_name ON operatives (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+UPSERT = (
+    "INSERT INTO operatives (email, name, fields) VALUES (?, ?, ?) "
+    "ON CONFLICT(email) DO UPDATE SET name = excluded.name, fields = excluded.fields"
+)
+BUMP = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+
+
+def _row(op):
+    extra = {k: v for k, v in op.items() if k not in ("email", "name")}
+    return (op['email'].strip(), op.get('name', ''), json.dumps(extra) if extra else None)
+
+
+def _record(row):
+    op = json.loads(row["fields"]) if row["fields"] else {}
+    op["name"] = row["name"]
+    op["email"] = row["email"]
+    return op
+
+
+class Roster:
+    """Operatives in SQLite: deduped by email, appended without rewrites, keyset-paginated."""
+
+    def __init__(self, path):
+        self.db = SQLiteDB(path, SCHEMA)
+
+    def add(self, op):
+        with self.db.transaction() as db:
+            db.execute(UPSERT, _row(op))
+            db.execute(BUMP)
+
+    def add_many(self, ops):
+        """Upserts a batch in one transaction; duplicates by email update in place."""
+        with self.db.transaction() as db:
+            db.executemany(UPSERT, (_row(op) for op in ops))
+            db.execute(BUMP)
+
+    def version(self):
+        """Counter bumped by every write, across processes; cheap to poll."""
+        return self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def get(self, email):
+        row = self.db.execute("SELECT * FROM operatives WHERE email = ?", (email.strip(),)).fetchone()
+        return _record(row) if row else None
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM operatives").fetchone()[0]
+
+    def page(self, cursor=0, limit=100, query=None):
+        """Returns (operatives, next_cursor); next_cursor is None on the last page."""
+        sql, params = "SELECT * FROM operatives WHERE id > ?", [cursor]
+        if query:
+            like = f"%{query}%"
+            sql += " AND (email LIKE ? OR name LIKE ?)"
+            params += [like, like]
+        sql += " ORDER BY id LIMIT ?"
+        rows = self.db.execute(sql, params + [limit + 1]).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [_record(r) for r in rows[:limit]], next_cursor
+
+    def iter_all(self, chunk=1000):
+        cursor = 0
+        while True:
+            rows = self.db.execute(
+                "SELECT * FROM operatives WHERE id > ? ORDER BY id LIMIT ?", (cursor, chunk)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _record(row)
+            cursor = rows[-1]["id"]
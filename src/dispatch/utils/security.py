@@ -1,23 +1,86 @@
+import copy
 import os
 import json
-from cryptography.fernet import Fernet
+import threading
+
+from utils.store import atomic_write
+
+def _fernet():
+    # cryptography is slow to import; startup only pays for it once secrets are touched
+    from cryptography.fernet import Fernet, MultiFernet
+    return Fernet, MultiFernet
 
 class IntelSecurity:
+    """Fernet keyring: master.key holds one key per line, newest (primary) first.
+
+    The keyring is loaded (or generated) on first use and reloaded whenever
+    master.key is replaced, so a rotation in another process is picked up.
+    """
+
     def __init__(self, key_path):
         self.key_path = key_path
-        self.key = self._load_or_generate_key()
-        self.cipher = Fernet(self.key)
+        self._keys = None
+        self._cipher = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _key_stamp(self):
+        try:
+            st = os.stat(self.key_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _stale(self, stamp):
+        # A missing file keeps the keys in memory rather than generating a new keyring
+        return self._keys is None or (stamp is not None and stamp != self._stamp)
+
+    @property
+    def keys(self):
+        stamp = self._key_stamp()
+        if self._stale(stamp):
+            with self._lock:
+                if self._stale(stamp):
+                    self.reload()
+        return self._keys
+
+    def reload(self):
+        keys = self._load_or_generate_keys()
+        Fernet, MultiFernet = _fernet()
+        # Built before the swap: a bad key file must not leave the old cipher behind a new stamp
+        cipher = MultiFernet([Fernet(k) for k in keys])
+        self._keys, self._stamp, self._cipher = keys, self._key_stamp(), cipher
 
-    def _load_or_generate_key(self):
+    @property
+    def cipher(self):
+        self.keys
+        return self._cipher
+
+    def _load_or_generate_keys(self):
+        Fernet, _ = _fernet()
         if not os.path.exists(self.key_path):
             key = Fernet.generate_key()
             os.makedirs(os.path.dirname(self.key_path), exist_ok=True)
             with open(self.key_path, "wb") as f:
                 f.write(key)
-            return key
+            return [key]
 
         with open(self.key_path, "rb") as f:
-            return f.read()
+            return [line.strip() for line in f.read().splitlines() if line.strip()]
+
+    def _store_keys(self, keys):
+        Fernet, MultiFernet = _fernet()
+        atomic_write(self.key_path, "\n".join(k.decode('utf-8') for k in keys) + "\n", mode=0o600)
+        self._keys, self._stamp = keys, self._key_stamp()
+        self._cipher = MultiFernet([Fernet(k) for k in keys])
+
+    def rotate_key(self):
+        """New primary key encrypts from now on; old keys keep decrypting until retired."""
+        Fernet, _ = _fernet()
+        self._store_keys([Fernet.generate_key()] + self.keys)
+
+    def retire_old_keys(self):
+        self._store_keys(self.keys[:1])
 
     def encrypt_payload(self, data_dict):
         """Converts a Dictionary -> Encrypted String"""
@@ -25,11 +88,107 @@ class IntelSecurity:
         encrypted_bytes = self.cipher.encrypt(json_str.encode('utf-8'))
         return encrypted_bytes.decode('utf-8')
 
+    def decrypt(self, encrypted_token):
+        """Converts Encrypted String -> Dictionary; raises when no key in the ring fits."""
+        token = encrypted_token.encode('utf-8')
+        try:
+            decrypted_bytes = self.cipher.decrypt(token)
+        except Exception:
+            # Another process may have rotated the key since the ring was read
+            with self._lock:
+                self.reload()
+            decrypted_bytes = self.cipher.decrypt(token)
+        return json.loads(decrypted_bytes.decode('utf-8'))
+
     def decrypt_payload(self, encrypted_token):
         """Converts Encrypted String -> Dictionary"""
         try:
-            decrypted_bytes = self.cipher.decrypt(encrypted_token.encode('utf-8'))
-            return json.loads(decrypted_bytes.decode('utf-8'))
+            return self.decrypt(encrypted_token)
         except Exception as e:
             print(f"[SECURITY ALERT] Decryption failed: {e}")
             return {}
+
+    def reencrypt(self, encrypted_token):
+        """Re-encrypts a token under the primary key."""
+        return self.cipher.rotate(encrypted_token.encode('utf-8')).decode('utf-8')
+
+
+class SecretVault:
+    """Decrypted secrets cached in memory; refreshed when secrets.json changes or is saved."""
+
+    def __init__(self, path, officer, logger):
+        self.path = path
+        self.officer = officer
+        self.logger = logger
+        self._lock = threading.RLock()
+        self._data = None
+        self._stamp = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def load(self):
+        try:
+            return self._read()
+        except Exception as e:
+            # Not cached: the next load tries again (e.g. once master.key is back)
+            self.logger.error(f"[SECURITY ALERT] Decryption failed: {e}")
+            return dict(self._data or {})
+
+    def _read(self):
+        stamp = self._stat()
+        if stamp is None:
+            return {}
+        if self._data is None or stamp != self._stamp:
+            with self._lock:
+                with open(self.path, 'r') as f: content = f.read()
+                if content.strip().startswith('{'):
+                    # Migration: plain text secrets get encrypted in place
+                    data = json.loads(content)
+                    self._write(data)
+                else:
+                    data = self.officer.decrypt(content)
+                    self._data, self._stamp = data, stamp
+        return dict(self._data)
+
+    def update(self, mutate):
+        """Applies mutate(secrets) to a private copy and saves it; returns mutate's result.
+
+        Raises instead of saving when the stored secrets cannot be decrypted,
+        so a missing key never turns into an overwrite.
+        """
+        with self._lock:
+            data = copy.deepcopy(self._read())
+            result = mutate(data)
+            self._write(data)
+            return result
+
+    def _write(self, data):
+        atomic_write(self.path, self.officer.encrypt_payload(data), mode=0o600)
+        self._data, self._stamp = data, self._stat()
+
+    def save(self, data):
+        with self._lock:
+            self._write(dict(data))
+
+    def rotate_key(self):
+        """Rotates the master key without blocking readers; re-encryption runs in the background."""
+        with self._lock:
+            self.officer.rotate_key()
+        threading.Thread(target=self._reencrypt, name="key-rotation", daemon=True).start()
+
+    def _reencrypt(self):
+        try:
+            with self._lock:
+                if self._stat() is not None:
+                    with open(self.path, 'r') as f: token = f.read().strip()
+                    atomic_write(self.path, self.officer.reencrypt(token), mode=0o600)
+                    self._stamp = self._stat()
+                self.officer.retire_old_keys()
+            self.logger.info("KEY ROTATION COMPLETE. Old keys retired.")
+        except Exception as e:
+            self.logger.error(f"KEY ROTATION FAILURE: {e}. Old keys kept for decryption.")
@@ -0,0 +1,40 @@
+import os
+import time
+
+_last = time.perf_counter()
+_phases = []
+
+
+def _process_age():
+    """Seconds since the OS started this process (Linux only), else None."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except Exception:
+        return None
+
+
+# Interpreter boot and everything imported before this module
+_boot = _process_age()
+if _boot is not None:
+    _phases.append(("interpreter", _boot))
+
+
+def mark(phase):
+    """Charges the time since the previous mark to phase."""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+
+def phases():
+    return list(_phases)
+
+
+def report():
+    parts = [f"{name} {seconds:.3f}s" for name, seconds in _phases]
+    return " | ".join(parts + [f"total {sum(s for _, s in _phases):.3f}s"])
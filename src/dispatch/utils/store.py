@@ -0,0 +1,79 @@
+import os
+import copy
+import json
+import tempfile
+import threading
+
+
+def atomic_write(path, text, mode=0o644):
+    """Writes via temp file + fsync + rename so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except Exception:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
+
+class JsonStore:
+    """JSON document cached in memory, reloaded when the file changes on disk.
+
+    Readers share one parsed copy; writers are serialized and replace the file
+    atomically (temp file + rename) so a crash never leaves it truncated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._data = None
+        self._stamp = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def read(self):
+        """Cached document. Treat it as read-only; change it through update()."""
+        stamp = self._stat()
+        if self._data is not None and stamp == self._stamp:
+            return self._data
+        with self._lock:
+            stamp = self._stat()
+            if self._data is None or stamp != self._stamp:
+                self._data = self._load()
+                self._stamp = stamp
+            return self._data
+
+    def exists(self):
+        return self._stat() is not None
+
+    def update(self, mutate):
+        """Applies mutate(doc) to a private copy and persists it; returns mutate's result."""
+        with self._lock:
+            data = copy.deepcopy(self.read())
+            result = mutate(data)
+            self._write(data)
+            self._data = data
+            self._stamp = self._stat()
+            return result
+
+    def _write(self, data):
+        atomic_write(self.path, json.dumps(data, indent=4))
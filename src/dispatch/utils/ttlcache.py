@@ -0,0 +1,47 @@
+import json
+import time
+
+from utils.db import SQLiteDB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     TEXT,
+    expires   REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+
+class PersistentTTLCache:
+    """Key/value cache in SQLite that survives restarts; entries expire after their TTL."""
+
+    def __init__(self, path, namespace):
+        self.db = SQLiteDB(path, SCHEMA)
+        self.namespace = namespace
+
+    def get_many(self, keys):
+        """Unexpired entries among keys, as {key: value}."""
+        found, now = {}, time.time()
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT key, value FROM cache WHERE namespace = ? AND expires > ? "
+                f"AND key IN ({','.join('?' * len(chunk))})",
+                [self.namespace, now] + chunk,
+            ).fetchall()
+            found.update((r["key"], json.loads(r["value"])) for r in rows)
+        return found
+
+    def put_many(self, items, ttl):
+        expires = time.time() + ttl
+        with self.db.transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                [(self.namespace, k, json.dumps(v), expires) for k, v in items.items()],
+            )
+
+    def purge(self):
+        self.db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
@@ -0,0 +1,96 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+# inotify(7) flags; atomic_write() lands as IN_MOVED_TO, editors often as IN_CLOSE_WRITE
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (name follows)
+
+
+class FileWatcher:
+    """Blocks until a file changes or a timeout runs out.
+
+    Uses inotify through ctypes on Linux, so waiting costs no CPU; elsewhere
+    it falls back to checking mtime/inode/size every POLL_INTERVAL seconds.
+    """
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.directory, self.name = os.path.split(self.path)
+        self._fd = self._inotify()
+        self._stamp = self._stat()
+        self.mode = "inotify" if self._fd is not None else "polling"
+
+    def _inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError, TypeError):
+            return None
+        if fd < 0:
+            return None
+        # Watch the directory: atomic renames replace the file's inode
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def wait(self, timeout=None):
+        """True when the file changed, False when timeout (seconds; None = forever) ran out."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._fd is not None:
+                ready, _, _ = select.select([self._fd], [], [], remaining)
+                if not ready:
+                    return False
+                if self._drain():
+                    return True
+                # Something else in the directory changed (e.g. the SQLite stores)
+                continue
+            time.sleep(self.POLL_INTERVAL if remaining is None else min(self.POLL_INTERVAL, remaining))
+            stamp = self._stat()
+            if stamp != self._stamp:
+                self._stamp = stamp
+                return True
+            if remaining is not None and remaining <= self.POLL_INTERVAL:
+                return False
+
+    def _drain(self):
+        """Reads pending events; True if any concerned the watched file."""
+        hit = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return hit
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW or os.fsdecode(name) == self.name:
+                    hit = True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# Modules import each other as top-level packages (api.*, utils.*), as in the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "dispatch"))
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The server module against a scratch project root (imported once per session)."""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("cryptography")
+    home = tmp_path_factory.mktemp("home")
+    (home / "config").mkdir()
+    os.environ["DISPATCH_HOME"] = str(home)
+    import server
+    return server
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+    # No context manager: the lifespan (scheduler) is not started
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def smtp_sink():
+    from smtpsink import SMTPSink
+    sink = SMTPSink().start()
+    yield sink
+    sink.stop()
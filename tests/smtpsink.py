@@ -0,0 +1,89 @@
+"""Local ESMTP server for tests: accepts everything and keeps each message.
+
+failures lists how the next MAIL commands are answered instead of 250:
+"closing" replies 421 and hangs up, "throttle" replies 421 4.7.0 and hangs
+up, "drop" closes the socket without a reply.
+"""
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+REPLIES = {
+    "closing": b"421 Service not available, closing transmission channel\r\n",
+    "throttle": b"421 4.7.0 Try again later, closing connection\r\n",
+}
+
+
+class Message:
+    def __init__(self, mail_from, rcpts, raw):
+        self.mail_from = mail_from
+        self.rcpts = rcpts
+        # DATA as sent, dot-stuffing included
+        self.raw = raw
+        self.data = b"".join(line[1:] if line.startswith(b".") else line
+                             for line in raw.splitlines(keepends=True))
+
+    def parse(self):
+        return message_from_bytes(self.data, policy=policy.default)
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def handle(self):
+        sink = self.server.sink
+        sink.sessions += 1
+        reply = self.wfile.write
+        reply(b"220 sink ESMTP\r\n")
+        mail_from, rcpts = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                reply(b"250-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == b"AUTH":
+                sink.logins += 1
+                reply(b"235 2.7.0 Authentication successful\r\n")
+            elif verb == b"MAIL":
+                if sink.failures:
+                    failure = sink.failures.pop(0)
+                    if failure in REPLIES:
+                        reply(REPLIES[failure])
+                    return
+                mail_from, rcpts = line[10:].strip().strip(b"<>").decode(), []
+                reply(b"250 OK\r\n")
+            elif verb == b"RCPT":
+                rcpts.append(line[8:].strip().strip(b"<>").decode())
+                reply(b"250 OK\r\n")
+            elif verb == b"DATA":
+                reply(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                raw = b""
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    raw += chunk
+                sink.messages.append(Message(mail_from, rcpts, raw))
+                reply(b"250 2.0.0 Queued\r\n")
+            elif verb == b"QUIT":
+                reply(b"221 Bye\r\n")
+                return
+            else:
+                reply(b"250 OK\r\n")
+
+
+class SMTPSink:
+    def __init__(self):
+        self.messages = []
+        self.failures = []
+        self.sessions = 0
+        self.logins = 0
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Session)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), name="smtp-sink", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,43 @@
+import logging
+import time
+
+from api.accounts import AccountPool, SenderAccount, parse_accounts
+from api.ratelimit import next_midnight
+
+log = logging.getLogger("test")
+
+
+def pool_of(*addresses, **settings):
+    accounts = [SenderAccount(log, {"EMAIL_USER": a, "EMAIL_PASS": "p", **settings}) for a in addresses]
+    return AccountPool(log, accounts)
+
+
+def test_weighted_round_robin_interleaves():
+    pool = AccountPool(log, [SenderAccount(log, {"EMAIL_USER": f"wrr{i}@x", "WEIGHT": w})
+                             for i, w in enumerate((3, 2, 1))])
+    picks = [pool.pick().address for _ in range(6)]
+    assert sorted(picks) == ["wrr0@x"] * 3 + ["wrr1@x"] * 2 + ["wrr2@x"]
+    assert picks[:2] != ["wrr0@x"] * 2
+
+
+def test_available_at_is_the_first_account_back():
+    pool = pool_of("bench1@x", "bench2@x")
+    assert pool.available_at() <= time.time()
+    pool.bench(pool.accounts[0], 900, "quota")
+    pool.bench(pool.accounts[1], 3600, "login refused")
+    assert pool.pick() is None
+    assert abs(pool.available_at() - (time.time() + 900)) < 1
+
+
+def test_available_at_waits_for_midnight_when_budgets_are_spent():
+    pool = pool_of("spent1@x", SMTP_DAILY_LIMIT="1")
+    limiter = pool.accounts[0].limiter
+    limiter.acquire()
+    assert pool.available_at() == next_midnight()
+
+
+def test_accounts_inherit_relay_but_not_weight():
+    accounts = parse_accounts({"EMAIL_USER": "a@x", "SMTP_SERVER": "relay", "WEIGHT": 5,
+                               "SENDER_ACCOUNTS": [{"EMAIL_USER": "b@x"}, {"EMAIL_USER": "A@X"}]})
+    assert [(a["EMAIL_USER"], a["SMTP_SERVER"], a.get("WEIGHT")) for a in accounts] == [
+        ("a@x", "relay", 5), ("b@x", "relay", None)]
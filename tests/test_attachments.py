@@ -0,0 +1,70 @@
+import base64
+import logging
+import os
+
+import pytest
+
+from api import attachments as attachments_module
+from api.attachments import BLOCK, load_attachment
+from api.mime import compile_message
+from api.pool import SMTPPool
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("size", [0, 1, 57, 58, BLOCK - 1, BLOCK, BLOCK + 100])
+def test_encoding_is_rfc2045_lines(tmp_path, size):
+    source = os.urandom(size)
+    attachment = load_attachment(write(tmp_path / "relatorio.pdf", source), str(tmp_path / "cache"))
+    data = bytes(attachment.data)
+    lines = data.split(b"\r\n") if data else []
+    # 76-character lines joined by CRLF across encode blocks, no trailing CRLF
+    assert all(len(line) == 76 for line in lines[:-1])
+    assert not lines or 0 < len(lines[-1]) <= 76
+    assert base64.b64decode(b"".join(lines)) == source
+    assert (attachment.name, attachment.mime_type, attachment.size) == ("relatorio.pdf", "application/pdf", size)
+
+
+def test_same_content_is_encoded_once(tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    first = load_attachment(write(tmp_path / "a.txt", b"conteudo"), cache)
+    encodes = []
+    monkeypatch.setattr(attachments_module, "_encode", lambda *a: encodes.append(a))
+    second = load_attachment(write(tmp_path / "b.txt", b"conteudo"), cache)
+    assert encodes == []
+    assert second.digest == first.digest and second.data is first.data
+    assert os.listdir(cache) == [f"{first.digest}.b64"]
+
+
+def test_attachment_parses_back(smtp_sink, tmp_path):
+    source = os.urandom(3 * 57 * 10 + 5)
+    attachment = load_attachment(write(tmp_path / "planilha.xlsx", source), str(tmp_path / "cache"))
+    message = compile_message("ops@dispatch.test", "Anexo", "Segue o arquivo.", [attachment])
+    chunks = message.render("ana@x")
+    # The cached buffer goes out as its own chunk, never copied into the message
+    assert any(chunk is attachment.data for chunk in chunks)
+
+    pool = SMTPPool(logging.getLogger("test"), "127.0.0.1", smtp_sink.port, "u", "p", starttls=False, timeout=5)
+    try:
+        pool.send("ops@dispatch.test", "ana@x", chunks)
+    finally:
+        pool.close()
+    msg = smtp_sink.messages[0].parse()
+    body, part = msg.get_payload()
+    assert body.get_content_type() == "multipart/alternative"
+    assert part.get_filename() == "planilha.xlsx"
+    assert part.get_payload(decode=True) == source
+
+
+def test_two_attachments_keep_their_order(tmp_path):
+    cache = str(tmp_path / "cache")
+    a = load_attachment(write(tmp_path / "a.txt", b"A" * 100), cache)
+    b = load_attachment(write(tmp_path / "b.txt", b"B" * 100), cache)
+    chunks = compile_message("ops@dispatch.test", "s", "b", [a, b]).render("ana@x")
+    positions = [i for i, chunk in enumerate(chunks) if chunk is a.data or chunk is b.data]
+    assert [chunks[i] is a.data for i in positions] == [True, False]
+    assert b"DISPATCH-ATTACHMENT" not in b"".join(bytes(c) for c in chunks)
@@ -0,0 +1,29 @@
+import logging
+import smtplib
+
+import pytest
+
+from api.connector import MicrosoftConnector
+from api.errors import is_transient
+
+
+@pytest.fixture
+def comms(smtp_sink, tmp_path):
+    comms = MicrosoftConnector(logging.getLogger("test"), {
+        "EMAIL_USER": "throttle@x", "EMAIL_PASS": "p", "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp_sink.port), "SMTP_STARTTLS": "false", "SMTP_RATE_PER_SEC": "8",
+    }, str(tmp_path))
+    comms.authenticate()
+    yield comms
+    comms.close()
+
+
+def test_throttle_reply_slows_the_account_down(smtp_sink, comms):
+    limiter = comms.accounts.accounts[0].limiter
+    smtp_sink.failures = ["throttle"]
+    with pytest.raises(smtplib.SMTPSenderRefused) as e:
+        comms.deliver("to@x", "EMAIL_ALERT", "s", "b")
+    # Left to the outbox backoff, after the limiter halved the rate
+    assert is_transient(e.value)
+    assert limiter.rate == 4
+    assert smtp_sink.logins == 1 and smtp_sink.messages == []
@@ -0,0 +1,164 @@
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from api.dns import NEGATIVE_TTL, RCODE_NXDOMAIN, Resolver, parse_response
+from api.errors import ChannelError
+
+# Pointer to the question name, which always starts right after the header
+QNAME = b"\xc0\x0c"
+
+
+def label(text):
+    return bytes([len(text)]) + text.encode()
+
+
+def record(rtype, ttl, rdata, name=QNAME):
+    return name + struct.pack("!HHIH", rtype, 1, ttl, len(rdata)) + rdata
+
+
+def mx(preference, host, ttl=3600):
+    return record(15, ttl, struct.pack("!H", preference) + host)
+
+
+def soa(ttl, minimum):
+    names = label("ns") + QNAME + label("hostmaster") + QNAME
+    return record(6, ttl, names + struct.pack("!5I", 1, 7200, 900, 1209600, minimum))
+
+
+def reply(query, answers=(), authority=(), rcode=0):
+    qid, = struct.unpack_from("!H", query)
+    header = struct.pack("!HHHHHH", qid, 0x8180 | rcode, 1, len(answers), len(authority), 0)
+    return header + query[12:] + b"".join(answers) + b"".join(authority)
+
+
+class Nameserver:
+    """UDP stub: answer(query) builds each response; queries are counted."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.address = "127.0.0.1:%d" % self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                query, peer = self.sock.recvfrom(512)
+            except OSError:
+                return
+            self.queries += 1
+            for packet in self.answer(query):
+                self.sock.sendto(packet, peer)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def nameserver():
+    servers = []
+
+    def start(answer):
+        servers.append(Nameserver(answer))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_mx_hosts_by_preference(nameserver):
+    # Exchanges are compressed against the question name, as real servers send them
+    ns = nameserver(lambda q: [reply(q, [mx(20, label("mx1") + QNAME, ttl=600), mx(10, label("mx0") + QNAME)])])
+    resolver = Resolver(ns.address, timeout=1)
+    assert resolver.mx("Example.COM.") == ["mx0.example.com", "mx1.example.com"]
+    # Cached for the lowest record TTL: the second lookup never reaches the server
+    assert resolver.mx("example.com") == ["mx0.example.com", "mx1.example.com"]
+    assert ns.queries == 1
+    assert resolver._cache["example.com"][0] - time.monotonic() == pytest.approx(600, abs=5)
+
+
+def test_nxdomain_is_cached_for_the_soa_minimum(nameserver):
+    ns = nameserver(lambda q: [reply(q, authority=[soa(ttl=900, minimum=120)], rcode=RCODE_NXDOMAIN)])
+    resolver = Resolver(ns.address, timeout=1)
+    assert resolver.mx("nowhere.test") == []
+    assert resolver.mx("nowhere.test") == []
+    assert ns.queries == 1
+    assert resolver._cache["nowhere.test"][0] - time.monotonic() == pytest.approx(120, abs=5)
+
+
+def test_negative_ttl_is_capped_by_the_soa_ttl():
+    query = b"\x12\x34" + b"\0" * 10 + label("nowhere") + label("test") + b"\0" + struct.pack("!HH", 15, 1)
+    rcode, answers, negative = parse_response(reply(query, authority=[soa(ttl=60, minimum=3600)], rcode=3), 0x1234)
+    assert (rcode, answers, negative) == (RCODE_NXDOMAIN, [], 60)
+    _, _, negative = parse_response(reply(query, rcode=3), 0x1234)
+    assert negative == NEGATIVE_TTL
+
+
+def test_null_mx_accepts_no_mail(nameserver):
+    ns = nameserver(lambda q: [reply(q, [mx(0, b"\0")])])
+    assert Resolver(ns.address, timeout=1).mx("example.org") == []
+
+
+def test_no_mx_falls_back_to_the_domain(nameserver):
+    ns = nameserver(lambda q: [reply(q, authority=[soa(ttl=300, minimum=60)])])
+    assert Resolver(ns.address, timeout=1).mx("example.net") == ["example.net"]
+
+
+def test_stray_datagrams_are_ignored(nameserver):
+    def answer(query):
+        stray = bytes([query[0] ^ 0xFF]) + query[1:]
+        return [reply(stray, [mx(10, label("evil") + QNAME)]), reply(query, [mx(10, label("mx") + QNAME)])]
+    ns = nameserver(answer)
+    assert Resolver(ns.address, timeout=1).mx("example.com") == ["mx.example.com"]
+
+
+def test_compression_loop_is_a_transient_error(nameserver):
+    # The exchange points at itself
+    looped = record(15, 60, struct.pack("!H", 10) + b"\xc0\x29")
+    ns = nameserver(lambda q: [reply(q, [looped])])
+    with pytest.raises(ChannelError) as e:
+        Resolver(ns.address, timeout=1).mx("loop.test")
+    assert e.value.transient and "compression loop" in str(e.value)
+
+
+def test_silent_nameserver_is_a_transient_error(nameserver):
+    ns = nameserver(lambda q: [])
+    with pytest.raises(ChannelError) as e:
+        Resolver(ns.address, timeout=0.2, retries=2).mx("example.com")
+    assert e.value.transient and ns.queries == 2
+
+
+def test_concurrent_lookups_share_one_query(nameserver):
+    def answer(query):
+        time.sleep(0.2)
+        return [reply(query, [mx(10, label("mx") + QNAME)])]
+    ns = nameserver(answer)
+    resolver = Resolver(ns.address, timeout=1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolver.mx("example.com"))) for _ in range(5)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert results == [["mx.example.com"]] * 5 and ns.queries == 1
+
+
+def test_truncated_answer_is_retried_over_tcp(nameserver):
+    ns = nameserver(lambda q: [reply(q)[:2] + b"\x83\x80" + reply(q)[4:]])
+    listener = socket.create_server(("127.0.0.1", int(ns.address.rpartition(":")[2])))
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            query = conn.recv(512)[2:]
+            packet = reply(query, [mx(10, label("big") + QNAME)])
+            conn.sendall(struct.pack("!H", len(packet)) + packet)
+    threading.Thread(target=serve, daemon=True).start()
+    try:
+        assert Resolver(ns.address, timeout=1).mx("example.com") == ["big.example.com"]
+    finally:
+        listener.close()
@@ -0,0 +1,83 @@
+import logging
+import time
+
+import pytest
+
+from api.channels import Channel
+from api.engine import DispatchEngine
+from api.errors import BudgetExhausted
+from api.templating import MissionTemplate
+from utils.outbox import Outbox
+
+
+class Recorder(Channel):
+    name = "EMAIL_ALERT"
+
+    def __init__(self, comms):
+        super().__init__(comms)
+        self.sent = []
+
+    def deliver(self, target, subject, body, attachments=()):
+        self.sent.append((target, subject, body))
+
+
+class Comms:
+    """The parts of MicrosoftConnector the engine uses."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("test")
+        self.channels = {"EMAIL_ALERT": Recorder(self)}
+
+    def channel(self, name):
+        return self.channels[name]
+
+    def status(self):
+        return "test"
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.db"))
+
+
+def test_context_that_cannot_render_fails_only_its_row(outbox):
+    # Extra fields are optional: Caio has no manager
+    outbox.enqueue("r1", [
+        {"email": "ana@x", "name": "Ana", "manager": {"name": "Bia"}},
+        {"email": "caio@x", "name": "Caio"},
+        {"email": "duda@x", "name": "Duda", "manager": {"name": "Bia"}},
+    ], ["EMAIL_ALERT"])
+    outbox.create_run("r1", "s", "b")
+    comms = Comms()
+
+    template = MissionTemplate("Oi {{ name }}", "Gerente: {{ manager.name }}")
+    summary = DispatchEngine(comms.logger, comms).run(outbox, "r1", template)
+
+    assert (summary.sent, summary.failed) == (2, 1)
+    assert comms.channels["EMAIL_ALERT"].sent == [
+        ("ana@x", "Oi Ana", "Gerente: Bia"), ("duda@x", "Oi Duda", "Gerente: Bia")]
+    assert outbox.counts("r1") == {"sent": 2, "failed": 1}
+    error = outbox.db.execute("SELECT last_error FROM messages WHERE recipient = 'caio@x'").fetchone()[0]
+    assert "manager" in error
+
+
+class Sidelined(Recorder):
+    """Every sender is benched for the first attempt."""
+
+    def deliver(self, target, subject, body, attachments=()):
+        if not self.sent:
+            self.sent.append(None)
+            raise BudgetExhausted("No sender account available", retry_at=time.time() + 0.2)
+        super().deliver(target, subject, body, attachments)
+
+
+def test_spent_senders_defer_without_using_attempts(outbox):
+    outbox.enqueue("r1", [{"email": "ana@x"}], ["EMAIL_ALERT"])
+    outbox.create_run("r1", "s", "b")
+    comms = Comms()
+    comms.channels["EMAIL_ALERT"] = Sidelined(comms)
+
+    summary = DispatchEngine(comms.logger, comms).run(outbox, "r1", MissionTemplate("s", "b"))
+    assert (summary.sent, summary.retried, summary.failed) == (1, 1, 0)
+    # Only the real send counted: a long wait for senders never fails the message
+    assert outbox.db.execute("SELECT attempts FROM messages").fetchone()[0] == 1
@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from utils import httpcache
+from utils.httpcache import MIN_COMPRESS, conditional, etag, file_version
+from utils.store import atomic_write
+
+
+class Request:
+    def __init__(self, **headers):
+        self.headers = {k.replace("_", "-"): v for k, v in headers.items()}
+
+
+def build_big():
+    return {"rows": ["x" * 40] * (MIN_COMPRESS // 20)}
+
+
+@pytest.mark.parametrize("header", ['W/"roster-7"', '"roster-7"', '"a", W/"roster-7"', "*"])
+def test_revalidation_matches_weakly(header):
+    reply = conditional(Request(if_none_match=header), etag("roster", 7), lambda: pytest.fail("built"))
+    assert reply.status_code == 304
+    assert reply.headers["etag"] == 'W/"roster-7"'
+
+
+def test_changed_tag_rebuilds():
+    reply = conditional(Request(if_none_match='W/"roster-6"'), etag("roster", 7), lambda: {"n": 1})
+    assert reply.status_code == 200 and json.loads(reply.body) == {"n": 1}
+
+
+def test_small_bodies_are_not_compressed():
+    reply = conditional(Request(accept_encoding="gzip"), etag("t"), lambda: {"n": 1})
+    assert "content-encoding" not in reply.headers
+
+
+def test_gzip_when_accepted():
+    reply = conditional(Request(accept_encoding="deflate, gzip"), etag("t"), build_big)
+    assert reply.headers["content-encoding"] == "gzip"
+    assert reply.headers["vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(reply.body)) == build_big()
+
+
+@pytest.mark.parametrize("header", ["gzip;q=0", "gzip; q=0.0, identity", ""])
+def test_refused_encoding_is_identity(header):
+    reply = conditional(Request(accept_encoding=header), etag("t"), build_big)
+    assert "content-encoding" not in reply.headers
+    assert json.loads(reply.body) == build_big()
+
+
+def test_brotli_preferred_when_installed(monkeypatch):
+    request = Request(accept_encoding="gzip, br")
+    monkeypatch.setattr(httpcache, "brotli", None)
+    assert httpcache._encoding(request) == "gzip"
+    monkeypatch.setattr(httpcache, "brotli", object())
+    assert httpcache._encoding(request) == "br"
+
+
+def test_file_version_follows_rewrites(tmp_path):
+    path = str(tmp_path / "targets.json")
+    assert file_version(path) == "0"
+    atomic_write(path, "{}")
+    first = file_version(path)
+    atomic_write(path, "{}")
+    # Same size and content, new inode from the rename
+    assert file_version(path) != first
+    os.unlink(path)
+    assert file_version(path) == "0"
+
+
+def test_encoded_response_is_not_compressed_again(server, client):
+    server.roster.add_many([{"name": f"Gzip {i}", "email": f"gzip{i}@x"} for i in range(100)])
+    reply = client.get("/api/targets", headers={"Accept-Encoding": "gzip"})
+    assert reply.headers["content-encoding"] == "gzip"
+    # The client undoes one layer; a second one would not parse
+    assert reply.json()["total"] >= 100
+
+    again = client.get("/api/targets", headers={"If-None-Match": reply.headers["etag"]})
+    assert again.status_code == 304
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from utils.importer import iter_records, normalize
+
+CSV = (
+    '﻿Name,Email,Notes\r\n'
+    'Ana,ana@x,"first line\r\nsecond, with comma"\r\n'
+    '\r\n'
+    '"Bruno ""B"" Reis",bruno@x,\r\n'
+    'Célia,celia@x,"""quoted"" at the start\n\nand a blank line"\n'
+)
+ROWS = [
+    {"name": "Ana", "email": "ana@x", "notes": "first line\nsecond, with comma"},
+    {"name": 'Bruno "B" Reis', "email": "bruno@x", "notes": ""},
+    {"name": "Célia", "email": "celia@x", "notes": '"quoted" at the start\n\nand a blank line'},
+]
+
+
+def collect(body, fmt, size):
+    async def stream():
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    async def run():
+        return [r async for r in iter_records(stream(), fmt)]
+    return asyncio.run(run())
+
+
+# One byte at a time splits quotes, line ends and multi-byte characters across chunks
+@pytest.mark.parametrize("size", [1, 2, 7, 1 << 16])
+def test_csv_quoted_fields_span_lines_and_chunks(size):
+    assert collect(CSV.encode(), "csv", size) == ROWS
+
+
+def test_ndjson_skips_blank_lines_and_flags_bad_ones():
+    body = b'{"name": "Ana", "email": "ana@x"}\n\n[1, 2]\nnot json\r\n{"email": "bruno@x"}'
+    assert collect(body, "ndjson", 5) == [{"name": "Ana", "email": "ana@x"}, None, None, {"email": "bruno@x"}]
+
+
+def test_normalize():
+    assert normalize(None) is None
+    assert normalize({"name": "Ana", "email": "no-at-sign"}) is None
+    assert normalize({"name": " Ana ", "email": " ana@x ", "team": "", "rank": None, "role": "lead"}) == {
+        "name": "Ana", "email": "ana@x", "role": "lead",
+    }
+
+
+def test_import_endpoint_counts(server, client):
+    body = "name,email\nImport A,import-a@x\n\"Import\nB\",import-b@x\nNo Email,\n"
+    reply = client.post("/api/targets/import", content=body, headers={"Content-Type": "text/csv"})
+    assert reply.json() == {"status": "success", "added": 2, "updated": 0, "rejected": 1}
+    reply = client.post("/api/targets/import", content='{"name": "Import A2", "email": "import-a@x"}\n',
+                        headers={"Content-Type": "application/x-ndjson"})
+    assert reply.json() == {"status": "success", "added": 0, "updated": 1, "rejected": 0}
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from utils.leader import Lease
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def test_one_holder_at_a_time(path):
+    a, b = Lease(path, "scheduler"), Lease(path, "scheduler")
+    assert a.acquire()
+    assert not b.acquire() and not b.held
+    # Renewing our own lease always succeeds
+    assert a.acquire()
+    assert a.owner() == b.owner() == a.holder
+
+
+def test_release_hands_over(path):
+    a, b = Lease(path, "scheduler"), Lease(path, "scheduler")
+    a.acquire()
+    a.release()
+    assert not a.held and a.owner() is None
+    assert b.acquire()
+    assert not a.acquire()
+
+
+def test_expired_lease_is_taken_over(path):
+    a, b = Lease(path, "scheduler", ttl=0.2), Lease(path, "scheduler", ttl=0.2)
+    a.acquire()
+    time.sleep(0.3)
+    # a missed its renewal: b takes over and a learns it on its next renewal
+    assert b.acquire()
+    assert not a.acquire()
+    assert a.owner() == b.holder
+
+
+def test_names_are_independent(path):
+    assert Lease(path, "scheduler").acquire()
+    assert Lease(path, "ledger-prune").acquire()
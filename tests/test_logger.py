@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+import time
+
+from utils import logger as logs
+
+
+def child(records, path):
+    logs.forward_to(records)
+    logs.setup_logger("test-forward", path=path).info("FROM WORKER")
+
+
+def test_worker_records_go_through_the_parent(tmp_path):
+    parent_log, worker_log = str(tmp_path / "parent.log"), str(tmp_path / "worker.log")
+    logger = logs.setup_logger("test-forward", path=parent_log)
+    ctx = multiprocessing.get_context("spawn")
+    records = ctx.Queue()
+    logs.listen(records, "test-forward")
+
+    proc = ctx.Process(target=child, args=(records, worker_log))
+    proc.start()
+    proc.join(30)
+    logger.info("FROM PARENT")
+
+    # Both listeners write on background threads
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        with open(parent_log, encoding="utf-8") as f:
+            text = f.read()
+        if "FROM WORKER" in text and "FROM PARENT" in text:
+            break
+        time.sleep(0.05)
+    assert "FROM WORKER" in text and "FROM PARENT" in text
+    # The worker never opened a file: only the parent writes and rotates
+    assert not os.path.exists(worker_log)
@@ -0,0 +1,68 @@
+import os
+
+from utils.logtail import read_since
+
+
+def write(path, *lines, mode="a"):
+    with open(path, mode) as f:
+        f.writelines(f"{line}\n" for line in lines)
+
+
+def test_first_call_returns_tail(tmp_path):
+    log = str(tmp_path / "mission_log.log")
+    write(log, *(f"line {i}" for i in range(30)))
+    lines, cursor = read_since(log, None, n=5)
+    assert lines == [f"line {i}\n" for i in range(25, 30)]
+    assert read_since(log, cursor) == ([], cursor)
+
+
+def test_only_complete_lines_are_returned(tmp_path):
+    log = str(tmp_path / "mission_log.log")
+    write(log, "one")
+    _, cursor = read_since(log)
+    with open(log, "a") as f:
+        f.write("two\nthr")
+    lines, cursor = read_since(log, cursor)
+    assert lines == ["two\n"]
+    with open(log, "a") as f:
+        f.write("ee\n")
+    assert read_since(log, cursor)[0] == ["three\n"]
+
+
+def test_rotation_drains_old_file_first(tmp_path):
+    log = str(tmp_path / "mission_log.log")
+    write(log, "before")
+    _, cursor = read_since(log)
+
+    # Written after the client's last poll, then RotatingFileHandler rolls over
+    write(log, "late 1", "late 2")
+    os.rename(log, f"{log}.1")
+    write(log, "fresh", mode="w")
+
+    lines, cursor = read_since(log, cursor)
+    assert lines == ["late 1\n", "late 2\n", "fresh\n"]
+    write(log, "next")
+    assert read_since(log, cursor)[0] == ["next\n"]
+
+
+def test_rotated_file_gone(tmp_path):
+    log = str(tmp_path / "mission_log.log")
+    write(log, "before")
+    _, cursor = read_since(log)
+    os.unlink(log)
+    write(log, "fresh")
+    assert read_since(log, cursor)[0] == ["fresh\n"]
+
+
+def test_truncation_restarts_from_top(tmp_path):
+    log = str(tmp_path / "mission_log.log")
+    write(log, "a long line before truncation")
+    _, cursor = read_since(log)
+    write(log, "short", mode="w")
+    assert read_since(log, cursor)[0] == ["short\n"]
+
+
+def test_bad_cursor_falls_back_to_tail(tmp_path):
+    log = str(tmp_path / "mission_log.log")
+    write(log, "x", "y")
+    assert read_since(log, "garbage", n=1)[0] == ["y\n"]
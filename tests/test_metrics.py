@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+from utils import metrics
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src", "dispatch")
+
+WORKER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from utils import metrics
+metrics.share(sys.argv[2])
+metrics.MESSAGES.inc(3, channel="EMAIL", outcome="sent")
+metrics.SMTP_DATA.observe(0.02)
+metrics.flush()
+"""
+
+
+def run_worker(directory):
+    subprocess.run([sys.executable, "-c", WORKER, SRC, str(directory)], check=True)
+
+
+def sample(text, line_start):
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_render_adds_counters_of_other_processes(tmp_path):
+    sent = 'dispatch_messages_total{channel="EMAIL",outcome="sent"}'
+    before = sample(metrics.render(), sent)
+    run_worker(tmp_path)
+    run_worker(tmp_path)
+
+    # Exited workers still count: counters never go backwards
+    assert sample(metrics.render(tmp_path), sent) == before + 6
+    assert sample(metrics.render(), sent) == before
+
+
+def test_render_adds_histograms_of_other_processes(tmp_path):
+    count = "dispatch_smtp_data_seconds_count"
+    before = sample(metrics.render(), count)
+    run_worker(tmp_path)
+    text = metrics.render(tmp_path)
+    assert sample(text, count) == before + 1
+    assert sample(text, 'dispatch_smtp_data_seconds_bucket{le="+Inf"}') == before + 1
+
+
+def test_render_without_shared_directory(tmp_path):
+    assert metrics.render(tmp_path / "missing") == metrics.render()
@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+
+from api.mime import _stuffed, compile_message
+from api.pool import SMTPPool
+
+
+def joined(chunks):
+    return b"".join(bytes(c) for c in chunks)
+
+
+def test_stuffing_normalises_line_ends_and_doubles_leading_dots():
+    assert _stuffed(b".a\r\nb\n.c\r.\r\n") == b"..a\r\nb\r\n..c\r\n..\r\n"
+
+
+def test_recipients_share_the_serialized_message():
+    message = compile_message("ops@dispatch.test", "Alerta", "Corpo")
+    first, second = message.render("a@x"), message.render("b@x")
+    # Only the three per-recipient headers are built again
+    assert first[1] is second[1] and first[3:] == second[3:]
+    assert first[0] != second[0]
+    assert b"To: a@x\r\n" in first[0]
+    assert b"@dispatch.test>" in first[0]
+    assert compile_message("ops@dispatch.test", "Alerta", "Corpo") is message
+
+
+@pytest.fixture
+def pool(smtp_sink):
+    pool = SMTPPool(logging.getLogger("test"), "127.0.0.1", smtp_sink.port, "u", "p", starttls=False, timeout=5)
+    yield pool
+    pool.close()
+
+
+def test_message_parses_back(smtp_sink, pool):
+    body = "Olá {name}\n.\nlinha depois do ponto\n..duas"
+    pool.send("ops@dispatch.test", "ana@x", compile_message("ops@dispatch.test", "Relatório ✓", body).render("ana@x"))
+
+    (received,) = smtp_sink.messages
+    assert received.rcpts == ["ana@x"]
+    msg = received.parse()
+    assert msg["To"] == "ana@x"
+    assert msg["Subject"] == "Relatório ✓"
+    assert msg["From"] == "Dispatch Central <ops@dispatch.test>"
+    plain, html = msg.get_payload()
+    # The lone "." line did not end the DATA phase early
+    assert plain.get_content().replace("\r\n", "\n") == body
+    assert "Relatório ✓" in html.get_content()
+    assert all(not line.startswith(b".") or line.startswith(b"..")
+               for line in received.raw.split(b"\r\n") if line != b".")
+
+
+def test_long_subject_is_folded_safely(smtp_sink, pool):
+    subject = "Aviso " + "x" * 200 + " .fim"
+    pool.send("ops@dispatch.test", "ana@x", compile_message("ops@dispatch.test", subject, "b").render("ana@x"))
+    assert smtp_sink.messages[0].parse()["Subject"] == subject
@@ -0,0 +1,60 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def queued(server, monkeypatch):
+    """Scheduled fires only queue (as in headless mode); returns the run ids created."""
+    monkeypatch.setattr(server, "INLINE_DISPATCH", False)
+    server.roster.add_many([{"name": "Ana", "email": "ana@x"}])
+    # Unfinished runs from other tests would be resumed instead of queuing new ones
+    for run_id in server.outbox.unfinished_runs():
+        server.outbox.abandon_run(run_id, "test cleanup")
+    before = set(r["run_id"] for r in server.outbox.db.execute("SELECT run_id FROM runs"))
+    yield lambda: set(r["run_id"] for r in server.outbox.db.execute("SELECT run_id FROM runs")) - before
+
+
+def arm(server, trigger, subject):
+    server.config_store.update(lambda c: c.update(mission_config={
+        "trigger_time": trigger, "subject": subject, "body": "b"}))
+
+
+def test_rearmed_trigger_gets_its_own_run(server, queued):
+    now = datetime.now()
+    first, second = now - timedelta(minutes=2), now - timedelta(minutes=1)
+    if first.date() != now.date():
+        pytest.skip("too close to midnight")
+
+    arm(server, f"{first:%H:%M}", "first")
+    server.scheduled_mission()
+    server.scheduled_mission()  # duplicate fire of the same trigger
+    assert len(queued()) == 1
+
+    arm(server, f"{second:%H:%M}", "second")
+    server.scheduled_mission()
+    runs = queued()
+    assert len(runs) == 2
+    assert {server.outbox.get_run(r)["subject"] for r in runs} == {"first", "second"}
+
+
+def test_stale_run_is_abandoned_not_resumed(server, queued):
+    arm(server, "00:00", "old content")
+    run_id = server.queue_mission("stale-run")
+    server.outbox.db.execute("UPDATE runs SET created = ? WHERE run_id = ?", (time.time() - 2 * 86400, run_id))
+
+    arm(server, "00:00", "new content")
+    fresh = server.queue_mission()
+    assert fresh != run_id
+    assert server.outbox.get_run(run_id)["aborted"]
+    assert server.outbox.get_run(fresh)["subject"] == "new content"
+
+
+def test_run_is_abandoned_after_repeated_aborts(server, queued):
+    run_id = server.queue_mission("aborting-run")
+    for _ in range(server.RUN_MAX_ABORTS):
+        server.outbox.db.execute("UPDATE runs SET retry_at = 0 WHERE run_id = ?", (run_id,))
+        server.abort_run(run_id, "SMTP Connection Failed.")
+    run = server.outbox.get_run(run_id)
+    assert run["finished"] and "SMTP Connection Failed." in run["aborted"]
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from utils import outbox as outbox_module
+from utils.outbox import Outbox
+
+OPS = [{"email": "a@x"}, {"email": "b@x"}, {"email": "c@x"}]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.db"))
+
+
+def test_defer_run_backs_off_and_hides_run(outbox):
+    outbox.create_run("r1", "s", "b")
+    assert outbox.unfinished_runs(due=True) == ["r1"]
+
+    assert outbox.defer_run("r1") == outbox_module.RUN_RETRY_BASE
+    assert outbox.unfinished_runs(due=True) == []
+    # Still unfinished: a manual trigger or resume can pick it up
+    assert outbox.unfinished_runs() == ["r1"]
+
+
+def test_defer_run_counts_one_abort_per_hold(outbox):
+    outbox.create_run("r1", "s", "b")
+    outbox.defer_run("r1")
+    outbox.defer_run("r1")
+    assert outbox.get_run("r1")["aborts"] == 1
+
+    # Once the hold is over the next abort doubles the wait
+    outbox.db.execute("UPDATE runs SET retry_at = ? WHERE run_id = 'r1'", (time.time() - 1,))
+    assert outbox.defer_run("r1") == 2 * outbox_module.RUN_RETRY_BASE
+
+
+def test_abandon_run_fails_unsent_rows_and_finishes(outbox):
+    outbox.enqueue("r1", [{"email": "a@x"}, {"email": "b@x"}], ["EMAIL_ALERT"])
+    outbox.create_run("r1", "s", "b")
+    (first,) = outbox.claim("r1", limit=1)
+    outbox.mark_sent(first["id"])
+
+    assert outbox.abandon_run("r1", "expired") == 1
+    run = outbox.get_run("r1")
+    assert run["finished"] and run["aborted"] == "expired"
+    assert outbox.counts("r1") == {"sent": 1, "failed": 1}
+    assert outbox.unfinished_runs() == []
+
+
+def test_stale_runs(outbox):
+    outbox.create_run("old", "s", "b")
+    outbox.create_run("new", "s", "b")
+    outbox.db.execute("UPDATE runs SET created = ? WHERE run_id = 'old'", (time.time() - 2 * 86400,))
+    assert outbox.stale_runs() == ["old"]
+
+
+def test_enqueue_is_idempotent(outbox):
+    assert outbox.create_run("r1", "s", "b")
+    assert outbox.enqueue("r1", OPS, ["EMAIL_ALERT"]) == 3
+    # A resumed or duplicate trigger queues nothing twice
+    assert not outbox.create_run("r1", "s", "b")
+    assert outbox.enqueue("r1", [{"email": " A@X "}] + OPS, ["EMAIL_ALERT"]) == 0
+    assert outbox.enqueue("r1", OPS[:1], ["TEAMS_MESSAGE"]) == 1
+
+
+def test_claim_leases_rows_once(outbox):
+    outbox.enqueue("r1", OPS, ["EMAIL_ALERT"])
+    first = outbox.claim("r1", limit=2)
+    assert [r["recipient"] for r in first] == ["a@x", "b@x"]
+    (rest,) = outbox.claim("r1", limit=10)
+    assert rest["recipient"] == "c@x"
+    assert outbox.claim("r1", limit=10) == []
+    assert outbox.counts("r1") == {"sending": 3}
+
+
+def test_expired_lease_is_reclaimed(outbox):
+    outbox.enqueue("r1", OPS[:1], ["EMAIL_ALERT"])
+    (row,) = outbox.claim("r1", limit=1, lease=60)
+    assert outbox.claim("r1", limit=1) == []
+    assert 59 < outbox.next_due_in("r1") <= 60
+
+    # The sender crashed: once the lease runs out another worker takes the row
+    outbox.db.execute("UPDATE messages SET lease_until = ? WHERE id = ?", (time.time() - 1, row["id"]))
+    (again,) = outbox.claim("r1", limit=1)
+    assert again["id"] == row["id"]
+
+
+def test_retry_backs_off_then_fails(outbox):
+    outbox.enqueue("r1", OPS[:1], ["EMAIL_ALERT"])
+    (row,) = outbox.claim("r1", limit=1)
+    assert outbox.mark_retry(row["id"], row["attempts"], "451 try later")
+
+    # Not claimable until the backoff is over
+    assert outbox.claim("r1", limit=1) == []
+    assert 0 < outbox.next_due_in("r1") <= outbox_module.backoff_delay(1)
+    outbox.db.execute("UPDATE messages SET next_at = 0 WHERE id = ?", (row["id"],))
+    (row,) = outbox.claim("r1", limit=1)
+    assert row["attempts"] == 1
+
+    assert not outbox.mark_retry(row["id"], outbox_module.MAX_ATTEMPTS - 1, "451 try later")
+    assert outbox.counts("r1") == {"failed": 1}
+    assert outbox.next_due_in("r1") is None
+
+
+def test_backoff_delay_doubles_up_to_cap():
+    base, cap = outbox_module.RETRY_BASE, outbox_module.RETRY_CAP
+    assert [outbox_module.backoff_delay(n) for n in (1, 2, 3)] == [base, 2 * base, 4 * base]
+    assert outbox_module.backoff_delay(50) == cap
@@ -0,0 +1,55 @@
+import logging
+import smtplib
+
+import pytest
+
+from api.pool import SMTPPool
+
+MESSAGE = [b"Subject: test\r\n\r\nbody\r\n"]
+
+
+@pytest.fixture
+def pool(smtp_sink):
+    pool = SMTPPool(logging.getLogger("test"), "127.0.0.1", smtp_sink.port, "bench@bench.local", "bench",
+                    max_sessions=1, starttls=False, timeout=5)
+    yield pool
+    pool.close()
+
+
+def test_session_is_reused(smtp_sink, pool):
+    for _ in range(3):
+        assert pool.send("from@x", "to@x", MESSAGE) == {}
+    assert pool.handshakes == smtp_sink.logins == 1
+    assert len(smtp_sink.messages) == 3
+
+
+@pytest.mark.parametrize("failure", ["closing", "drop"])
+def test_reconnects_once(smtp_sink, pool, failure):
+    pool.send("from@x", "to@x", MESSAGE)
+    smtp_sink.failures = [failure]
+    assert pool.send("from@x", "to@x", MESSAGE) == {}
+    assert pool.handshakes == 2
+    assert len(smtp_sink.messages) == 2
+
+
+@pytest.mark.parametrize("failure, error", [("closing", smtplib.SMTPSenderRefused),
+                                            ("drop", smtplib.SMTPServerDisconnected)])
+def test_gives_up_after_second_failure(smtp_sink, pool, failure, error):
+    pool.send("from@x", "to@x", MESSAGE)
+    smtp_sink.failures = [failure, failure]
+    with pytest.raises(error):
+        pool.send("from@x", "to@x", MESSAGE)
+    # The slot was released: the pool still sends afterwards
+    assert pool.send("from@x", "to@x", MESSAGE) == {}
+
+
+def test_throttle_is_not_resent(smtp_sink, pool):
+    pool.send("from@x", "to@x", MESSAGE)
+    smtp_sink.failures = ["throttle"]
+    # 4.7.x is the provider slowing us down: the caller backs off instead of a new login
+    with pytest.raises(smtplib.SMTPSenderRefused) as e:
+        pool.send("from@x", "to@x", MESSAGE)
+    assert e.value.smtp_code == 421
+    assert pool.handshakes == 1
+    assert pool.send("from@x", "to@x", MESSAGE) == {}
+    assert pool.handshakes == 2
@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from api.errors import BudgetExhausted
+from api.ratelimit import AdaptiveLimiter, limiter_for, next_midnight
+from utils.quota import DailyQuota
+
+log = logging.getLogger("test")
+
+
+def drain(limiter, n):
+    for _ in range(n):
+        limiter.acquire()
+
+
+def test_daily_count_survives_restart(tmp_path):
+    quota = DailyQuota(str(tmp_path / "outbox.db"))
+    first = AdaptiveLimiter(log, "a@relay", rate=1000, daily=30, quota=quota)
+    drain(first, 20)
+    # A new process (fresh limiter, fresh connection) sees what was already spent
+    second = AdaptiveLimiter(log, "a@relay", rate=1000, daily=30, quota=DailyQuota(str(tmp_path / "outbox.db")))
+    with pytest.raises(BudgetExhausted):
+        drain(second, 30)
+
+
+def test_processes_share_one_daily_budget(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    limiters = [AdaptiveLimiter(log, "a@relay", rate=1000, daily=100, quota=DailyQuota(path)) for _ in range(4)]
+    sent = []
+
+    def send(limiter):
+        n = 0
+        try:
+            while True:
+                limiter.acquire()
+                n += 1
+        except BudgetExhausted:
+            sent.append(n)
+
+    threads = [threading.Thread(target=send, args=(l,)) for l in limiters]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert sum(sent) == 100
+
+
+def test_throttle_refunds_the_reservation(tmp_path):
+    limiter = AdaptiveLimiter(log, "a@relay", rate=1000, daily=3, quota=DailyQuota(str(tmp_path / "outbox.db")))
+    drain(limiter, 3)
+    limiter.on_throttle()
+    drain(limiter, 1)
+    with pytest.raises(BudgetExhausted):
+        drain(limiter, 1)
+
+
+def test_limiter_for_applies_new_settings():
+    limiter = limiter_for(log, "relay", "settings@test", rate=5, daily=10)
+    again = limiter_for(log, "relay", "settings@test", rate=20, daily=None)
+    assert again is limiter
+    assert (limiter.max_rate, limiter.rate, limiter.daily) == (20, 20, None)
+
+
+def test_throttled_rate_stays_below_new_ceiling():
+    limiter = AdaptiveLimiter(log, "b@relay", rate=10)
+    limiter.on_throttle()
+    limiter.configure(40, None)
+    assert limiter.rate == 5 and limiter.max_rate == 40
+    limiter.configure(2, None)
+    assert limiter.rate == 2
+
+
+def test_spent_budget_waits_for_midnight(tmp_path):
+    limiter = AdaptiveLimiter(log, "c@relay", rate=1000, daily=2, quota=DailyQuota(str(tmp_path / "outbox.db")))
+    assert limiter.available_at() <= time.time()
+    drain(limiter, 2)
+    with pytest.raises(BudgetExhausted) as e:
+        drain(limiter, 1)
+    assert e.value.retry_at == next_midnight()
+    assert limiter.available_at() == next_midnight()
@@ -0,0 +1,62 @@
+import logging
+import smtplib
+
+import pytest
+
+from api.errors import ChannelError, is_transient
+from api.routing import DirectRouter
+
+MESSAGE = [b"Subject: test\r\n\r\nbody\r\n"]
+# Loopback, but nothing listens there: connections are refused at once
+DEAD = "127.0.0.2"
+
+
+class Resolver:
+    def __init__(self, hosts):
+        self.hosts = hosts
+
+    def mx(self, domain):
+        return self.hosts
+
+
+@pytest.fixture
+def route(smtp_sink):
+    routers = []
+
+    def build(hosts):
+        routers.append(DirectRouter(logging.getLogger("test"), Resolver(hosts), port=smtp_sink.port, rate=1000))
+        return routers[-1]
+    yield build
+    for router in routers:
+        router.close()
+
+
+def test_fails_over_to_the_next_mx(smtp_sink, route, caplog):
+    router = route([DEAD, "127.0.0.1"])
+    with caplog.at_level(logging.WARNING):
+        assert router.send("from@x", "to@example.com", MESSAGE) == {}
+        # The dead host is held down and tried last, so the next message goes straight through
+        assert router.send("from@x", "to@example.com", MESSAGE) == {}
+    assert len(smtp_sink.messages) == 2
+    warnings = [r.message for r in caplog.records if "UNREACHABLE" in r.message]
+    assert len(warnings) == 1 and warnings[0].startswith(f"MX {DEAD} UNREACHABLE for example.com")
+
+
+def test_all_mx_down_raises_the_last_error(route):
+    with pytest.raises(OSError) as e:
+        route([DEAD]).send("from@x", "to@example.com", MESSAGE)
+    assert is_transient(e.value)
+
+
+def test_reply_from_an_mx_is_not_retried_on_a_backup(smtp_sink, route):
+    router = route(["127.0.0.1", DEAD])
+    smtp_sink.failures = ["throttle"]
+    with pytest.raises(smtplib.SMTPSenderRefused):
+        router.send("from@x", "to@example.com", MESSAGE)
+    assert router._down == {} and smtp_sink.messages == []
+
+
+def test_no_mx_is_permanent(route):
+    with pytest.raises(ChannelError) as e:
+        route([]).send("from@x", "to@nowhere.test", MESSAGE)
+    assert not e.value.transient
@@ -0,0 +1,62 @@
+import logging
+import time
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from utils.security import IntelSecurity, SecretVault
+
+
+def vault(tmp_path):
+    officer = IntelSecurity(str(tmp_path / "master.key"))
+    return SecretVault(str(tmp_path / "secrets.json"), officer, logging.getLogger("test"))
+
+
+def wait_rotation(v):
+    deadline = time.time() + 5
+    while len(v.officer.keys) > 1 and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_other_process_decrypts_after_rotation(tmp_path):
+    a, b = vault(tmp_path), vault(tmp_path)
+    a.save({"EMAIL_PASS": "secret"})
+    assert b.load() == {"EMAIL_PASS": "secret"}
+
+    a.rotate_key()
+    wait_rotation(a)
+    assert len(a.officer.keys) == 1
+
+    # b still holds the retired key in memory; it must pick up the new ring
+    assert b.load() == {"EMAIL_PASS": "secret"}
+    b.save({"EMAIL_PASS": "changed"})
+    assert a.load() == {"EMAIL_PASS": "changed"}
+
+
+def test_failed_decryption_is_not_cached(tmp_path):
+    a = vault(tmp_path)
+    a.save({"EMAIL_PASS": "secret"})
+    key = (tmp_path / "master.key").read_bytes()
+
+    b = vault(tmp_path)
+    (tmp_path / "master.key").write_bytes(b"x" * 44 + b"\n")
+    with pytest.raises(Exception):
+        b.officer.decrypt((tmp_path / "secrets.json").read_text())
+    assert b.load() == {}
+
+    (tmp_path / "master.key").write_bytes(key)
+    assert b.load() == {"EMAIL_PASS": "secret"}
+
+
+def test_update_refuses_to_overwrite_undecryptable_secrets(tmp_path):
+    a = vault(tmp_path)
+    a.save({"EMAIL_PASS": "secret", "TEAMS_TENANT_ID": "t"})
+    a.update(lambda s: s.update(EMAIL_USER="a@x"))
+    assert a.load() == {"EMAIL_PASS": "secret", "TEAMS_TENANT_ID": "t", "EMAIL_USER": "a@x"}
+
+    before = (tmp_path / "secrets.json").read_text()
+    (tmp_path / "master.key").write_bytes(b"x" * 44 + b"\n")
+    with pytest.raises(Exception):
+        vault(tmp_path).update(lambda s: s.update(EMAIL_USER="b@x"))
+    assert (tmp_path / "secrets.json").read_text() == before
@@ -0,0 +1,46 @@
+STORED = {
+    "EMAIL_USER": "a@x", "EMAIL_PASS": "p", "SMTP_SERVER": "relay", "SMTP_PORT": "587",
+    "TEAMS_TENANT_ID": "t", "SMTP_RATE_PER_SEC": 3, "SMTP_DELIVERY": "direct",
+    "SENDER_ACCOUNTS": [{"EMAIL_USER": "b@x", "EMAIL_PASS": "q", "WEIGHT": 2}],
+}
+
+
+def test_get_masks_every_password(server, client):
+    server.save_secrets(STORED)
+    settings = client.get("/api/settings").json()
+    assert settings["EMAIL_PASS"] == server.PASSWORD_MASK
+    assert settings["SENDER_ACCOUNTS"][0]["EMAIL_PASS"] == server.PASSWORD_MASK
+    # Masking must not leak into the vault's cached copy
+    assert server.load_secrets()["SENDER_ACCOUNTS"][0]["EMAIL_PASS"] == "q"
+
+
+def test_dashboard_form_keeps_other_secrets(server, client):
+    server.save_secrets(STORED)
+    form = {"email_user": "a@x", "email_pass": server.PASSWORD_MASK, "smtp_server": "relay2", "smtp_port": 465}
+    assert client.post("/api/settings", json=form).status_code == 200
+    assert server.load_secrets() == {**STORED, "SMTP_SERVER": "relay2", "SMTP_PORT": "465"}
+
+
+def test_accounts_replace_and_clear(server, client):
+    server.save_secrets(STORED)
+    body = {"email_user": "a@x", "email_pass": "new", "smtp_delivery": "relay",
+            "accounts": [{"email_user": "B@x", "email_pass": server.PASSWORD_MASK, "weight": 3}]}
+    assert client.post("/api/settings", json=body).status_code == 200
+    secrets = server.load_secrets()
+    assert secrets["EMAIL_PASS"] == "new"
+    assert "SMTP_DELIVERY" not in secrets
+    assert secrets["SENDER_ACCOUNTS"] == [{"EMAIL_USER": "B@x", "EMAIL_PASS": "q", "WEIGHT": 3}]
+
+    assert client.post("/api/settings", json={**body, "accounts": []}).status_code == 200
+    assert "SENDER_ACCOUNTS" not in server.load_secrets()
+
+
+def test_rejects_bad_accounts(server, client):
+    server.save_secrets(STORED)
+    unknown = {"email_user": "a@x", "email_pass": "p",
+               "accounts": [{"email_user": "n@x", "email_pass": server.PASSWORD_MASK}]}
+    assert client.post("/api/settings", json=unknown).status_code == 400
+    weightless = {"email_user": "a@x", "email_pass": "p",
+                  "accounts": [{"email_user": "n@x", "email_pass": "z", "weight": 0}]}
+    assert client.post("/api/settings", json=weightless).status_code == 400
+    assert server.load_secrets() == STORED
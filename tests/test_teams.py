@@ -0,0 +1,118 @@
+import json
+import logging
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.errors import ChannelError
+from api.teams import GraphClient, TeamsChannel
+from utils.ttlcache import PersistentTTLCache
+
+
+class Stub(BaseHTTPRequestHandler):
+    """Token endpoint that rotates refresh tokens, and a $batch endpoint that records calls."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        state = self.server.state
+        if self.path.endswith("/oauth2/v2.0/token"):
+            form = dict(urllib.parse.parse_qsl(body.decode()))
+            state["grants"].append(form)
+            if form.get("refresh_token") in state["revoked"]:
+                return self.reply(400, {"error": "invalid_grant"})
+            state["issued"] += 1
+            return self.reply(200, {"access_token": f"at-{state['issued']}", "expires_in": 3600,
+                                    "refresh_token": f"rt-{state['issued']}"})
+        state["auth"].append(self.headers["Authorization"])
+        responses = []
+        for req in json.loads(body)["requests"]:
+            if req["url"].startswith("/users/"):
+                responses.append({"id": req["id"], "status": 200, "body": {"id": "u-" + req["url"][7:].split("?")[0]}})
+            elif req["url"] == "/chats":
+                status = state["chat_status"]
+                responses.append({"id": req["id"], "status": status, "body": {"id": "chat-1"} if status == 201 else {}})
+            else:
+                state["posted"].append(req["url"])
+                responses.append({"id": req["id"], "status": 201, "body": {}})
+        self.reply(200, {"responses": responses})
+
+    def reply(self, status, data):
+        raw = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+@pytest.fixture
+def graph():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    server.state = {"grants": [], "auth": [], "posted": [], "issued": 0, "revoked": set(),
+                    "chat_status": 201}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def client(graph, tmp_path, refresh="rt-configured"):
+    url = f"http://127.0.0.1:{graph.server_address[1]}"
+    store = PersistentTTLCache(str(tmp_path / "teams_cache.db"), "teams_auth")
+    return GraphClient("tenant", "app", "", refresh, graph_url=url, login_url=url, token_store=store)
+
+
+def test_sends_with_delegated_token(graph, tmp_path):
+    channel = TeamsChannel(logging.getLogger("test"), client(graph, tmp_path), "sender",
+                           str(tmp_path / "teams_cache.db"), linger=0)
+    try:
+        channel.deliver("ana@x", "s", "b")
+    finally:
+        channel.close()
+    grant = graph.state["grants"][0]
+    assert grant["grant_type"] == "refresh_token" and grant["refresh_token"] == "rt-configured"
+    assert "client_secret" not in grant
+    assert "Chat.ReadWrite" in grant["scope"]
+    assert graph.state["posted"] == ["/chats/chat-1/messages"]
+    assert set(graph.state["auth"]) == {"Bearer at-1"}
+
+
+def test_rotated_refresh_token_survives_restart(graph, tmp_path):
+    client(graph, tmp_path).token()
+    graph.state["revoked"].add("rt-configured")
+    # A new process starts from the rotated token, not the one in secrets
+    assert client(graph, tmp_path).token() == "at-2"
+    assert graph.state["grants"][-1]["refresh_token"] == "rt-1"
+
+
+def test_new_configured_token_replaces_stored_rotation(graph, tmp_path):
+    client(graph, tmp_path).token()
+    client(graph, tmp_path, refresh="rt-pasted").token()
+    assert graph.state["grants"][-1]["refresh_token"] == "rt-pasted"
+
+
+def test_revoked_sign_in_is_permanent(graph, tmp_path):
+    graph.state["revoked"].add("rt-configured")
+    with pytest.raises(ChannelError) as e:
+        client(graph, tmp_path).token()
+    assert not e.value.transient
+
+
+@pytest.mark.parametrize("status, transient", [(429, True), (503, True), (403, False)])
+def test_chat_creation_failures(graph, tmp_path, status, transient):
+    graph.state["chat_status"] = status
+    channel = TeamsChannel(logging.getLogger("test"), client(graph, tmp_path), "sender",
+                           str(tmp_path / "teams_cache.db"), linger=0)
+    try:
+        with pytest.raises(ChannelError) as e:
+            channel.deliver("ana@x", "s", "b")
+    finally:
+        channel.close()
+    # Throttling is retried; a refused chat is not reported as an unknown user
+    assert e.value.transient is transient
+    assert "not found" not in str(e.value)
+    assert graph.state["posted"] == []
@@ -0,0 +1,52 @@
+import pytest
+
+from api.templating import MissionTemplate, TemplateSyntaxError
+
+
+def test_renders_context():
+    template = MissionTemplate("Hi {{ name }}", "{% for t in tags %}{{ t|upper }}{% endfor %}")
+    assert template.render({"name": "Ana", "tags": ["a", "b"]}) == ("Hi Ana", "AB")
+
+
+def test_static_template_skips_jinja():
+    template = MissionTemplate("ALERTA", "Feche a planilha.")
+    assert template.static
+    assert template._subject is None and template._body is None
+    assert template.render({}) == ("ALERTA", "Feche a planilha.")
+
+
+def test_syntax_error_raised_at_compile():
+    with pytest.raises(TemplateSyntaxError):
+        MissionTemplate("{{ name ", "body")
+
+
+@pytest.mark.parametrize("source", [
+    "{{ cycler.__init__.__globals__.os.popen('echo PWNED').read() }}",
+    "{{ name.__class__.__mro__ }}",
+    "{{ ''.__class__.__base__.__subclasses__() }}",
+    "{{ lipsum.__globals__ }}",
+])
+def test_sandbox_blocks_dunder_access(source):
+    with pytest.raises(TemplateSyntaxError):
+        MissionTemplate("x", source).render({"name": "Ana"})
+
+
+def test_sandbox_blocks_context_mutation():
+    tags = ["a"]
+    with pytest.raises(TemplateSyntaxError):
+        MissionTemplate("x", "{{ tags.append('b') }}").render({"tags": tags})
+    assert tags == ["a"]
+
+
+@pytest.mark.parametrize("source", ["{{ manager.name }}", "{{ name + 1 }}", "{{ 1 / 0 }}"])
+def test_render_errors_are_template_errors(source):
+    template = MissionTemplate("x", source)
+    with pytest.raises(TemplateSyntaxError):
+        template.render({"name": "Ana"})
+
+
+def test_preview_answers_400_for_render_errors(server, client):
+    server.roster.add_many([{"name": "Ana", "email": "preview@x"}])
+    reply = client.post("/api/preview", json={"email": "preview@x", "email_body": "{{ manager.name }}"})
+    assert reply.status_code == 400
+    assert "manager" in reply.json()["detail"]